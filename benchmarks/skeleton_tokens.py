@@ -0,0 +1,60 @@
+"""
+Reports the token reduction of the skeleton ingestion mode, per language.
+
+Usage:
+    python benchmarks/skeleton_tokens.py <repo_path> [tiktoken_model]
+"""
+import sys
+import time
+from collections import defaultdict
+
+from code_explainer.utils.file_index import FileIndex
+from code_explainer.utils.skeleton import extract_skeleton, skeleton_language
+from code_explainer.utils.utils import BatchProcessingManager
+
+
+def main(repo_path: str, model: str = "gpt-4o-mini") -> None:
+    counter = BatchProcessingManager(model=model)
+    stats = defaultdict(lambda: {"files": 0, "full": 0, "skeleton": 0, "fallbacks": 0, "seconds": 0.0})
+
+    for path in FileIndex(repo_path).paths():
+        language = skeleton_language(path)
+        if language is None:
+            continue
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            source = f.read()
+
+        start = time.perf_counter()
+        skeleton = extract_skeleton(source, language)
+        row = stats[language]
+        row["seconds"] += time.perf_counter() - start
+        row["files"] += 1
+        row["full"] += counter.count_tokens(source)
+        if skeleton is None:
+            row["fallbacks"] += 1
+            row["skeleton"] += counter.count_tokens(source)
+        else:
+            row["skeleton"] += counter.count_tokens(skeleton)
+
+    print(f"{'language':<12}{'files':>8}{'full tokens':>14}{'skeleton':>12}{'reduction':>11}{'fallbacks':>11}{'ms':>9}")
+    totals = {"files": 0, "full": 0, "skeleton": 0}
+    for language, row in sorted(stats.items()):
+        reduction = row["full"] / row["skeleton"] if row["skeleton"] else 0.0
+        print(
+            f"{language:<12}{row['files']:>8}{row['full']:>14,}{row['skeleton']:>12,}"
+            f"{reduction:>10.1f}x{row['fallbacks']:>11}{row['seconds'] * 1000:>9.0f}"
+        )
+        for key in totals:
+            totals[key] += row[key]
+    if totals["skeleton"]:
+        print(
+            f"{'total':<12}{totals['files']:>8}{totals['full']:>14,}{totals['skeleton']:>12,}"
+            f"{totals['full'] / totals['skeleton']:>10.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    main(*sys.argv[1:3])
@@ -0,0 +1,53 @@
+"""
+Measures the startup cost of the crew: importing code_explainer.crew in a fresh
+interpreter (crewai itself reported apart), then in this process the first
+CodeExplainer and crew build, which creates the shared LLM, memories and token
+encoder, and the following ones, which reuse them.
+
+Usage:
+    python benchmarks/startup.py [runs]
+"""
+import os
+import sys
+import subprocess
+import time
+
+IMPORT_SCRIPT = (
+    "import time; start = time.perf_counter(); import crewai; middle = time.perf_counter(); "
+    "import code_explainer.crew; end = time.perf_counter(); print(middle - start, end - middle)"
+)
+
+
+def main(runs: str = "3") -> None:
+    # The crew needs an LLM setting and a memory mode, nothing is sent to the provider
+    os.environ.setdefault("PROVIDER", "openai")
+    os.environ.setdefault("MODEL", "gpt-4o-mini")
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ.setdefault("QDRANT_MODE", "memory")
+    os.environ.setdefault("OUTPUT_DIR", "./output/")
+
+    for run in range(int(runs)):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_SCRIPT], capture_output=True, text=True, check=True
+        ).stdout.split()
+        crewai_seconds, crew_seconds = float(output[-2]), float(output[-1])
+        print(f"Fresh import {run + 1}: crewai {crewai_seconds:.2f}s, code_explainer.crew {crew_seconds:.2f}s")
+
+    start = time.perf_counter()
+    from code_explainer.crew import CodeExplainer
+    print(f"Import in this process: {time.perf_counter() - start:.2f}s")
+
+    for run in range(int(runs)):
+        start = time.perf_counter()
+        code_explainer = CodeExplainer()
+        instantiated = time.perf_counter()
+        code_explainer.crew()
+        built = time.perf_counter()
+        print(
+            f"Run {run + 1}: CodeExplainer() {instantiated - start:.2f}s, "
+            f"crew() {built - instantiated:.2f}s{' (shared resources built)' if run == 0 else ''}"
+        )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
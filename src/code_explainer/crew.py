@@ -1,16 +1,25 @@
 from crewai import Agent, Crew, Process, Task
 from crewai.project import CrewBase, agent, crew, task, before_kickoff
+from crewai.tasks.task_output import TaskOutput
 from crewai_tools import DirectoryReadTool, FileReadTool
 from .tools.plantuml_tool import PlantUMLDiagramGeneratorTool
-from .utils.utils import print_output, check_memory_dir, manage_output_dir, LLM_Config, ContextManager
-from .utils.storage_config import (
-    get_long_term_memory,
-    get_short_term_memory,
-    get_entity_memory,
-)
+from .tools.symbol_index_tool import SymbolIndexLookupTool
+from .utils.utils import print_output, check_memory_dir, manage_output_dir
+from .utils.file_index import FileIndex, SOURCE_SUFFIXES
+from .utils.incremental import AnalysisState, IncrementalPlan, analysis_fingerprint, head_commit
+from .utils.chunk_descriptor import ChunkDescriptor, read_source
+from .utils.compaction import Compactor
+from .utils.aggregation import tree_reduce
+from .utils.run_journal import RunJournal, plan_hash
+from .utils.resources import get_context_manager, get_llm, get_memories
+from .utils.task_scheduler import TASK_SCHEDULERS, kickoff_graph
+from .utils.llm_metrics import metrics_scope
 import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 from dotenv import load_dotenv
 
 
@@ -28,28 +37,21 @@ class CodeExplainer:
     plant_uml_tool = PlantUMLDiagramGeneratorTool()
     file_read_tool = FileReadTool()
 
-    local_dir = os.getenv("LOCAL_DIR")
-    output_dir = os.getenv("OUTPUT_DIR")
-
-    llm = LLM_Config(
-        provider=os.getenv("PROVIDER"),
-        model=os.getenv("MODEL"),
-        base_url=os.getenv("BASE_URL"),
-        temperature=float(os.getenv("TEMPERATURE")),
-        max_tokens=int(os.getenv("MAX_TOKENS")),
-        timeout=float(os.getenv("TIMEOUT")),
-        callbacks=[print_output],
-    )
-
-    ltm = get_long_term_memory()
-    stm = get_short_term_memory()
-    entity = get_entity_memory()
-
-    # initialize context manager
-    context_manager = ContextManager(
-        max_tokens=int(os.getenv("CONTEXT_CHUNK_SIZE", "6000")),
-        model=os.getenv("MODEL", "gpt-4")
-    )
+    def __init__(self, symbol_index_root: Optional[str] = None):
+        """symbol_index_root is the repository whose symbol index the agents may look up, None for no lookups"""
+        self.symbol_index_root = symbol_index_root
+
+    def _symbol_index_tools(self) -> List[SymbolIndexLookupTool]:
+        if not self.symbol_index_root:
+            return []
+        return [SymbolIndexLookupTool(root=os.path.abspath(self.symbol_index_root))]
+
+    # The LLM, the memories and the token encoder are built on first use and shared by
+    # every instance, see utils.resources
+    def memory_settings(self) -> Dict[str, Any]:
+        """Memory arguments of the crews"""
+        ltm, stm, entity = get_memories()
+        return {"memory": True, "long_term_memory": ltm, "short_term_memory": stm, "entity_memory": entity}
 
     @before_kickoff
     def prepare_inputs(self, inputs):
@@ -64,35 +66,59 @@ class CodeExplainer:
         if "total_chunks" not in inputs:
             inputs["total_chunks"] = 1
 
-        if "code_path" in inputs and inputs["code_path"]:
-            files_content = self._read_codebase(inputs["code_path"])
-            chunks = self.context_manager.chunk_files_by_tokens(files_content)
+        # Inputs of a single chunk already carry it, the codebase is only planned once
+        if inputs.get("code_path") and not inputs["current_chunk"]:
+            chunks = self._plan_chunks(inputs["code_path"])
             if chunks:
-                inputs["code_chunks"] = chunks
+                # Only the standard crew runs this hook, on a codebase small enough for one pass:
+                # batch_analysis_task analyzes the content of every chunk
+                inputs["code_chunks"] = [chunk.materialize() for chunk in chunks]
                 inputs["total_chunks"] = len(chunks)
-                # print(f"Code divided into {len(chunks)} chunks for processing")
         return inputs
+
+    def _plan_chunks(self, code_path: str) -> List[ChunkDescriptor]:
+        """Plans the chunks of the codebase, file content is only read when a chunk is dispatched"""
+        context_manager = get_context_manager()
+        files = self._iter_codebase(code_path)
+        compactor = None
+        if os.getenv("ENABLE_COMPACTION", "true").lower() == "true":
+            compactor = Compactor(context_manager.count_tokens)
+            files = compactor.iter_files(files)
+        # Dispatched chunks read their files compacted the same way
+        chunks = context_manager.chunk_files_by_tokens(
+            files, reader=compactor.read if compactor is not None else None
+        )
+        if compactor is not None:
+            compactor.print_report()
+        if chunks:
+            stats = context_manager.last_plan_stats
+            print(
+                f"Code divided into {stats['chunks']} chunks for processing "
+                f"({stats['strategy']} strategy, {stats['fill_ratio']:.0%} average fill)"
+            )
+            if "cut_edges" in stats:
+                print(f"{stats['cut_edges']} of {stats['edges']} import relationships span two chunks")
+        return chunks
     
     def _read_codebase(self, code_path: str) -> Dict[str, str]:
         """Reads all files in the codebase"""
-        files_content = {}
-        code_extensions = {'.py', '.js', '.ts', '.java', '.cpp', '.c', '.cs', '.go', '.rb', '.php'}
-        
+        return dict(self._iter_codebase(code_path))
+
+    def _iter_codebase(self, code_path: str) -> Iterator[Tuple[str, str]]:
+        """Yields (path, content) for each file in the codebase, one at a time"""
         path_obj = Path(code_path)
         if path_obj.is_file():
-            if path_obj.suffix in code_extensions:
-                with open(path_obj, 'r', encoding='utf-8', errors='ignore') as f:
-                    files_content[str(path_obj)] = f.read()
+            paths = [str(path_obj)] if path_obj.suffix in SOURCE_SUFFIXES else []
         else:
-            for file_path in path_obj.rglob('*'):
-                if file_path.is_file() and file_path.suffix in code_extensions:
-                    try:
-                        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                            files_content[str(file_path)] = f.read()
-                    except Exception as e:
-                        print(f"Error reading {file_path}: {e}")
-        
-        return files_content
+            paths = FileIndex.for_root(code_path).paths()
+
+        for file_path in paths:
+            try:
+                content = read_source(file_path)
+            except Exception as e:
+                print(f"Error reading {file_path}: {e}")
+                continue
+            yield file_path, content
 
     @agent
     def software_analyst(self) -> Agent:
@@ -102,7 +128,8 @@ class CodeExplainer:
             allow_delegation=False,
             max_iter=10,
             memory=True,
-            llm=self.llm,
+            llm=get_llm(),
+            tools=self._symbol_index_tools(),
         )
     
     @agent
@@ -114,7 +141,7 @@ class CodeExplainer:
             allow_delegation=True,
             max_iter=5,
             memory=True,
-            llm=self.llm,
+            llm=get_llm(),
         )
 
     @agent
@@ -125,7 +152,7 @@ class CodeExplainer:
             allow_delegation=False,
             max_iter=5,
             memory=True,
-            llm=self.llm,
+            llm=get_llm(),
         )
 
     @agent
@@ -136,7 +163,7 @@ class CodeExplainer:
             max_iter=5,
             allow_delegation=False,
             memory=True,
-            llm=self.llm,
+            llm=get_llm(),
         )
 
     @agent
@@ -147,9 +174,10 @@ class CodeExplainer:
             max_iter=5,
             allow_delegation=False,
             memory=True,
-            llm=self.llm,
+            llm=get_llm(),
             tools=[
                 self.plant_uml_tool,
+                *self._symbol_index_tools(),
                 self.file_read_tool,
                 self.directory_read_tool,
             ],
@@ -176,9 +204,11 @@ class CodeExplainer:
     @task
     def code_quality_task(self) -> Task:
 
+        # It only reads sonarqube_json, so it does not wait for the analysis
         return Task(
             config=self.tasks_config["code_quality_task"],
             agent=self.sonar_quality_analyst(),
+            context=[],
         )
 
     @task
@@ -199,7 +229,7 @@ class CodeExplainer:
             callback=print_output,
             human_input=False,
             async_execution=True,
-            output_file=self.output_dir + "README.md",
+            output_file=os.getenv("OUTPUT_DIR", "./output/") + "README.md",
         )
 
     @task
@@ -214,57 +244,292 @@ class CodeExplainer:
             },
         )
     
-    def process_in_batches(self, inputs: Dict[str, Any]) -> Any:
-        """Main process for managing batch analysis"""
-        if "code_chunks" not in inputs:
+    def process_in_batches(self, inputs: Dict[str, Any], resume: bool = False) -> Any:
+        """
+        Main process for managing batch analysis. Chunk results, the aggregated analysis
+        and report task outputs are journaled; with resume, a previous run of the same
+        commit and chunk plan continues from its first incomplete unit.
+        """
+        chunks = self._plan_chunks(inputs["code_path"]) if inputs.get("code_path") else []
+        if not chunks:
             # If there are no chunks, run normally.
-            return self.crew().kickoff(inputs=inputs)
-        
-        chunks = inputs["code_chunks"]
-        all_results = []
-        
-        print(f"Start work for {len(chunks)} chunk...")
+            return self.kickoff_crew(self.crew(), inputs)
+
+        plan = self._incremental_plan(inputs)
+        journal = None
+        try:
+            journal, run_id, done = self._open_run(inputs, chunks, resume)
+            return self._run_batches(inputs, chunks, plan, journal, run_id, done)
+        finally:
+            if journal is not None:
+                journal.close()
+            if plan is not None:
+                plan.close()
+
+    def _run_batches(
+        self,
+        inputs: Dict[str, Any],
+        chunks: List[ChunkDescriptor],
+        plan: Optional[IncrementalPlan],
+        journal: Optional[RunJournal],
+        run_id: Optional[str],
+        done: Dict[str, str],
+    ) -> Any:
+        """Analyzes the chunks, then aggregates them and writes the report, journaling each unit"""
+        # Shared by every chunk: the repository is referenced instead of inlined, and the
+        # chunk list is described without its content
+        chunk_list = [chunk.describe() for chunk in chunks]
+        base_inputs = {
+            **inputs,
+            "repo": inputs.get("repository_url") or inputs["code_path"],
+            "code_chunks": chunk_list,
+            "total_chunks": len(chunks),
+        }
         
+        workers = max(1, int(os.getenv("CHUNK_WORKERS", "4")))
+        print(f"Start work for {len(chunks)} chunk with up to {workers} concurrent workers...")
+
+        # Results are stored by chunk index, so they come back in chunk order
+        all_results: List[Optional[Dict[str, Any]]] = [None] * len(chunks)
+        pending = []
         for i, chunk in enumerate(chunks):
-            print(f"Working chunk {i+1}/{len(chunks)} ({chunk['file_count']} file, {chunk['total_tokens']} token)")
-            
-            # Create input for single chunk
+            reused = done.get(f"chunk:{i+1}")
+            if reused is not None:
+                print(f"Resuming chunk {i+1}/{len(chunks)} from run {run_id}")
+            elif plan is not None:
+                reused = plan.reusable_result(chunk.names)
+                if reused is not None:
+                    print(f"Reusing chunk {i+1}/{len(chunks)} ({chunk.file_count} file unchanged since last run)")
+            if reused is None:
+                pending.append(i)
+                continue
+            if plan is not None:
+                plan.record(chunk.names, reused)
+            all_results[i] = {
+                "chunk_id": i + 1, "files": chunk.names, "result": reused, "error": None, "seconds": 0.0
+            }
+
+        crew = self.chunk_crew()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(self._analyze_chunk, crew, chunks[i], i, base_inputs): i for i in pending
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                all_results[i] = future.result()
+                # The incremental state and the journal are only written from this thread
+                if all_results[i]["error"] is None:
+                    if plan is not None:
+                        plan.record(chunks[i].names, str(all_results[i]["result"]))
+                    if journal is not None:
+                        journal.record(run_id, f"chunk:{i+1}", str(all_results[i]["result"]))
+
+        failed = [r["chunk_id"] for r in all_results if r.get("error")]
+        print(
+            f"Analyzed {len(pending)} chunks in {time.perf_counter() - start:.1f}s"
+            + (f", {len(failed)} failed: {failed}" if failed else "")
+        )
+
+        if plan is not None:
+            plan.finish()
+
+        # Later units are only journaled when every chunk was analyzed, so that resuming
+        # a run retries the failed chunks and everything built on them
+        complete = not failed
+        try:
+            # Aggergation
+            analysis = done.get("aggregation") if complete else None
+            if analysis is None:
+                analysis = str(self._aggregate_results(all_results, inputs))
+                if journal is not None and complete:
+                    journal.record(run_id, "aggregation", analysis)
+
+            # Documentation, quality and diagrams are produced once, from the aggregated analysis
+            print("Writing documentation and diagrams from the aggregated analysis...")
+            completed_tasks = {}
+            if complete:
+                completed_tasks = {
+                    unit[len("task:"):]: output for unit, output in done.items() if unit.startswith("task:")
+                }
+            on_task_output = None
+            if journal is not None and complete:
+                on_task_output = lambda output: journal.record(run_id, f"task:{output.name}", output.raw)
+            report_crew = self.report_crew(analysis, completed_tasks, on_task_output)
+            if report_crew is None:
+                print(f"Report of run {run_id} already completed")
+                result = completed_tasks[self.diagram_task().name]
+            else:
+                try:
+                    result = self.kickoff_crew(report_crew, base_inputs)
+                finally:
+                    # The crew sets its callback on the shared tasks, it must not outlive this run
+                    for report_task in report_crew.tasks:
+                        if on_task_output is not None and report_task.callback is on_task_output:
+                            report_task.callback = None
+        except Exception:
+            if journal is not None:
+                journal.finish(run_id, "failed")
+            raise
+
+        if journal is not None:
+            journal.finish(run_id, "completed" if complete else "incomplete")
+            if not complete:
+                print(f"Run {run_id} is incomplete, run again with --resume to retry the failed chunks")
+        return result
+
+    def kickoff_crew(self, crew: Crew, inputs: Dict[str, Any]) -> Any:
+        """Kicks off a crew with the task scheduler set by TASK_SCHEDULER"""
+        scheduler = os.getenv("TASK_SCHEDULER", "dag")
+        if scheduler not in TASK_SCHEDULERS:
+            raise ValueError(f"task scheduler must be one of: {', '.join(TASK_SCHEDULERS)}")
+        if scheduler == "dag" and crew.process == Process.sequential:
+            return kickoff_graph(crew, inputs)
+        return crew.kickoff(inputs=inputs)
+
+    def _open_run(
+        self, inputs: Dict[str, Any], chunks: List[ChunkDescriptor], resume: bool
+    ) -> Tuple[Optional[RunJournal], Optional[str], Dict[str, str]]:
+        """Opens the journal of this run, returning it with the run id and the outputs already completed"""
+        if os.getenv("ENABLE_RUN_JOURNAL", "true").lower() != "true":
+            return None, None, {}
+        code_path = inputs["code_path"]
+        repo_key = inputs.get("repository_url") or os.path.abspath(code_path)
+        journal = RunJournal()
+        run_id, done = journal.start(repo_key, head_commit(code_path), plan_hash(chunks), len(chunks), resume)
+        if done:
+            print(f"Resuming run {run_id}: {len(done)} units already completed")
+        return journal, run_id, done
+
+    def _analyze_chunk(
+        self, crew: Crew, chunk: ChunkDescriptor, index: int, base_inputs: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Runs the analysis of one chunk on a copy of the crew, a failure only affects this chunk"""
+        total = base_inputs["total_chunks"]
+        print(f"Working chunk {index+1}/{total} ({chunk.file_count} file, {chunk.total_tokens} token)")
+        start = time.perf_counter()
+        result, error = None, None
+        try:
+            # Create input for single chunk, its content is read now
             chunk_inputs = {
-                **inputs,
-                "current_chunk": chunk,
-                "chunk_number": i + 1,
-                "total_chunks": len(chunks)
+                **base_inputs,
+                "current_chunk": chunk.materialize(),
+                "chunk_number": index + 1,
             }
-            
-            # Chunk analysis
-            chunk_result = self.crew().kickoff(inputs=chunk_inputs)
-            all_results.append({
-                "chunk_id": i + 1,
-                "files": list(chunk["files"].keys()),
-                "result": chunk_result
-            })
-        
-        # Aggergation
-        return self._aggregate_results(all_results, inputs)
+            # Tasks are interpolated in place, concurrent chunks cannot share them
+            with metrics_scope(chunk=index + 1):
+                result = crew.copy().kickoff(inputs=chunk_inputs)
+        except Exception as e:
+            error = str(e)
+            logging.error(f"Chunk {index+1}/{total} failed: {e}")
+        elapsed = time.perf_counter() - start
+        print(f"Chunk {index+1}/{total} {'failed' if error else 'done'} in {elapsed:.1f}s")
+        return {"chunk_id": index + 1, "files": chunk.names, "result": result, "error": error, "seconds": elapsed}
+
+    def _incremental_plan(self, inputs: Dict[str, Any]) -> Optional[IncrementalPlan]:
+        """Builds the plan used to reuse chunk results of files unchanged since the last run"""
+        if os.getenv("ENABLE_INCREMENTAL_ANALYSIS", "true").lower() != "true":
+            return None
+        code_path = inputs.get("code_path")
+        if not code_path:
+            return None
+        repo_key = inputs.get("repository_url") or os.path.abspath(code_path)
+        # Prompts and agent definitions are part of the fingerprint
+        fingerprint = analysis_fingerprint(str(path) for path in (Path(__file__).parent / "config").glob("*.yaml"))
+        return IncrementalPlan(AnalysisState(), repo_key=repo_key, repo_path=code_path, fingerprint=fingerprint)
     
-    def _aggregate_results(self, results: List[Dict], inputs: Dict[str, Any]) -> str:
-        """Aggregate the results of all chunks"""
+    def _aggregate_results(self, results: List[Dict], inputs: Dict[str, Any]) -> Any:
+        """Aggregate the results of all chunks, merging them level by level within the token budget"""
         print("Aggregation of final results...")
-        
-        # create aggregation task
-        aggregation_task = Task(
-            config=self.tasks_config["diagram_task"],
-            agent=self.batch_coordinator(),
+        summaries = [self._chunk_summary(result) for result in results]
+        context_manager = get_context_manager()
+        max_tokens = int(os.getenv("AGGREGATION_MAX_TOKENS", context_manager.max_tokens))
+        workers = max(1, int(os.getenv("CHUNK_WORKERS", "4")))
+        return tree_reduce(
+            summaries,
+            lambda parts, final: self._run_aggregation(parts, final, len(results)),
+            context_manager.count_tokens,
+            max_tokens,
+            workers,
         )
-        
+
+    @staticmethod
+    def _chunk_summary(result: Dict[str, Any]) -> str:
+        files = result["files"]
+        listed = ", ".join(files[:10]) + (f" and {len(files) - 10} more" if len(files) > 10 else "")
+        if result.get("error"):
+            return f"### Chunk {result['chunk_id']} ({listed})\nNot analyzed: {result['error']}"
+        return f"### Chunk {result['chunk_id']} ({listed})\n{result['result']}"
+
+    def _run_aggregation(self, parts: List[str], final: bool, chunk_count: int) -> Any:
+        """
+        Merges chunk analyses, or summaries of them, with the aggregation task for the final
+        report and the merge task for the intermediate levels
+        """
+        # Groups of a level run concurrently, each on its own agent
+        agent = self.batch_coordinator().copy()
+        task_name = "aggregation_task" if final else "merge_task"
+        aggregation_task = Task(config=self.tasks_config[task_name], agent=agent, name=task_name)
         mini_crew = Crew(
-            agents=[self.batch_coordinator()],
+            agents=[agent],
             tasks=[aggregation_task],
             process=Process.sequential,
             verbose=True
         )
-        
-        return mini_crew.kickoff()
+        return mini_crew.kickoff(
+            inputs={"results": "\n\n".join(parts), "result_count": len(parts), "total_chunks": chunk_count}
+        )
+
+    def chunk_crew(self) -> Crew:
+        """Crew run on each chunk in batch processing, with chunk_analysis_task only"""
+        return Crew(
+            agents=[self.software_analyst()],
+            tasks=[self.chunk_analysis_task()],
+            process=Process.sequential,
+            verbose=True,
+            **self.memory_settings(),
+        )
+
+    def report_crew(
+        self,
+        analysis: str,
+        completed_tasks: Optional[Dict[str, str]] = None,
+        task_callback: Optional[Callable[[TaskOutput], Any]] = None,
+    ) -> Optional[Crew]:
+        """
+        Crew run once after batch processing: the aggregated analysis of the chunks
+        stands for the output of analysis_task in the documentation and diagram tasks.
+        Tasks in completed_tasks are not run again, their journaled output is used instead;
+        None is returned when all of them are completed.
+        """
+        completed_tasks = completed_tasks or {}
+        analysis_task = self.analysis_task()
+        analysis_task.output = TaskOutput(
+            description=analysis_task.description, raw=analysis, agent=analysis_task.agent.role
+        )
+        tasks = [self.documentation_task(), self.diagram_task()]
+        if self.code_quality_task() in self.documentation_task().context:
+            tasks.insert(0, self.code_quality_task())
+        for report_task in tasks:
+            if report_task.name in completed_tasks:
+                report_task.output = TaskOutput(
+                    name=report_task.name,
+                    description=report_task.description,
+                    raw=completed_tasks[report_task.name],
+                    agent=report_task.agent.role,
+                )
+        tasks = [report_task for report_task in tasks if report_task.name not in completed_tasks]
+        if not tasks:
+            return None
+        agents = list({id(task.agent): task.agent for task in tasks}.values())
+        return Crew(
+            agents=agents,
+            tasks=tasks,
+            process=Process.sequential,
+            verbose=True,
+            **self.memory_settings(),
+            task_callback=task_callback,
+        )
 
     @crew
     def crew(self) -> Crew:
@@ -274,8 +539,5 @@ class CodeExplainer:
             tasks=self.tasks,
             process=Process.sequential,
             verbose=True,
-            memory=True,
-            long_term_memory=self.ltm,
-            short_term_memory=self.stm,
-            entity_memory=self.entity,
+            **self.memory_settings(),
         )
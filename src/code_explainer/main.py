@@ -1,16 +1,29 @@
 #!/usr/bin/env python
 import os
+import sys
+import json
 import warnings
+from datetime import datetime
 
 from code_explainer.crew import CodeExplainer
-from .utils.repo_loader import RepoLoader
+from .utils.repo_loader import RepoLoader, iter_jsonl
+from .utils.parse_cache import ParseCache
+from .utils.compaction import Compactor
+from .utils.run_journal import RunJournal
+from .utils.llm_cache import CachedLLM
+from .utils.llm_metrics import get_llm_metrics
+from .utils.resources import get_context_manager, get_llm, llm_settings
 from .utils.sonarqhube_tool import SonarqubeTool
-from .utils.utils import BatchProcessingManager
+from .utils.symbol_index import SYMBOL_INDEX_PATH
+from .utils.token_cache import get_token_cache
+from .utils.utils import check_memory_dir
 
 warnings.filterwarnings("ignore", category=SyntaxWarning, module="pysbd")
 
 VALID_DIAGRAM_TYPES = {"component", "class", "sequence", "all"}
 VALID_OUTPUT_FORMATS = {"svg", "uml", "png"}
+DOCUMENTS_PATH = "./memory/repo_documents.jsonl"
+TOKEN_CACHE_PATH = "./memory/token_cache.db"
 
 # This main file is intended to be a way for you to run your
 # crew locally, so refrain from adding unnecessary logic into this file.
@@ -20,19 +33,52 @@ VALID_OUTPUT_FORMATS = {"svg", "uml", "png"}
 
 def run():
     """
-    Run the crew.
+    Run the crew. With --resume (or RESUME_RUN=true), a batch run stopped halfway
+    continues from its first incomplete unit.
     """
-    git_tools = RepoLoader(repo_path=os.getenv("LOCAL_DIR"))
+    # Fails fast on a missing or malformed LLM setting, the LLM itself is built on first use
+    llm_settings()
+    check_memory_dir()
+    resume = "--resume" in sys.argv[1:] or os.getenv("RESUME_RUN", "false").lower() == "true"
+    if os.getenv("ENABLE_TOKEN_CACHE", "true").lower() == "true":
+        # Token counts of unchanged content are reused by this and later runs
+        get_token_cache().open(TOKEN_CACHE_PATH)
+
+    parse_cache = None
+    if os.getenv("ENABLE_PARSE_CACHE", "true").lower() == "true":
+        parse_cache = ParseCache()
+
+    symbol_index_path = None
+    if os.getenv("ENABLE_SYMBOL_INDEX", "true").lower() == "true":
+        symbol_index_path = SYMBOL_INDEX_PATH
+
+    # Shared with the crew, the encoder is only loaded once per process
+    batch_manager = get_context_manager()
+
+    compactor = None
+    if os.getenv("ENABLE_COMPACTION", "true").lower() == "true":
+        compactor = Compactor(batch_manager.count_tokens)
+
+    git_tools = RepoLoader(
+        repo_path=os.getenv("LOCAL_DIR"),
+        parse_cache=parse_cache,
+        symbol_index_path=symbol_index_path,
+        compactor=compactor,
+    )
 
     repository_url = os.getenv("REPOSITORY_URL")
     local_path = os.getenv("LOCAL_PATH")
+    # Documents are streamed to disk instead of being held in memory as one JSON string
     if repository_url:
         git_tools.clone_repo(repository_url)
-        repo_to_load = git_tools.load_repo()
-    elif not repository_url and local_path:
-        repo_to_load = git_tools.load_repo(local_path=local_path)
-    else:
+    elif not local_path:
         raise ValueError("Set a Repository URL or Local Path to your code")
+    code_path = git_tools.local_repo_path or local_path
+
+    git_tools.write_jsonl(DOCUMENTS_PATH, local_path=code_path)
+
+    if parse_cache is not None:
+        parse_cache.close()
 
     diagram_type = os.getenv("DIAGRAM_TYPE")
     if diagram_type not in VALID_DIAGRAM_TYPES:
@@ -53,29 +99,32 @@ def run():
     else:
         sonarqube_json = {}
     
-    context_chunk_size = int(os.getenv("CONTEXT_CHUNK_SIZE", "6000"))
-    model_tiktoken=os.getenv("TIKTOKEN_MODEL", "gpt-4o-mini")
     print("\n🤖 Determining processing strategy...")
-    batch_manager = BatchProcessingManager(
-        max_tokens=context_chunk_size,
-        model=model_tiktoken
-    )
-    use_batch_processing = batch_manager.should_use_batch_processing(repo_to_load)
+    use_batch_processing = batch_manager.should_use_batch_processing(iter_jsonl(DOCUMENTS_PATH))
+
+    if use_batch_processing:
+        # Chunks are read from disk by the crew, so only a reference to the repository rides along
+        repo_to_load = repository_url or local_path
+    else:
+        repo_to_load = json.dumps(list(iter_jsonl(DOCUMENTS_PATH)), ensure_ascii=False)
 
     inputs = {
         "repository_url": repository_url,
         "repo": repo_to_load,
-        "code_path": os.getenv("LOCAL_DIR"),
+        "code_path": code_path,
         "diagram_type": diagram_type,
         "output_format": output_format,
         "sonarqube_json": sonarqube_json,
     }
     print(f"\n🏗️  Initializing CodeExplainer crew...")
-    code_explainer = CodeExplainer()
+    # The agents look up the symbol index of this repository only, when it was built
+    code_explainer = CodeExplainer(symbol_index_root=code_path if symbol_index_path else None)
 
     print(f"\n🔄 Starting analysis...")
     print("=" * 50)
 
+    metrics = get_llm_metrics()
+    metrics.clear()
     try:
         if use_batch_processing:
             print("📊 Processing Mode: BATCH PROCESSING")
@@ -83,16 +132,19 @@ def run():
             print("   - Each chunk will be analyzed independently")
             print("   - Results will be aggregated into a comprehensive report")
             print()
-            result = code_explainer.process_in_batches(inputs)
+            result = code_explainer.process_in_batches(inputs, resume=resume)
         else:
             print("📊 Processing Mode: STANDARD PROCESSING")
             print("   - Codebase will be analyzed in a single pass")
             print()
-            result = code_explainer.crew().kickoff(inputs=inputs)
+            result = code_explainer.kickoff_crew(code_explainer.crew(), inputs)
 
         print("\n" + "=" * 50)
         print("✅ Analysis completed successfully!")
         print(f"📄 Results have been generated and saved to: {os.getenv('OUTPUT_DIR', './output/')}")
+        llm = get_llm()
+        if isinstance(llm, CachedLLM):
+            llm.cache.print_stats()
 
         if isinstance(result, str) and len(result) > 200:
             print(f"\n📋 Analysis Summary (first 200 characters):")
@@ -106,7 +158,7 @@ def run():
         if not use_batch_processing:
             print("   Issue appears to be context-related, trying batch processing...")
             try:
-                result = code_explainer.process_in_batches(inputs)
+                result = code_explainer.process_in_batches(inputs, resume=resume)
                 print("✅ Recovery successful with batch processing!")
                 return result
             except Exception as recovery_error:
@@ -114,4 +166,42 @@ def run():
                 raise Exception(f"Analysis failed even with batch processing: {recovery_error}") from recovery_error
         else:
             print("   No recovery strategy available for this error type.")
+            if os.getenv("ENABLE_RUN_JOURNAL", "true").lower() == "true":
+                print("   Completed chunks are journaled, run again with --resume to continue from there.")
             raise Exception(f"An error occurred while running the crew: {e}") from e
+    finally:
+        # Written next to the README, for failed runs too
+        metrics.print_summary()
+        paths = metrics.write(os.getenv("OUTPUT_DIR", "./output/"))
+        print(f"📈 LLM metrics saved to: {', '.join(paths)}")
+
+
+def runs():
+    """
+    Lists or prunes the batch runs of the run journal, pruning the runs not updated
+    for 30 days by default and never the running ones unless --running is given:
+    runs [list | prune [MAX_AGE_DAYS] [--completed] [--running]]
+    """
+    args = sys.argv[1:]
+    command = args[0] if args else "list"
+    journal = RunJournal()
+    try:
+        if command == "list":
+            for entry in journal.list_runs():
+                updated = datetime.fromtimestamp(entry["updated_at"]).strftime("%Y-%m-%d %H:%M")
+                commit = (entry["commit"] or "no commit")[:8]
+                print(
+                    f"{entry['run_id']}  {entry['status']:<10}  {updated}  {commit}  "
+                    f"{entry['units']} units / {entry['chunk_count']} chunks  {entry['repo_key']}"
+                )
+        elif command == "prune":
+            options = [arg for arg in args[1:] if arg not in ("--completed", "--running")]
+            max_age_days = float(options[0]) if options else 30.0
+            pruned = journal.prune(
+                max_age_days, completed_only="--completed" in args[1:], include_running="--running" in args[1:]
+            )
+            print(f"Pruned {pruned} runs")
+        else:
+            raise ValueError("usage: runs [list | prune [MAX_AGE_DAYS] [--completed] [--running]]")
+    finally:
+        journal.close()
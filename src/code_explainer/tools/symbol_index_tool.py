@@ -0,0 +1,69 @@
+from typing import Optional, Type, Literal
+from crewai.tools import BaseTool
+from pydantic import BaseModel, Field
+
+from ..utils.symbol_index import SYMBOL_INDEX_PATH, SymbolIndex
+
+MAX_RESULTS = 50
+
+
+class SymbolIndexLookupInput(BaseModel):
+    query: Literal["definition", "file", "dependencies", "dependents", "references"] = Field(
+        ...,
+        description=(
+            "'definition' finds where a symbol is defined, 'file' lists the symbols defined in a file, "
+            "'dependencies'/'dependents' list the files a file imports or is imported by, "
+            "'references' lists the files using a symbol."
+        ),
+    )
+    name: str = Field(
+        ...,
+        description="Symbol name (e.g. 'RepoLoader' or 'RepoLoader.load_repo') or file path relative to the repository root.",
+    )
+
+
+class SymbolIndexLookupTool(BaseTool):
+    name: str = "Symbol Index Lookup Tool"
+    description: str = (
+        "Looks up the symbol index of the analyzed repository: where classes and functions are defined, "
+        "what a file defines, which files depend on each other and where a symbol is used. "
+        "Use it instead of re-reading source files to discover structure and relationships."
+    )
+    args_schema: Type[BaseModel] = SymbolIndexLookupInput
+    # Root of the analyzed repository, only its index is looked up
+    root: Optional[str] = None
+    db_path: str = SYMBOL_INDEX_PATH
+
+    def _run(self, query: str, name: str) -> str:
+        index = SymbolIndex.open_root(self.root, self.db_path) if self.root else None
+        if index is None:
+            return "The symbol index is not available, read the source files instead."
+
+        try:
+            name = name.strip()
+            if query == "definition":
+                lines = [
+                    f"{d['path']}:{d['line']} {d['kind']} {d['qualified_name']}: {d['signature']}"
+                    for d in index.find_definitions(name)
+                ]
+            elif query == "file":
+                lines = [
+                    f"{d['line']}-{d['end_line']} {d['kind']} {d['qualified_name']}: {d['signature']}"
+                    for d in index.definitions_in(name)
+                ]
+            elif query == "dependencies":
+                lines = index.dependencies(name)
+            elif query == "dependents":
+                lines = index.dependents(name)
+            elif query == "references":
+                lines = index.references_to(name)
+            else:
+                return f"Unsupported query: {query}"
+        finally:
+            index.close()
+
+        if not lines:
+            return f"No {query} found for '{name}'."
+        if len(lines) > MAX_RESULTS:
+            lines = lines[:MAX_RESULTS] + [f"... {len(lines) - MAX_RESULTS} more"]
+        return "\n".join(lines)
@@ -0,0 +1,62 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Sequence
+
+
+def reduction_groups(token_counts: Sequence[int], max_tokens: int) -> List[List[int]]:
+    """
+    Consecutive groups of items within max_tokens. When no two items fit together they
+    are paired anyway, so that each reduction level shrinks.
+    """
+    groups: List[List[int]] = []
+    current: List[int] = []
+    total = 0
+    for index, tokens in enumerate(token_counts):
+        if current and total + tokens > max_tokens:
+            groups.append(current)
+            current, total = [], 0
+        current.append(index)
+        total += tokens
+    if current:
+        groups.append(current)
+    if len(groups) > 1 and len(groups) == len(token_counts):
+        return [list(range(i, min(i + 2, len(token_counts)))) for i in range(0, len(token_counts), 2)]
+    return groups
+
+
+def tree_reduce(
+    summaries: Sequence[str],
+    reduce: Callable[[List[str], bool], Any],
+    count_tokens: Callable[[str], int],
+    max_tokens: int,
+    max_workers: int = 1,
+) -> Any:
+    """
+    Map-reduce aggregation: summaries are merged by reduce(parts, final) in groups
+    fitting max_tokens, level after level, until one group is left for the final call.
+    The groups of a level are reduced in parallel; a failed group keeps its parts as
+    they are, to be merged at the next level.
+    """
+    summaries = list(summaries)
+    level = 1
+    while True:
+        groups = reduction_groups([count_tokens(summary) for summary in summaries], max_tokens)
+        if len(groups) <= 1:
+            return reduce(summaries, True)
+
+        print(f"Aggregation level {level}: merging {len(summaries)} summaries in {len(groups)} groups")
+
+        def reduce_group(group: List[int]) -> str:
+            parts = [summaries[i] for i in group]
+            if len(parts) == 1:
+                # Nothing to merge it with at this level
+                return parts[0]
+            try:
+                return str(reduce(parts, False))
+            except Exception as e:
+                logging.error(f"Aggregation of {len(parts)} summaries failed: {e}")
+                return "\n\n".join(parts)
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            summaries = list(executor.map(reduce_group, groups))
+        level += 1
@@ -0,0 +1,195 @@
+import logging
+from itertools import accumulate
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from .skeleton import LANGUAGE_NODES, _load_parser
+
+# "ast" splits oversized files at declaration boundaries, "lines" at any line
+SPLIT_MODES = ("ast", "lines")
+
+# Nodes wrapping a declaration, with the field holding it
+WRAPPER_FIELDS = {"decorated_definition": "definition", "export_statement": "declaration"}
+
+COMMENT_TYPES = {"comment", "line_comment", "block_comment"}
+
+# A part is (prefix, first line, end line, tokens): the prefix followed by lines[first:end]
+Part = Tuple[str, int, int, int]
+
+
+def split_lines(line_tokens: Sequence[int], start: int, end: int, budget: int) -> List[Tuple[int, int, int]]:
+    """Greedy split of lines[start:end] into (first line, end line, tokens) ranges within budget"""
+    ranges: List[Tuple[int, int, int]] = []
+    first = start
+    total = 0
+    for line in range(start, end):
+        if line > first and total + line_tokens[line] > budget:
+            ranges.append((first, line, total))
+            first, total = line, 0
+        total += line_tokens[line]
+    if end > first:
+        ranges.append((first, end, total))
+    return ranges
+
+
+def _unwrap(node):
+    while node.type in WRAPPER_FIELDS:
+        inner = node.child_by_field_name(WRAPPER_FIELDS[node.type])
+        if inner is None:
+            break
+        node = inner
+    return node
+
+
+def _unit_starts(nodes) -> List[Tuple[int, object]]:
+    """First line of each declaration, comments being attached to the declaration after them"""
+    starts: List[Tuple[int, object]] = []
+    comment_start = None
+    for node in nodes:
+        if node.type in COMMENT_TYPES:
+            if comment_start is None:
+                comment_start = node.start_point[0]
+            continue
+        start = node.start_point[0] if comment_start is None else comment_start
+        comment_start = None
+        # Declarations sharing a line stay in one unit
+        if not starts or start > starts[-1][0]:
+            starts.append((start, node))
+    return starts
+
+
+class FileSplitter:
+    """
+    Splits an oversized file at top-level declaration boundaries. Classes too big for
+    one part are split between their members, each part repeating the class signature;
+    every part also repeats up to header_lines import lines. Units too big on their own
+    fall back to line splitting.
+    """
+
+    def __init__(
+        self,
+        content: str,
+        language: str,
+        line_tokens: Sequence[int],
+        max_tokens: int,
+        count_tokens: Callable[[str], int],
+        header_lines: int = 20,
+    ):
+        self.content = content
+        self.language = language
+        self.lines = content.split("\n")
+        self.line_tokens = line_tokens
+        self.offsets = [0, *accumulate(line_tokens)]
+        self.max_tokens = max_tokens
+        self.count_tokens = count_tokens
+        self.header_lines = header_lines
+        self.header = ""
+        self.header_tokens = 0
+        self.imports_end = 0
+
+    def tokens(self, start: int, end: int) -> int:
+        return self.offsets[end] - self.offsets[start]
+
+    def split(self) -> Optional[List[Part]]:
+        """Returns the parts of the file, or None when it cannot be parsed"""
+        parser = _load_parser(self.language) if self.language in LANGUAGE_NODES else None
+        if parser is None:
+            return None
+        try:
+            tree = parser.parse(self.content.encode("utf-8", errors="surrogatepass"))
+        except Exception as e:
+            logging.warning(f"Could not parse file for splitting: {e}")
+            return None
+
+        nodes = LANGUAGE_NODES[self.language]
+        top_level = tree.root_node.named_children
+        if self.header_lines > 0:
+            header: List[str] = []
+            for node in top_level:
+                if node.type in nodes["imports"]:
+                    statement = self.lines[node.start_point[0]:node.end_point[0] + 1]
+                    # Whole statements only
+                    if len(header) + len(statement) > self.header_lines:
+                        break
+                    header.extend(statement)
+                    self.imports_end = node.end_point[0] + 1
+            if header:
+                self.header = "\n".join(header) + "\n"
+                self.header_tokens = self.count_tokens(self.header)
+                # The header must leave room for the code it introduces
+                if self.header_tokens > self.max_tokens // 4:
+                    self.header, self.header_tokens, self.imports_end = "", 0, 0
+
+        units: List[Tuple[int, int, str, int, bool]] = []
+        self._expand(top_level, 0, len(self.lines), "", 0, units)
+        return self._pack(units)
+
+    def _expand(self, nodes, start: int, end: int, context: str, context_tokens: int, units: list) -> None:
+        """Appends the (first line, end line, context, context tokens, fits) units of lines[start:end]"""
+        budget = self.max_tokens - self.header_tokens - context_tokens
+        starts = [(line, node) for line, node in _unit_starts(nodes) if start <= line < end]
+        if not starts:
+            units.append((start, end, context, context_tokens, self.tokens(start, end) <= budget))
+            return
+
+        for i, (first, node) in enumerate(starts):
+            # Lines before the first declaration belong to it
+            first = start if i == 0 else first
+            last = starts[i + 1][0] if i + 1 < len(starts) else end
+            if self.tokens(first, last) <= budget:
+                units.append((first, last, context, context_tokens, True))
+                continue
+
+            members = []
+            inner = _unwrap(node)
+            body = inner.child_by_field_name("body") if inner.type in LANGUAGE_NODES[self.language]["containers"] else None
+            if body is not None:
+                members = [m for m in body.named_children if first < m.start_point[0] < last]
+            member_starts = _unit_starts(members)
+            signature_tokens = self.tokens(first, member_starts[0][0]) if member_starts else 0
+            if not member_starts or signature_tokens > budget // 2:
+                units.append((first, last, context, context_tokens, False))
+                continue
+
+            members_start = member_starts[0][0]
+            signature = "\n".join(self.lines[first:members_start]) + "\n"
+            self._expand(
+                members, members_start, last, context + signature, context_tokens + signature_tokens, units
+            )
+
+    def _pack(self, units: List[Tuple[int, int, str, int, bool]]) -> List[Part]:
+        """Merges consecutive units sharing a context while they fit, line-splits the others"""
+        parts: List[Part] = []
+        current = None
+        for first, last, context, context_tokens, fits in units:
+            budget = max(self.max_tokens - self.header_tokens - context_tokens, 1)
+            if fits:
+                if (
+                    current is not None
+                    and current[2] == context
+                    and current[1] == first
+                    and current[4] + self.tokens(first, last) <= budget
+                ):
+                    current = (current[0], last, context, context_tokens, current[4] + self.tokens(first, last))
+                    continue
+                if current is not None:
+                    parts.append(self._part(*current))
+                current = (first, last, context, context_tokens, self.tokens(first, last))
+                continue
+
+            if current is not None:
+                parts.append(self._part(*current))
+                current = None
+            for range_first, range_last, tokens in split_lines(self.line_tokens, first, last, budget):
+                parts.append(self._part(range_first, range_last, context, context_tokens, tokens))
+        if current is not None:
+            parts.append(self._part(*current))
+        return parts
+
+    def _part(self, first: int, last: int, context: str, context_tokens: int, tokens: int) -> Part:
+        prefix = context
+        tokens += context_tokens
+        # Parts already holding the imports do not repeat them
+        if self.header and first >= self.imports_end:
+            prefix = self.header + prefix
+            tokens += self.header_tokens
+        return prefix, first, last, tokens
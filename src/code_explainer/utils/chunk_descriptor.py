@@ -0,0 +1,68 @@
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+def read_source(path: str) -> str:
+    """Reads a source file the way the codebase is read for chunking"""
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        return f.read()
+
+
+# (name, path, start, end, prefix): the chunk file `name` is prefix + text[start:end],
+# text being the content of path returned by the reader and end None for the whole file
+Entry = Tuple[str, str, int, Optional[int], str]
+
+
+class ChunkDescriptor:
+    """
+    A planned chunk holding file references, text ranges and token counts only.
+    The content is read when the chunk is dispatched, so a chunk plan costs a few
+    bytes per file whatever the size of the repository.
+    """
+
+    __slots__ = ("entries", "total_tokens", "reader")
+
+    def __init__(self, entries: Sequence[Entry], total_tokens: int, reader: Callable[[str], str] = read_source):
+        self.entries = tuple(entries)
+        self.total_tokens = total_tokens
+        self.reader = reader
+
+    @property
+    def file_count(self) -> int:
+        return len(self.entries)
+
+    @property
+    def names(self) -> List[str]:
+        return [entry[0] for entry in self.entries]
+
+    def read(self) -> Dict[str, str]:
+        """Reads the content of the chunk files, skipping the ones that cannot be read anymore"""
+        files = {}
+        for name, path, start, end, prefix in self.entries:
+            try:
+                text = self.reader(path)
+            except (OSError, KeyError) as e:
+                print(f"Error reading {path}: {e}")
+                continue
+            files[name] = prefix + text[start:end]
+        return files
+
+    def materialize(self) -> Dict[str, Any]:
+        """The chunk as passed to the crew, with its content"""
+        return {"files": self.read(), "total_tokens": self.total_tokens, "file_count": self.file_count}
+
+    def describe(self) -> Dict[str, Any]:
+        """The chunk without its content"""
+        return {"files": self.names, "total_tokens": self.total_tokens, "file_count": self.file_count}
+
+    def __getitem__(self, key: str) -> Any:
+        # Same keys as the chunk dicts built before descriptors, "files" reads the content
+        if key == "files":
+            return self.read()
+        if key == "total_tokens":
+            return self.total_tokens
+        if key == "file_count":
+            return self.file_count
+        raise KeyError(key)
+
+    def __repr__(self) -> str:
+        return f"ChunkDescriptor({self.file_count} files, {self.total_tokens} tokens)"
@@ -0,0 +1,244 @@
+import os
+import heapq
+import logging
+import posixpath
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .symbol_index import ModuleResolver, extract_source_symbols, symbol_language
+
+# "greedy" closes a chunk as soon as the next file does not fit (files stay in order),
+# "packed" fills chunks close to the budget while keeping directories together,
+# "graph" keeps files importing each other together, then packs like "packed"
+CHUNK_STRATEGIES = ("greedy", "packed", "graph")
+
+
+def _directory(path: str) -> str:
+    return posixpath.dirname(path.replace("\\", "/"))
+
+
+def _shared_depth(a: str, b: str) -> int:
+    """Number of leading directory components two directories have in common"""
+    depth = 0
+    for x, y in zip(a.split("/"), b.split("/")):
+        if x != y:
+            break
+        depth += 1
+    return depth
+
+
+def plan_greedy(files: Sequence[Tuple[str, int]], max_tokens: int) -> List[List[int]]:
+    """Next-fit in input order: the current chunk is closed when the next file does not fit"""
+    groups: List[List[int]] = []
+    current: List[int] = []
+    total = 0
+    for index, (_, tokens) in enumerate(files):
+        if current and total + tokens > max_tokens:
+            groups.append(current)
+            current, total = [], 0
+        current.append(index)
+        total += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def first_fit_decreasing(sizes: Sequence[int], capacity: int) -> List[List[int]]:
+    """Classic first-fit-decreasing bin packing, returns the item indices of each bin"""
+    bins: List[List[int]] = []
+    loads: List[int] = []
+    for index in sorted(range(len(sizes)), key=lambda i: -sizes[i]):
+        for b, load in enumerate(loads):
+            if load + sizes[index] <= capacity:
+                bins[b].append(index)
+                loads[b] += sizes[index]
+                break
+        else:
+            bins.append([index])
+            loads.append(sizes[index])
+    return bins
+
+
+def plan_packed(files: Sequence[Tuple[str, int]], max_tokens: int) -> List[List[int]]:
+    """
+    First-fit-decreasing with directory locality. Files are packed within their
+    own directory first; the partially filled chunks left over are then merged,
+    largest first, into the fitting chunk whose directory is closest.
+    """
+    by_directory: Dict[str, List[int]] = {}
+    for index, (path, _) in enumerate(files):
+        by_directory.setdefault(_directory(path), []).append(index)
+
+    partial: List[Tuple[str, List[int], int]] = []
+    for directory, indices in by_directory.items():
+        for bin_items in first_fit_decreasing([files[i][1] for i in indices], max_tokens):
+            members = [indices[i] for i in bin_items]
+            partial.append((directory, members, sum(files[i][1] for i in members)))
+
+    merged: List[Tuple[str, List[int], int]] = []
+    for directory, members, load in sorted(partial, key=lambda p: (-p[2], p[0])):
+        best = None
+        best_rank = None
+        for position, (target_directory, _, target_load) in enumerate(merged):
+            if target_load + load > max_tokens:
+                continue
+            # Closest directory first, then the fullest chunk
+            rank = (_shared_depth(directory, target_directory), target_load)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = position, rank
+        if best is None:
+            merged.append((directory, list(members), load))
+        else:
+            target_directory, target_members, target_load = merged[best]
+            merged[best] = (target_directory, target_members + members, target_load + load)
+
+    groups = [sorted(members, key=lambda i: files[i][0]) for _, members, _ in merged]
+    return sorted(groups, key=lambda group: files[group[0]][0])
+
+
+def file_imports(path: str, content: str) -> List[Tuple[str, str]]:
+    """The (module, comma separated names) imports of a file, as extracted by the symbol index"""
+    language = symbol_language(path)
+    if language is None:
+        return []
+    try:
+        symbols = extract_source_symbols(content.encode("utf-8", errors="ignore"), language)
+    except Exception as e:
+        logging.warning(f"Could not extract the imports of '{path}': {e}")
+        return []
+    if not symbols:
+        return []
+    return [(module, names) for module, names, _ in symbols["imports"]]
+
+
+def resolve_import_edges(
+    paths: Sequence[str], imports: Sequence[Sequence[Tuple[str, str]]]
+) -> List[Tuple[int, int]]:
+    """
+    One undirected edge per pair of paths where one imports the other, imports[i]
+    being the file_imports of paths[i], resolved as in the symbol index.
+    """
+    if not paths:
+        return []
+    absolute = [os.path.abspath(path) for path in paths]
+    root = os.path.commonpath([os.path.dirname(path) for path in absolute])
+    relative = [os.path.relpath(path, root).replace(os.sep, "/") for path in absolute]
+    index_of = {path: i for i, path in enumerate(relative)}
+    resolver = ModuleResolver(relative)
+
+    edges = set()
+    for i, path in enumerate(paths):
+        language = symbol_language(path)
+        for module, names in imports[i]:
+            for target in resolver.resolve(relative[i], language, module, [n for n in names.split(",") if n]):
+                j = index_of[target]
+                edges.add((min(i, j), max(i, j)))
+    return sorted(edges)
+
+
+def import_edges(files: Sequence[Tuple[str, str]]) -> List[Tuple[int, int]]:
+    """Builds the import graph of (path, content) entries, see resolve_import_edges"""
+    return resolve_import_edges(
+        [path for path, _ in files], [file_imports(path, content) for path, content in files]
+    )
+
+
+def plan_graph(
+    files: Sequence[Tuple[str, int]], max_tokens: int, edges: Sequence[Tuple[int, int]]
+) -> List[List[int]]:
+    """
+    Agglomerative clustering of the import graph: the two clusters with the most edges
+    between them are merged first, as long as the merged cluster fits in max_tokens.
+    The clusters are then packed into chunks like the packed strategy.
+    """
+    members: Dict[int, List[int]] = {i: [i] for i in range(len(files))}
+    tokens: Dict[int, int] = {i: files[i][1] for i in range(len(files))}
+    adjacency: Dict[int, Dict[int, int]] = {i: {} for i in range(len(files))}
+    for a, b in edges:
+        if a != b:
+            adjacency[a][b] = adjacency[a].get(b, 0) + 1
+            adjacency[b][a] = adjacency[a][b]
+
+    # Most connected pairs first, smaller merged clusters on ties
+    heap = [(-weight, tokens[a] + tokens[b], a, b) for a in adjacency for b, weight in adjacency[a].items() if a < b]
+    heapq.heapify(heap)
+    while heap:
+        weight, _, a, b = heapq.heappop(heap)
+        if a not in members or b not in members or adjacency[a].get(b) != -weight:
+            continue
+        if tokens[a] + tokens[b] > max_tokens:
+            continue
+
+        # Merge b into a
+        members[a].extend(members.pop(b))
+        tokens[a] += tokens.pop(b)
+        del adjacency[a][b]
+        for neighbor, neighbor_weight in adjacency.pop(b).items():
+            if neighbor == a:
+                continue
+            del adjacency[neighbor][b]
+            adjacency[a][neighbor] = adjacency[a].get(neighbor, 0) + neighbor_weight
+            adjacency[neighbor][a] = adjacency[a][neighbor]
+        for neighbor, neighbor_weight in adjacency[a].items():
+            if tokens[a] + tokens[neighbor] <= max_tokens:
+                heapq.heappush(heap, (-neighbor_weight, tokens[a] + tokens[neighbor], min(a, neighbor), max(a, neighbor)))
+
+    # Clusters that could not be merged are packed largest first into the fitting
+    # chunk they share the most edges with, then the closest directory, then the fullest
+    chunks: List[Tuple[str, List[int], int]] = []
+    chunk_of: Dict[int, int] = {}
+    for cid in sorted(members, key=lambda c: (-tokens[c], files[min(members[c])][0])):
+        directory = _directory(files[members[cid][0]][0])
+        links: Dict[int, int] = {}
+        for neighbor, weight in adjacency[cid].items():
+            if neighbor in chunk_of:
+                links[chunk_of[neighbor]] = links.get(chunk_of[neighbor], 0) + weight
+        best = None
+        best_rank = None
+        for position, (chunk_directory, _, load) in enumerate(chunks):
+            if load + tokens[cid] > max_tokens:
+                continue
+            rank = (links.get(position, 0), _shared_depth(directory, chunk_directory), load)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = position, rank
+        if best is None:
+            chunks.append((directory, list(members[cid]), tokens[cid]))
+            best = len(chunks) - 1
+        else:
+            chunk_directory, chunk_members, load = chunks[best]
+            chunks[best] = (chunk_directory, chunk_members + members[cid], load + tokens[cid])
+        chunk_of[cid] = best
+
+    groups = [sorted(chunk_members, key=lambda i: files[i][0]) for _, chunk_members, _ in chunks]
+    return sorted(groups, key=lambda group: files[group[0]][0])
+
+
+def count_cut_edges(groups: Sequence[Sequence[int]], edges: Sequence[Tuple[int, int]]) -> int:
+    """Counts the edges whose ends landed in different chunks"""
+    chunk_of = {i: chunk for chunk, group in enumerate(groups) for i in group}
+    return sum(1 for a, b in edges if chunk_of.get(a, -1 - a) != chunk_of.get(b, -1 - b))
+
+
+def plan_chunks(
+    strategy: str,
+    files: Sequence[Tuple[str, int]],
+    max_tokens: int,
+    edges: Optional[Sequence[Tuple[int, int]]] = None,
+) -> List[List[int]]:
+    """Groups (path, tokens) entries, each within max_tokens, into chunks of entry indices"""
+    if strategy == "greedy":
+        return plan_greedy(files, max_tokens)
+    if strategy == "packed":
+        return plan_packed(files, max_tokens)
+    if strategy == "graph":
+        return plan_graph(files, max_tokens, edges or [])
+    raise ValueError(f"chunk strategy must be one of: {', '.join(CHUNK_STRATEGIES)}")
+
+
+def plan_stats(chunk_tokens: Sequence[int], max_tokens: int) -> Dict[str, Any]:
+    """Chunk count and how full the chunks are on average, relative to max_tokens"""
+    total = sum(chunk_tokens)
+    return {
+        "chunks": len(chunk_tokens),
+        "total_tokens": total,
+        "fill_ratio": total / (len(chunk_tokens) * max_tokens) if chunk_tokens and max_tokens else 0.0,
+    }
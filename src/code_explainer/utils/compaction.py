@@ -0,0 +1,306 @@
+import os
+import re
+import zlib
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .chunk_descriptor import read_source
+from .token_cache import content_hash
+
+COMPACTION_RULES = ("license", "banners", "blank_lines", "long_strings", "duplicates", "near_duplicates")
+
+# Line comment prefixes and block comment delimiters per file suffix
+_C_COMMENTS = (("//",), ("/*", "*/"))
+COMMENT_SYNTAX: Dict[str, Tuple[Tuple[str, ...], Optional[Tuple[str, str]]]] = {
+    ".py": (("#",), None),
+    ".rb": (("#",), ("=begin", "=end")),
+    ".properties": (("#", "!"), None),
+    ".php": (("//", "#"), ("/*", "*/")),
+    ".xml": ((), ("<!--", "-->")),
+    **{
+        suffix: _C_COMMENTS
+        for suffix in (".go", ".c", ".cpp", ".h", ".cs", ".js", ".ts", ".scala", ".rs", ".java", ".gradle")
+    },
+}
+
+LICENSE_PATTERN = re.compile(
+    r"copyright|licen[cs]e|spdx-license-identifier|all rights reserved|permission is hereby granted", re.I
+)
+# Shebang and encoding declarations are kept above a stripped license header
+PREAMBLE_PATTERN = re.compile(r"#!.*\n|[ \t]*#.*coding[:=].*\n")
+# Runs of three or more line breaks, blank lines included, become a single blank line
+BLANK_RUN_PATTERN = re.compile(r"\n(?:[ \t]*\n){2,}")
+
+# Contents shorter than this are not worth replacing with a duplicate note
+MIN_DUPLICATE_CHARS = 256
+MIN_NEAR_DUPLICATE_CHARS = 1000
+
+# MinHash: 64 permutations in 16 bands of 4 rows, 5-word shingles
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+SHINGLE_WORDS = 5
+_MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+_rng = np.random.default_rng(42)
+_PERMUTATION_A = _rng.integers(1, int(_MERSENNE_PRIME), NUM_PERMUTATIONS, dtype=np.uint64)
+_PERMUTATION_B = _rng.integers(0, int(_MERSENNE_PRIME), NUM_PERMUTATIONS, dtype=np.uint64)
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def minhash(text: str) -> Optional[np.ndarray]:
+    """MinHash signature of the word shingles of a text, None when it is too short"""
+    words = _WORD_PATTERN.findall(text)
+    if len(words) < SHINGLE_WORDS:
+        return None
+    hashes = np.unique(np.fromiter(
+        (zlib.crc32(" ".join(words[i:i + SHINGLE_WORDS]).encode()) for i in range(len(words) - SHINGLE_WORDS + 1)),
+        dtype=np.uint64,
+    ))
+    signature = np.full(NUM_PERMUTATIONS, _MERSENNE_PRIME, dtype=np.uint64)
+    # 32-bit hashes times 31-bit coefficients stay below 2**63
+    for start in range(0, len(hashes), 4096):
+        block = hashes[start:start + 4096, None]
+        signature = np.minimum(signature, ((block * _PERMUTATION_A + _PERMUTATION_B) % _MERSENNE_PRIME).min(axis=0))
+    return signature
+
+
+def strip_license(text: str, syntax) -> Tuple[str, List[str]]:
+    """Removes the leading comment block of a file when it is a license header"""
+    line_prefixes, block = syntax
+    start = 0
+    for _ in range(2):
+        match = PREAMBLE_PATTERN.match(text, start)
+        if match is None:
+            break
+        start = match.end()
+
+    position = start
+    in_block = False
+    while position < len(text):
+        newline = text.find("\n", position)
+        line_end = len(text) if newline == -1 else newline + 1
+        line = text[position:line_end].strip()
+        if in_block:
+            in_block = block[1] not in line
+        elif not line or (line_prefixes and line.startswith(line_prefixes)):
+            pass
+        elif block and line.startswith(block[0]):
+            in_block = block[1] not in line[len(block[0]):]
+        else:
+            break
+        position = line_end
+
+    header = text[start:position]
+    if in_block or not LICENSE_PATTERN.search(header):
+        return text, []
+    return text[:start] + text[position:], [header]
+
+
+def _banner_pattern(syntax) -> Optional[re.Pattern]:
+    line_prefixes, block = syntax
+    prefixes = [re.escape(prefix) for prefix in line_prefixes]
+    if block:
+        prefixes += [re.escape(block[0]), r"\*"]
+    if not prefixes:
+        return None
+    # A comment line holding nothing but one separator character repeated
+    return re.compile(
+        rf"^[ \t]*(?:{'|'.join(prefixes)})[ \t]*([=\-*#/~_+])\1{{4,}}[ \t]*(?:\*/)?[ \t]*(?:\n|$)", re.M
+    )
+
+
+_banner_patterns = {suffix: _banner_pattern(syntax) for suffix, syntax in COMMENT_SYNTAX.items()}
+
+
+def strip_banners(text: str, suffix: str) -> Tuple[str, List[str]]:
+    pattern = _banner_patterns.get(suffix)
+    if pattern is None:
+        return text, []
+    removed: List[str] = []
+
+    def remove(match: re.Match) -> str:
+        removed.append(match.group(0))
+        return ""
+
+    return pattern.sub(remove, text), removed
+
+
+def collapse_blank_lines(text: str) -> Tuple[str, List[str]]:
+    removed: List[str] = []
+
+    def collapse(match: re.Match) -> str:
+        removed.append(match.group(0)[2:])
+        return "\n\n"
+
+    return BLANK_RUN_PATTERN.sub(collapse, text), removed
+
+
+def string_pattern(suffix: str) -> re.Pattern:
+    """
+    Single-line string literals, and line comments of the file's language. Matches are
+    found left to right, so every literal is matched from its opening quote, and quotes
+    inside comments do not start one.
+    """
+    line_prefixes = COMMENT_SYNTAX.get(suffix, ((), None))[0]
+    comment = "|".join(re.escape(prefix) for prefix in line_prefixes)
+    literal = r"""(?P<quote>["'`])(?P<body>(?:\\.|(?!(?P=quote))[^\\\n])*)(?P=quote)"""
+    return re.compile(rf"(?P<comment>(?:{comment})[^\n]*)|{literal}" if comment else literal)
+
+
+_string_patterns = {suffix: string_pattern(suffix) for suffix in COMMENT_SYNTAX}
+
+
+def truncate_strings(text: str, max_chars: int, suffix: str = "") -> Tuple[str, List[str]]:
+    """Truncates single-line string literals longer than max_chars"""
+    pattern = _string_patterns.get(suffix) or string_pattern(suffix)
+    removed: List[str] = []
+
+    def truncate(match: re.Match) -> str:
+        body = match.group("body")
+        if body is None or len(body) <= max_chars:
+            return match.group(0)
+        quote = match.group("quote")
+        removed.append(body[max_chars:])
+        return f"{quote}{body[:max_chars]}...{quote}"
+
+    return pattern.sub(truncate, text), removed
+
+
+class Compactor:
+    """
+    Compaction stage run between reading the codebase and chunking it: license
+    headers, comment banners, blank line runs and long string literals are stripped
+    or truncated, identical contents and near-duplicates (MinHash) are replaced by a
+    note pointing to the first copy. Tokens saved are counted per rule.
+    """
+
+    def __init__(
+        self,
+        count_tokens: Callable[[str], int],
+        rules: Optional[Sequence[str]] = None,
+        max_string_chars: Optional[int] = None,
+        near_duplicate_threshold: Optional[float] = None,
+        reader: Callable[[str], str] = read_source,
+    ):
+        if rules is None:
+            rules = [r.strip() for r in os.getenv("COMPACTION_RULES", ",".join(COMPACTION_RULES)).split(",") if r.strip()]
+        unknown = set(rules) - set(COMPACTION_RULES)
+        if unknown:
+            raise ValueError(f"compaction rules must be among: {', '.join(COMPACTION_RULES)}")
+        self.rules = set(rules)
+        self.count_tokens = count_tokens
+        self.max_string_chars = max_string_chars or int(os.getenv("COMPACT_MAX_STRING_CHARS", "200"))
+        self.near_duplicate_threshold = near_duplicate_threshold or float(
+            os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.9")
+        )
+        self.reader = reader
+        self.stats: Dict[str, Dict[str, int]] = {rule: {"files": 0, "tokens": 0} for rule in COMPACTION_RULES}
+        self.files = 0
+        # Duplicate detection state: first path of each content, then the path and MinHash
+        # signature of each original document, indexed by position in the LSH buckets
+        self.first_paths: Dict[str, str] = {}
+        self.signatures: List[Tuple[str, np.ndarray]] = []
+        self.buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(LSH_BANDS)]
+        # Files replaced by a duplicate note, so that reading them again gives the note
+        self.replaced: Dict[str, str] = {}
+
+    def _record(self, rule: str, removed: List[str], added: str = "") -> None:
+        if not removed:
+            return
+        self.stats[rule]["files"] += 1
+        saved = self.count_tokens("\n".join(removed)) - (self.count_tokens(added) if added else 0)
+        self.stats[rule]["tokens"] += max(saved, 0)
+
+    def compact_text(self, path: str, text: str, record: bool = True) -> str:
+        """Applies the rules working on a single file"""
+        suffix = os.path.splitext(path)[1].lower()
+        steps = []
+        syntax = COMMENT_SYNTAX.get(suffix)
+        if "license" in self.rules and syntax is not None:
+            steps.append(("license", lambda t: strip_license(t, syntax)))
+        if "banners" in self.rules:
+            steps.append(("banners", lambda t: strip_banners(t, suffix)))
+        if "long_strings" in self.rules:
+            steps.append(("long_strings", lambda t: truncate_strings(t, self.max_string_chars, suffix)))
+        if "blank_lines" in self.rules:
+            steps.append(("blank_lines", collapse_blank_lines))
+        for rule, step in steps:
+            text, removed = step(text)
+            if record:
+                self._record(rule, removed)
+        return text
+
+    def compact(self, path: str, text: str) -> str:
+        """Compacts a file, replacing it by a note when it duplicates one seen before"""
+        self.files += 1
+        text = self.compact_text(path, text)
+
+        if "duplicates" in self.rules and len(text) >= MIN_DUPLICATE_CHARS:
+            digest = content_hash(text)
+            first_path = self.first_paths.setdefault(digest, path)
+            if first_path != path:
+                return self._replace(path, text, "duplicates", f"Identical to {first_path}, see that file.")
+
+        if "near_duplicates" in self.rules and len(text) >= MIN_NEAR_DUPLICATE_CHARS:
+            signature = minhash(text)
+            if signature is not None:
+                match = self._near_duplicate_of(path, signature)
+                if match is not None:
+                    first_path, similarity = match
+                    return self._replace(
+                        path, text, "near_duplicates",
+                        f"Near-duplicate of {first_path} ({similarity:.0%} similar), see that file.",
+                    )
+        return text
+
+    def _near_duplicate_of(self, path: str, signature: np.ndarray) -> Optional[Tuple[str, float]]:
+        rows = NUM_PERMUTATIONS // LSH_BANDS
+        keys = [signature[band * rows:(band + 1) * rows].tobytes() for band in range(LSH_BANDS)]
+        candidates = {c for band, key in enumerate(keys) for c in self.buckets[band].get(key, ())}
+        best = None
+        for candidate in sorted(candidates):
+            candidate_path, candidate_signature = self.signatures[candidate]
+            # Documents split from one file share its path, they are not duplicates of each other
+            if candidate_path == path:
+                continue
+            similarity = float(np.mean(candidate_signature == signature))
+            if similarity >= self.near_duplicate_threshold and (best is None or similarity > best[1]):
+                best = (candidate_path, similarity)
+        if best is None:
+            # Only originals are indexed, duplicates always point to the first copy
+            self.signatures.append((path, signature))
+            for band, key in enumerate(keys):
+                self.buckets[band].setdefault(key, []).append(len(self.signatures) - 1)
+        return best
+
+    def _replace(self, path: str, text: str, rule: str, note: str) -> str:
+        self._record(rule, [text], note)
+        self.replaced[path] = note
+        return note
+
+    def iter_files(self, files: Iterable[Tuple[str, str]]) -> Iterator[Tuple[str, str]]:
+        for path, text in files:
+            yield path, self.compact(path, text)
+
+    def compact_document(self, doc: Dict[str, str]) -> Dict[str, str]:
+        """Compacts a document produced by RepoLoader"""
+        return {
+            **doc,
+            "source_file_contents": self.compact(doc["source_filename"], str(doc["source_file_contents"])),
+        }
+
+    def read(self, path: str) -> str:
+        """Reads a file already compacted again, as chunk descriptors do when dispatched"""
+        if path in self.replaced:
+            return self.replaced[path]
+        return self.compact_text(path, self.reader(path), record=False)
+
+    def report(self) -> Dict[str, Dict[str, int]]:
+        """Files changed and approximate tokens saved per enabled rule"""
+        return {rule: dict(self.stats[rule]) for rule in COMPACTION_RULES if rule in self.rules}
+
+    def print_report(self) -> None:
+        report = self.report()
+        total = sum(row["tokens"] for row in report.values())
+        details = ", ".join(f"{rule} {row['tokens']:,} ({row['files']} files)" for rule, row in report.items())
+        print(f"Compaction saved ~{total:,} tokens over {self.files} files: {details}")
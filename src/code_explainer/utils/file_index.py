@@ -0,0 +1,257 @@
+import os
+import re
+import logging
+from typing import Dict, Iterable, List, NamedTuple, Optional, Pattern, Tuple
+
+# The source files every consumer (LanguageParser, javalang and chunking) works on
+SOURCE_SUFFIXES = [
+    ".py",
+    ".go",
+    ".c",
+    ".cpp",
+    ".h",
+    ".cs",
+    ".php",
+    ".js",
+    ".ts",
+    ".scala",
+    ".rs",
+    ".rb",
+    ".java",
+    ".xml",
+    ".gradle",
+    ".properties",
+]
+
+# Vendored, generated and tooling directories that never reach the tokenizer
+IGNORED_DIRS = {
+    ".git",
+    ".hg",
+    ".svn",
+    ".idea",
+    ".vscode",
+    ".venv",
+    "venv",
+    ".tox",
+    ".nox",
+    ".mypy_cache",
+    ".pytest_cache",
+    "__pycache__",
+    "node_modules",
+    "bower_components",
+    "vendor",
+    "third_party",
+    "build",
+    "dist",
+    "target",
+    "obj",
+    ".gradle",
+    ".next",
+    "coverage",
+}
+
+MINIFIED_NAME = re.compile(r"\.min\.[a-z]+$|\.bundle\.js$")
+
+# Bytes read from each candidate file to detect binary and minified content
+SNIFF_BYTES = 8192
+MINIFIED_LINE_LENGTH = 500
+
+
+class IndexedFile(NamedTuple):
+    path: str
+    size: int
+    mtime_ns: int
+    suffix: str
+
+
+def _translate_gitignore(pattern: str) -> str:
+    """Translates a gitignore glob into a regular expression body."""
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            regex += "/.*"
+            i += 3
+        elif pattern[i] == "*":
+            regex += "[^/]*"
+            i += 1
+        elif pattern[i] == "?":
+            regex += "[^/]"
+            i += 1
+        elif pattern[i] == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                regex += re.escape(pattern[i])
+                i += 1
+            else:
+                regex += pattern[i:end + 1].replace("[!", "[^", 1)
+                i = end + 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return regex
+
+
+class GitignoreRules:
+    """The .gitignore patterns in effect for a directory, in the order git applies them."""
+
+    def __init__(self, rules: Optional[List[Tuple[str, Pattern, bool, bool]]] = None):
+        # (base directory relative to the root, compiled pattern, negated, directory only)
+        self.rules = rules or []
+
+    def extend(self, base: str, lines: Iterable[str]) -> "GitignoreRules":
+        rules = list(self.rules)
+        for line in lines:
+            line = line.rstrip("\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negated = line.startswith("!")
+            if negated:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            anchored = "/" in line
+            line = line.lstrip("/")
+            body = _translate_gitignore(line)
+            if not anchored:
+                body = "(?:.*/)?" + body
+            rules.append((base, re.compile(body + "$"), negated, dir_only))
+        return GitignoreRules(rules)
+
+    def ignored(self, rel_path: str, is_dir: bool) -> bool:
+        ignored = False
+        for base, pattern, negated, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if base:
+                if not rel_path.startswith(base + "/"):
+                    continue
+                candidate = rel_path[len(base) + 1:]
+            else:
+                candidate = rel_path
+            if pattern.match(candidate):
+                ignored = not negated
+        return ignored
+
+
+class FileIndex:
+    """
+    Single-pass index of the source files of a repository.
+
+    The tree is walked once with os.scandir, honoring .gitignore files and
+    skipping vendored/generated directories, binary and minified files and
+    files above the size limit. Every consumer reads from the same index.
+    """
+
+    _shared: Dict[str, "FileIndex"] = {}
+
+    def __init__(self, root: str, max_file_size: Optional[int] = None, respect_gitignore: bool = True):
+        self.root = root
+        self.max_file_size = max_file_size or int(os.getenv("MAX_FILE_SIZE_KB", "1024")) * 1024
+        self.respect_gitignore = respect_gitignore
+        self.files: List[IndexedFile] = []
+        self.skipped: Dict[str, int] = {}
+        self.build()
+
+    @classmethod
+    def for_root(cls, root: str, refresh: bool = False) -> "FileIndex":
+        """Returns the index shared by all consumers of a root, building it on first use"""
+        key = os.path.abspath(root)
+        if refresh or key not in cls._shared:
+            cls._shared[key] = cls(root)
+        return cls._shared[key]
+
+    def _skip(self, reason: str) -> None:
+        self.skipped[reason] = self.skipped.get(reason, 0) + 1
+
+    def build(self) -> None:
+        files = []
+        suffixes = set(SOURCE_SUFFIXES)
+        stack: List[Tuple[str, str, GitignoreRules]] = [(self.root, "", GitignoreRules())]
+        while stack:
+            directory, rel_dir, rules = stack.pop()
+            if self.respect_gitignore:
+                rules = self._load_gitignore(directory, rel_dir, rules)
+            try:
+                entries = list(os.scandir(directory))
+            except OSError as e:
+                logging.warning(f"Could not list '{directory}': {e}")
+                continue
+
+            for entry in entries:
+                rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    is_file = entry.is_file(follow_symlinks=False)
+                except OSError:
+                    continue
+
+                if is_dir:
+                    if entry.name in IGNORED_DIRS:
+                        self._skip("ignored_dir")
+                    elif rules.ignored(rel_path, is_dir=True):
+                        self._skip("gitignore")
+                    else:
+                        stack.append((entry.path, rel_path, rules))
+                    continue
+                if not is_file:
+                    continue
+
+                suffix = os.path.splitext(entry.name)[1]
+                if suffix not in suffixes:
+                    continue
+                if rules.ignored(rel_path, is_dir=False):
+                    self._skip("gitignore")
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+                if stat.st_size > self.max_file_size:
+                    self._skip("too_large")
+                    continue
+                reason = self._sniff(entry.path, entry.name)
+                if reason:
+                    self._skip(reason)
+                    continue
+                files.append(IndexedFile(entry.path, stat.st_size, stat.st_mtime_ns, suffix))
+
+        self.files = sorted(files, key=lambda f: f.path)
+        if self.skipped:
+            logging.info(f"File index of '{self.root}': {len(self.files)} files, skipped {self.skipped}")
+
+    def _load_gitignore(self, directory: str, rel_dir: str, rules: GitignoreRules) -> GitignoreRules:
+        path = os.path.join(directory, ".gitignore")
+        if not os.path.isfile(path):
+            return rules
+        try:
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                return rules.extend(rel_dir, f.readlines())
+        except OSError as e:
+            logging.warning(f"Could not read '{path}': {e}")
+            return rules
+
+    @staticmethod
+    def _sniff(path: str, name: str) -> Optional[str]:
+        """Returns why a file should be skipped, or None if it is a regular text file"""
+        if MINIFIED_NAME.search(name):
+            return "minified"
+        try:
+            with open(path, "rb") as f:
+                head = f.read(SNIFF_BYTES)
+        except OSError:
+            return "unreadable"
+        if b"\0" in head:
+            return "binary"
+        if len(head) == SNIFF_BYTES and head.count(b"\n") * MINIFIED_LINE_LENGTH < len(head):
+            return "minified"
+        return None
+
+    def paths(self, suffixes: Optional[Iterable[str]] = None) -> List[str]:
+        """Returns the indexed paths, optionally limited to some suffixes, sorted"""
+        if suffixes is None:
+            return [f.path for f in self.files]
+        suffixes = set(suffixes)
+        return [f.path for f in self.files if f.suffix in suffixes]
@@ -0,0 +1,183 @@
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import logging
+from typing import Iterable, Optional, Set, Tuple
+
+from git import Repo
+from git.exc import GitError
+
+# Oversized files are split into "<path>_part_N" entries by BatchProcessingManager
+PART_SUFFIX = re.compile(r"_part_\d+$")
+
+# Settings changing what a chunk analysis says: the LLM and how the code reaches it
+ANALYSIS_SETTINGS = (
+    "PROVIDER", "MODEL", "BASE_URL", "TEMPERATURE", "MAX_TOKENS",
+    "INGESTION_MODE", "ENABLE_COMPACTION", "COMPACTION_RULES", "COMPACT_MAX_STRING_CHARS",
+    "NEAR_DUPLICATE_THRESHOLD", "CHUNK_SPLIT", "CHUNK_HEADER_LINES", "ENABLE_SYMBOL_INDEX",
+)
+
+
+def source_path(chunk_file: str) -> str:
+    """Maps a chunk file entry back to the absolute path of the file it came from."""
+    return os.path.abspath(PART_SUFFIX.sub("", chunk_file))
+
+
+def analysis_fingerprint(config_paths: Iterable[str] = ()) -> str:
+    """
+    Hash of the analysis settings and of the agents and tasks configuration, results
+    produced under another fingerprint are not reused.
+    """
+    digest = hashlib.sha1()
+    for name in ANALYSIS_SETTINGS:
+        digest.update(f"{name}={os.getenv(name, '')}\n".encode("utf-8"))
+    for path in sorted(config_paths):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def head_commit(repo_path: str) -> Optional[str]:
+    """Returns the HEAD commit of the repository containing repo_path, if any."""
+    try:
+        return Repo(repo_path, search_parent_directories=True).head.commit.hexsha
+    except (GitError, ValueError) as e:
+        logging.info(f"No git history available for '{repo_path}': {e}")
+        return None
+
+
+def changed_files(repo_path: str, since_commit: str) -> Optional[Set[str]]:
+    """
+    Returns the absolute paths changed between since_commit and the working tree,
+    untracked files included. Returns None when the change set cannot be computed.
+    """
+    try:
+        repo = Repo(repo_path, search_parent_directories=True)
+        root = repo.working_tree_dir
+        changed = set()
+        for diff in repo.commit(since_commit).diff(None):
+            for path in (diff.a_path, diff.b_path):
+                if path:
+                    changed.add(os.path.abspath(os.path.join(root, path)))
+        for path in repo.untracked_files:
+            changed.add(os.path.abspath(os.path.join(root, path)))
+        return changed
+    except (GitError, ValueError) as e:
+        logging.warning(f"Could not compute changed files since '{since_commit}': {e}")
+        return None
+
+
+class AnalysisState:
+    """
+    Remembers the last analyzed commit of each repository and the result of every
+    chunk analyzed at that commit, so unchanged chunks can be reused on the next run.
+    """
+
+    def __init__(self, db_path: str = "./memory/analysis_state.db"):
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS repositories "
+            "(repo_key TEXT PRIMARY KEY, commit_sha TEXT, analyzed_at REAL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_results "
+            "(repo_key TEXT, chunk_key TEXT, commit_sha TEXT, files TEXT, result TEXT, "
+            "PRIMARY KEY (repo_key, chunk_key))"
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def chunk_key(files: Iterable[str], fingerprint: str = "") -> str:
+        return hashlib.sha1("\n".join([fingerprint, *sorted(files)]).encode("utf-8")).hexdigest()
+
+    def last_commit(self, repo_key: str) -> Optional[str]:
+        row = self.conn.execute(
+            "SELECT commit_sha FROM repositories WHERE repo_key = ?", (repo_key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def record_commit(self, repo_key: str, commit_sha: str) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO repositories (repo_key, commit_sha, analyzed_at) VALUES (?, ?, ?)",
+            (repo_key, commit_sha, time.time()),
+        )
+        self.conn.commit()
+
+    def get_chunk_result(self, repo_key: str, chunk_key: str) -> Optional[Tuple[str, str]]:
+        """Returns (commit_sha, result) of a previously analyzed chunk"""
+        row = self.conn.execute(
+            "SELECT commit_sha, result FROM chunk_results WHERE repo_key = ? AND chunk_key = ?",
+            (repo_key, chunk_key),
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def put_chunk_result(self, repo_key: str, chunk_key: str, commit_sha: str, files: Iterable[str], result: str) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO chunk_results (repo_key, chunk_key, commit_sha, files, result) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (repo_key, chunk_key, commit_sha, json.dumps(sorted(files)), result),
+        )
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class IncrementalPlan:
+    """
+    Decides, chunk by chunk, whether a prior analysis can be reused for the current run.
+    Only results produced with the same fingerprint, see analysis_fingerprint, are reused.
+    """
+
+    def __init__(self, state: AnalysisState, repo_key: str, repo_path: str, fingerprint: str = ""):
+        self.state = state
+        self.repo_key = repo_key
+        self.fingerprint = fingerprint
+        self.commit = head_commit(repo_path)
+        self.last_commit = state.last_commit(repo_key)
+        self.changed: Optional[Set[str]] = None
+        self.dirty: Set[str] = set()
+
+        if self.commit:
+            # Files differing from HEAD are analyzed but never stored as reusable
+            self.dirty = changed_files(repo_path, self.commit) or set()
+        if self.commit and self.last_commit:
+            self.changed = changed_files(repo_path, self.last_commit)
+
+        if self.changed is not None:
+            print(f"♻️  {len(self.changed)} files changed since last analyzed commit {self.last_commit[:8]}")
+
+    def reusable_result(self, files: Iterable[str]) -> Optional[str]:
+        """Returns the prior result of a chunk whose files did not change since the last run"""
+        if self.changed is None:
+            return None
+        files = list(files)
+        stored = self.state.get_chunk_result(self.repo_key, self.state.chunk_key(files, self.fingerprint))
+        if stored is None or stored[0] != self.last_commit:
+            return None
+        if any(source_path(f) in self.changed or source_path(f) in self.dirty for f in files):
+            return None
+        return stored[1]
+
+    def record(self, files: Iterable[str], result: str) -> None:
+        """Stores a chunk result as valid for the current commit"""
+        if not self.commit:
+            return
+        files = list(files)
+        if any(source_path(f) in self.dirty for f in files):
+            return
+        self.state.put_chunk_result(self.repo_key, self.state.chunk_key(files, self.fingerprint), self.commit, files, result)
+
+    def finish(self) -> None:
+        if self.commit:
+            self.state.record_commit(self.repo_key, self.commit)
+
+    def close(self) -> None:
+        """Closes the state the plan reads and records results in"""
+        self.state.close()
@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import atexit
+import hashlib
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from crewai import LLM
+
+from .llm_metrics import current_call
+
+
+def request_key(provider: str, model: str, temperature: Optional[float], max_tokens: Optional[int], messages, tools) -> str:
+    """Hash of everything deciding the completion of a request"""
+    payload = json.dumps(
+        {
+            "provider": provider,
+            "model": model,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "messages": messages,
+            "tools": tools,
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Disk-backed cache of LLM completions keyed by request hash. Entries expire after
+    ttl_days and the least recently used ones are evicted beyond max_mb. Only requests
+    made at a temperature up to max_temperature are cached, sampling at a higher one
+    is expected to give a different completion every time.
+    """
+
+    def __init__(
+        self,
+        db_path: str = "./memory/llm_cache.db",
+        ttl_days: Optional[float] = None,
+        max_mb: Optional[float] = None,
+        max_temperature: Optional[float] = None,
+    ):
+        self.ttl = (ttl_days if ttl_days is not None else float(os.getenv("LLM_CACHE_TTL_DAYS", "7"))) * 86400
+        self.max_bytes = int(
+            (max_mb if max_mb is not None else float(os.getenv("LLM_CACHE_MAX_MB", "200"))) * 1024 * 1024
+        )
+        self.max_temperature = (
+            max_temperature if max_temperature is not None else float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0"))
+        )
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses "
+            "(key TEXT PRIMARY KEY, response TEXT, size INTEGER, created_at REAL, last_used REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        if self.ttl > 0:
+            self.conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,))
+        self.conn.commit()
+        atexit.register(self.close)
+
+    def cacheable(self, temperature: Optional[float]) -> bool:
+        # No temperature means the provider default, usually well above zero
+        return temperature is not None and temperature <= self.max_temperature
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl > 0 and row[1] < now - self.ttl:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str) -> None:
+        now = time.time()
+        size = len(response.encode("utf-8", errors="surrogatepass"))
+        with self.lock:
+            try:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, size, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, response, size, now, now),
+                )
+                self._evict()
+                self.conn.commit()
+            except sqlite3.Error as e:
+                logging.warning(f"Could not cache LLM response: {e}")
+
+    def _evict(self) -> None:
+        """Deletes the least recently used entries until the cache fits max_bytes"""
+        excess = (self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]) - self.max_bytes
+        if excess <= 0:
+            return
+        evicted: List[str] = []
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            if excess <= 0:
+                break
+            evicted.append(key)
+            excess -= size
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", [(key,) for key in evicted])
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "skipped": self.skipped,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def print_stats(self) -> None:
+        stats = self.stats()
+        print(
+            f"LLM cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), "
+            f"{stats['skipped']} calls not cacheable"
+        )
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+
+class CachedLLM(LLM):
+    """LLM answering the requests it already completed from a ResponseCache"""
+
+    def __init__(self, cache: ResponseCache, provider: str, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+        self.provider = provider
+
+    def call(
+        self,
+        messages,
+        tools: Optional[List[dict]] = None,
+        callbacks: Optional[List[Any]] = None,
+        available_functions: Optional[Dict[str, Any]] = None,
+        from_task: Optional[Any] = None,
+        from_agent: Optional[Any] = None,
+    ):
+        # Completions running functions on the caller's side are not replayed
+        if available_functions or not self.cache.cacheable(self.temperature):
+            with self.cache.lock:
+                self.cache.skipped += 1
+            return self.complete(messages, tools, callbacks, available_functions, from_task, from_agent)
+
+        key = request_key(self.provider, self.model, self.temperature, self.max_tokens, messages, tools)
+        cached = self.cache.get(key)
+        if cached is not None:
+            metered = current_call()
+            if metered is not None:
+                metered["cached"] = True
+            return cached
+        response = self.complete(messages, tools, callbacks, available_functions, from_task, from_agent)
+        if isinstance(response, str) and response.strip():
+            self.cache.put(key, response)
+        return response
+
+    def complete(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None, from_agent=None):
+        """Completes the request at the provider, bypassing the cache"""
+        return super().call(messages, tools, callbacks, available_functions, from_task, from_agent)
@@ -0,0 +1,182 @@
+import os
+import csv
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from crewai import LLM
+from litellm.integrations.custom_logger import CustomLogger
+
+CALL_FIELDS = (
+    "task", "agent", "chunk", "provider", "model", "prompt_tokens", "completion_tokens",
+    "seconds", "retries", "cached", "error",
+)
+GROUPS = ("task", "agent", "chunk")
+
+# Labels of the calls made in the current context, e.g. the chunk being analyzed
+_scope: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("llm_metrics_scope", default={})
+# Record of the LLM call in progress, calls made while it runs are retries of it
+_current_call: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar(
+    "llm_metrics_call", default=None
+)
+
+
+@contextmanager
+def metrics_scope(**labels: Any) -> Iterator[None]:
+    """Labels the LLM calls made inside the block, e.g. metrics_scope(chunk=3)"""
+    token = _scope.set({**_scope.get(), **labels})
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def current_call() -> Optional[Dict[str, Any]]:
+    """The record of the LLM call in progress in this context, if any"""
+    return _current_call.get()
+
+
+class LLMMetrics:
+    """Collects one record per LLM call, aggregated per task, agent and chunk"""
+
+    def __init__(self):
+        self.calls: List[Dict[str, Any]] = []
+        self.lock = threading.Lock()
+
+    def record(self, call: Dict[str, Any]) -> None:
+        with self.lock:
+            self.calls.append({field: call.get(field) for field in CALL_FIELDS})
+
+    def clear(self) -> None:
+        with self.lock:
+            self.calls = []
+
+    @staticmethod
+    def _totals(calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "calls": len(calls),
+            "prompt_tokens": sum(call["prompt_tokens"] or 0 for call in calls),
+            "completion_tokens": sum(call["completion_tokens"] or 0 for call in calls),
+            "seconds": round(sum(call["seconds"] or 0.0 for call in calls), 3),
+            "retries": sum(call["retries"] or 0 for call in calls),
+            "cached": sum(1 for call in calls if call["cached"]),
+            "errors": sum(1 for call in calls if call["error"]),
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        with self.lock:
+            calls = list(self.calls)
+        summary: Dict[str, Any] = {"totals": self._totals(calls)}
+        for group in GROUPS:
+            grouped: Dict[str, List[Dict[str, Any]]] = {}
+            for call in calls:
+                if call[group] is not None:
+                    grouped.setdefault(str(call[group]), []).append(call)
+            summary[f"by_{group}"] = {label: self._totals(group_calls) for label, group_calls in grouped.items()}
+        return summary
+
+    def write(self, output_dir: str) -> List[str]:
+        """Writes llm_metrics.json (summary and calls) and llm_calls.csv to output_dir"""
+        os.makedirs(output_dir, exist_ok=True)
+        with self.lock:
+            calls = list(self.calls)
+        json_path = os.path.join(output_dir, "llm_metrics.json")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({**self.summary(), "calls": calls}, f, indent=2, ensure_ascii=False)
+        csv_path = os.path.join(output_dir, "llm_calls.csv")
+        with open(csv_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=CALL_FIELDS)
+            writer.writeheader()
+            writer.writerows(calls)
+        return [json_path, csv_path]
+
+    def print_summary(self) -> None:
+        summary = self.summary()
+        totals = summary["totals"]
+        print(
+            f"LLM usage: {totals['calls']} calls, {totals['prompt_tokens']:,} prompt and "
+            f"{totals['completion_tokens']:,} completion tokens, {totals['seconds']:.1f}s, "
+            f"{totals['retries']} retries, {totals['cached']} cached, {totals['errors']} failed"
+        )
+        for group in ("task", "agent"):
+            for label, row in sorted(summary[f"by_{group}"].items(), key=lambda item: -item[1]["seconds"]):
+                print(
+                    f"   {group} {label}: {row['calls']} calls, "
+                    f"{row['prompt_tokens'] + row['completion_tokens']:,} tokens, {row['seconds']:.1f}s"
+                )
+        chunks = summary["by_chunk"]
+        if chunks:
+            slowest = max(chunks.items(), key=lambda item: item[1]["seconds"])
+            print(f"   {len(chunks)} chunks, slowest is chunk {slowest[0]} ({slowest[1]['seconds']:.1f}s)")
+
+
+_llm_metrics = LLMMetrics()
+
+
+def get_llm_metrics() -> LLMMetrics:
+    """The metrics shared by every LLM of the process"""
+    return _llm_metrics
+
+
+class _UsageListener(CustomLogger):
+    """Receives the token usage crewai reports right after each completion"""
+
+    def log_success_event(self, kwargs, response_obj, start_time, end_time):
+        # crewai passes {"usage": ...} synchronously, within the call; litellm's own
+        # asynchronous logging passes the whole response and is left out
+        call = current_call()
+        if call is None or not isinstance(response_obj, dict) or not response_obj.get("usage"):
+            return
+        usage = response_obj["usage"]
+        get = usage.get if isinstance(usage, dict) else lambda name: getattr(usage, name, None)
+        call["prompt_tokens"] = get("prompt_tokens")
+        call["completion_tokens"] = get("completion_tokens")
+
+
+_usage_listener = _UsageListener()
+
+
+def meter_llm(llm: LLM, provider: str, metrics: Optional[LLMMetrics] = None) -> LLM:
+    """
+    Records the tokens, latency, retries and errors of every call of llm in LLMMetrics,
+    labelled with the calling task, its agent and the metrics scope. Calls made while
+    one is in progress, as crewai does to retry, count as retries of it.
+    """
+    metrics = metrics or get_llm_metrics()
+    complete = llm.call
+
+    def call(messages, tools=None, callbacks=None, available_functions=None, from_task=None, from_agent=None):
+        outer = current_call()
+        if outer is not None:
+            outer["retries"] += 1
+            return complete(messages, tools, callbacks, available_functions, from_task, from_agent)
+
+        agent = from_agent or getattr(from_task, "agent", None)
+        record = {
+            **_scope.get(),
+            "task": getattr(from_task, "name", None),
+            "agent": getattr(agent, "role", None),
+            "provider": provider,
+            "model": llm.model,
+            "retries": 0,
+            "cached": False,
+        }
+        token = _current_call.set(record)
+        start = time.perf_counter()
+        try:
+            return complete(
+                messages, tools, [*(callbacks or []), _usage_listener], available_functions, from_task, from_agent
+            )
+        except Exception as e:
+            record["error"] = str(e)
+            raise
+        finally:
+            record["seconds"] = round(time.perf_counter() - start, 3)
+            _current_call.reset(token)
+            metrics.record(record)
+
+    llm.call = call
+    return llm
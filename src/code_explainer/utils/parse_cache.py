@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import logging
+from typing import Any, Dict, List, Optional
+
+# Bump when the shape of the parsed documents changes to invalidate old entries
+PARSER_VERSION = "2"
+
+
+def git_blob_sha(data: bytes) -> str:
+    """Returns the SHA git would assign to a blob with this content."""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+class ParseCache:
+    """
+    On-disk cache of parsed documents, keyed by git blob SHA, file suffix, parser and
+    parser version. The suffix decides the language, so identical files of different
+    languages get their own entries.
+
+    File stats are remembered too, so a warm run over an unchanged checkout
+    only pays for a `stat` per file instead of reading and hashing it.
+    """
+
+    def __init__(self, db_path: str = "./memory/parse_cache.db", max_size_bytes: Optional[int] = None):
+        self.db_path = db_path
+        self.max_size_bytes = max_size_bytes or int(os.getenv("PARSE_CACHE_MAX_MB", "512")) * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files "
+            "(path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, blob_sha TEXT)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents "
+            "(key TEXT PRIMARY KEY, payload TEXT, size INTEGER, last_used REAL)"
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(blob_sha: str, parser: str, parser_threshold: int, suffix: str = "") -> str:
+        return f"{parser}:{PARSER_VERSION}:{parser_threshold}:{suffix.lower()}:{blob_sha}"
+
+    def blob_sha(self, path: str) -> str:
+        """Returns the blob SHA of a file, re-hashing it only when its stat changed"""
+        stat = os.stat(path)
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, blob_sha FROM files WHERE path = ?", (path,)
+        ).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+
+        with open(path, "rb") as f:
+            sha = git_blob_sha(f.read())
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files (path, size, mtime_ns, blob_sha) VALUES (?, ?, ?, ?)",
+            (path, stat.st_size, stat.st_mtime_ns, sha),
+        )
+        return sha
+
+    def get(self, path: str, parser: str, parser_threshold: int) -> Optional[List[Dict[str, Any]]]:
+        """Returns the cached documents for a file, or None on a miss"""
+        try:
+            key = self.make_key(self.blob_sha(path), parser, parser_threshold, os.path.splitext(path)[1])
+        except OSError:
+            self.misses += 1
+            return None
+
+        row = self.conn.execute("SELECT payload FROM documents WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.conn.execute("UPDATE documents SET last_used = ? WHERE key = ?", (time.time(), key))
+        return [{"source_filename": path, **doc} for doc in json.loads(row[0])]
+
+    def put(self, path: str, parser: str, parser_threshold: int, documents: List[Dict[str, Any]]) -> None:
+        """Stores the documents parsed from a file, without their source path"""
+        try:
+            key = self.make_key(self.blob_sha(path), parser, parser_threshold, os.path.splitext(path)[1])
+        except OSError as e:
+            logging.warning(f"Could not cache parse result for '{path}': {e}")
+            return
+
+        payload = json.dumps(
+            [{k: v for k, v in doc.items() if k != "source_filename"} for doc in documents],
+            ensure_ascii=False,
+        )
+        self.conn.execute(
+            "INSERT OR REPLACE INTO documents (key, payload, size, last_used) VALUES (?, ?, ?, ?)",
+            (key, payload, len(payload.encode("utf-8")), time.time()),
+        )
+
+    def evict(self) -> int:
+        """Drops the least recently used entries until the cache fits its size bound"""
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM documents").fetchone()[0]
+        evicted = 0
+        if total > self.max_size_bytes:
+            for key, size in self.conn.execute(
+                "SELECT key, size FROM documents ORDER BY last_used ASC"
+            ).fetchall():
+                if total <= self.max_size_bytes:
+                    break
+                self.conn.execute("DELETE FROM documents WHERE key = ?", (key,))
+                total -= size
+                evicted += 1
+        self.conn.commit()
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        entries, size = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM documents"
+        ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "size_bytes": size,
+        }
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
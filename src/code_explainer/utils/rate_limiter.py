@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import random
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from .llm_metrics import current_call
+
+# Whether this context already holds a concurrency slot, calls nested in an LLM call
+# (crewai calls the LLM again to drop an unsupported parameter) must not wait for another
+_holding_slot: contextvars.ContextVar[bool] = contextvars.ContextVar("rate_limiter_slot", default=False)
+
+
+class TokenBucket:
+    """Refilled with per_minute tokens a minute, holding at most a minute's worth"""
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.clock = clock
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Takes amount tokens, returns the seconds to wait until they are refilled"""
+        with self.lock:
+            self._refill()
+            # A request larger than the bucket would never fit, it waits for a full one
+            self.level -= min(amount, self.capacity)
+            return max(0.0, -self.level / self.rate)
+
+    def adjust(self, amount: float) -> None:
+        """Takes amount more tokens (or gives them back when negative) once the real cost is known"""
+        with self.lock:
+            self._refill()
+            self.level = min(self.capacity, self.level - amount)
+
+
+class AdaptiveConcurrency:
+    """
+    Limits the calls in flight. The limit is halved when the error rate of the recent
+    calls goes over error_rate and grows by one after a window of calls without errors.
+    """
+
+    def __init__(self, max_limit: int, error_rate: float = 0.2, window: int = 10):
+        self.max_limit = max(1, max_limit)
+        self.limit = self.max_limit
+        self.error_rate = error_rate
+        self.outcomes: deque = deque(maxlen=window)
+        self.active = 0
+        self.condition = threading.Condition()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        if _holding_slot.get():
+            yield
+            return
+        with self.condition:
+            while self.active >= self.limit:
+                self.condition.wait()
+            self.active += 1
+        token = _holding_slot.set(True)
+        try:
+            yield
+        finally:
+            _holding_slot.reset(token)
+            with self.condition:
+                self.active -= 1
+                self.condition.notify_all()
+
+    def record(self, ok: bool) -> None:
+        with self.condition:
+            self.outcomes.append(ok)
+            errors = self.outcomes.count(False)
+            if not ok and errors / len(self.outcomes) > self.error_rate and self.limit > 1:
+                self.limit = max(1, self.limit // 2)
+                self.outcomes.clear()
+                logging.info(f"LLM concurrency lowered to {self.limit}")
+            elif len(self.outcomes) == self.outcomes.maxlen and not errors and self.limit < self.max_limit:
+                self.limit += 1
+                self.outcomes.clear()
+                logging.info(f"LLM concurrency raised to {self.limit}")
+                self.condition.notify_all()
+
+
+def retryable(error: BaseException) -> bool:
+    """Rate limits (429), timeouts (408) and server errors (5xx) are worth retrying"""
+    for e in (error, error.__cause__):
+        status = getattr(e, "status_code", None)
+        if isinstance(status, int) and (status in (408, 429) or status >= 500):
+            return True
+    return False
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    try:
+        return float(headers.get("retry-after")) if headers else None
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_tokens(messages: Any, max_tokens: Optional[int]) -> int:
+    """Rough token count of a request, about four characters a token, plus its completion budget"""
+    text = messages if isinstance(messages, str) else json.dumps(messages, default=str)
+    return len(text) // 4 + (max_tokens or 0)
+
+
+class RateLimiter:
+    """
+    Keeps the calls to one provider model within its requests and tokens per minute
+    (0 for no limit), adapts their concurrency to the errors seen and retries rate
+    limits and server errors with exponential backoff and full jitter.
+    """
+
+    def __init__(
+        self,
+        rpm: float = 0,
+        tpm: float = 0,
+        max_concurrency: int = 4,
+        max_retries: int = 5,
+        backoff_seconds: float = 1.0,
+        max_backoff_seconds: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.requests = TokenBucket(rpm, clock) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm, clock) if tpm > 0 else None
+        self.concurrency = AdaptiveConcurrency(max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.sleep = sleep
+
+    def _throttle(self, estimate: int) -> None:
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.reserve(estimate))
+        if wait > 0:
+            self.sleep(wait)
+
+    def backoff(self, attempt: int, error: BaseException) -> float:
+        delay = random.uniform(0, min(self.max_backoff_seconds, self.backoff_seconds * 2 ** attempt))
+        return max(delay, _retry_after(error) or 0.0)
+
+    def run(self, complete: Callable[[], Any], estimate: int = 0) -> Any:
+        """Calls complete within the limits, retrying it while it fails with a retryable error"""
+        attempt = 0
+        while True:
+            self._throttle(estimate)
+            with self.concurrency.slot():
+                try:
+                    response = complete()
+                except Exception as e:
+                    if not retryable(e):
+                        raise
+                    self.concurrency.record(False)
+                    if attempt >= self.max_retries:
+                        raise
+                    error = e
+                else:
+                    self.concurrency.record(True)
+                    self._settle(estimate)
+                    return response
+            delay = self.backoff(attempt, error)
+            logging.warning(f"LLM call failed ({error}), retrying in {delay:.1f}s")
+            metered = current_call()
+            if metered is not None:
+                metered["retries"] += 1
+            attempt += 1
+            self.sleep(delay)
+
+    def _settle(self, estimate: int) -> None:
+        """Charges the tokens per minute with the usage reported for the call instead of its estimate"""
+        metered = current_call()
+        if self.tokens is None or metered is None or metered.get("prompt_tokens") is None:
+            return
+        used = (metered.get("prompt_tokens") or 0) + (metered.get("completion_tokens") or 0)
+        self.tokens.adjust(used - estimate)
+
+
+def _setting(name: str, default: str, cast: Callable[[str], Any]) -> Any:
+    value = os.getenv(name, default)
+    try:
+        return cast(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number, got '{value}'")
+
+
+_limiters: Dict[Tuple[str, str], RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str, model: str) -> RateLimiter:
+    """The limiter shared by every LLM of the process calling model at provider"""
+    with _limiters_lock:
+        key = (provider, model)
+        if key not in _limiters:
+            _limiters[key] = RateLimiter(
+                rpm=_setting("LLM_RPM", "0", float),
+                tpm=_setting("LLM_TPM", "0", float),
+                max_concurrency=_setting("LLM_MAX_CONCURRENCY", "4", int),
+                max_retries=_setting("LLM_MAX_RETRIES", "5", int),
+                backoff_seconds=_setting("LLM_BACKOFF_SECONDS", "1", float),
+                max_backoff_seconds=_setting("LLM_MAX_BACKOFF_SECONDS", "60", float),
+            )
+        return _limiters[key]
+
+
+def limit_llm(llm: Any, limiter: RateLimiter) -> Any:
+    """
+    Sends the completions of llm through limiter. Cached LLMs only reach the provider
+    through complete, so cache hits do not count against the limits.
+    """
+    name = "complete" if hasattr(llm, "complete") else "call"
+    complete = getattr(llm, name)
+
+    def limited(messages, tools=None, callbacks=None, available_functions=None, from_task=None, from_agent=None):
+        return limiter.run(
+            lambda: complete(messages, tools, callbacks, available_functions, from_task, from_agent),
+            estimate_tokens(messages, getattr(llm, "max_tokens", None)),
+        )
+
+    setattr(llm, name, limited)
+    return llm
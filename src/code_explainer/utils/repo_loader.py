@@ -1,10 +1,18 @@
 import os
 import re
 import json
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterator, List, Optional, Tuple
 from git import Repo
-from git.exc import GitCommandError
-from langchain_community.document_loaders.generic import GenericLoader
+from git.exc import GitCommandError, InvalidGitRepositoryError, NoSuchPathError
+from langchain_community.document_loaders.blob_loaders import Blob
 from langchain_community.document_loaders.parsers import LanguageParser
+from .file_index import FileIndex, SOURCE_SUFFIXES
+from .parse_cache import ParseCache
+from .compaction import Compactor
+from .skeleton import SKELETON_PARSER, extract_skeleton, skeleton_language
+from .symbol_index import SymbolIndex
 import javalang
 from javalang.parser import JavaSyntaxError
 import logging
@@ -13,13 +21,110 @@ logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
 
+# Files handed to the process pool per worker at a time while streaming
+PARSE_WINDOW_PER_WORKER = 64
+
+INGESTION_MODES = ("full", "skeleton")
+
+# Files parsed with LanguageParser; .java files go through javalang instead
+LANGUAGE_PARSER_SUFFIXES = [suffix for suffix in SOURCE_SUFFIXES if suffix != ".java"]
+
+
+def _language_parser_documents(path: str, parser_threshold: int) -> List[Dict[str, str]]:
+    parser = LanguageParser(parser_threshold=parser_threshold)
+    return [
+        {
+            "source_filename": doc.metadata["source"],
+            "programming_language": doc.metadata.get("language", "unknown"),
+            "source_file_contents": doc.page_content,
+        }
+        for doc in parser.lazy_parse(Blob.from_path(path))
+    ]
+
+
+def _parse_source_file(task: Tuple[str, str, int]) -> Tuple[List[Dict[str, str]], Optional[str]]:
+    """
+    Parses a single file and returns its document dicts plus an error message.
+    Runs inside the worker processes, so a failing file never aborts the others.
+    """
+    path, language, parser_threshold = task
+    try:
+        if language == SKELETON_PARSER:
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                skeleton_lang = skeleton_language(path)
+                skeleton = extract_skeleton(f.read(), skeleton_lang)
+            if skeleton is not None:
+                return [
+                    {
+                        "source_filename": path,
+                        "programming_language": skeleton_lang,
+                        "source_file_contents": skeleton,
+                    }
+                ], None
+            # Unparseable or declaration-free files are sent as they are
+            return _language_parser_documents(path, parser_threshold), None
+        if language == "java":
+            parsed = RepoLoader().parse_java_file(path)
+            if parsed is None:
+                return [], None
+            return [
+                {
+                    "source_filename": path,
+                    "programming_language": "java",
+                    "source_file_contents": parsed,
+                }
+            ], None
+        return _language_parser_documents(path, parser_threshold), None
+    except Exception as e:
+        return [], f"Failed to parse '{path}': {e}"
+
 
 class RepoLoader:
-    def __init__(self, repo_path: str = "./repos/"):
+    def __init__(
+        self,
+        repo_path: str = "./repos/",
+        max_workers: Optional[int] = None,
+        parse_cache: Optional[ParseCache] = None,
+        ingestion_mode: Optional[str] = None,
+        symbol_index_path: Optional[str] = None,
+        compactor: Optional[Compactor] = None,
+    ):
         self.repo_path = repo_path
         self.local_repo_path = None
+        self.parse_cache = parse_cache
+        # When set, the symbol index of the loaded repository is kept up to date in this database
+        self.symbol_index_path = symbol_index_path
+        # When set, documents go through the compaction stage before being returned
+        self.compactor = compactor
+        # "full" sends the source text, "skeleton" only declarations, signatures and docstrings
+        self.ingestion_mode = ingestion_mode or os.getenv("INGESTION_MODE", "full").lower()
+        if self.ingestion_mode not in INGESTION_MODES:
+            raise ValueError(f"ingestion mode must be one of: {', '.join(INGESTION_MODES)}")
+        self.max_workers = max_workers or int(
+            os.getenv("LOADER_WORKERS", os.cpu_count() or 1)
+        )
+
+    def clone_repo(
+        self,
+        remote_repo_url,
+        depth: Optional[int] = None,
+        blob_filter: Optional[str] = None,
+        sparse_paths: Optional[List[str]] = None,
+        update: Optional[bool] = None,
+    ):
+        """
+        Clones the repository, shallow by default. An existing checkout is updated
+        in place with a fetch and hard reset instead of being cloned again.
+        """
+        if depth is None:
+            depth = int(os.getenv("CLONE_DEPTH", "1"))
+        if blob_filter is None:
+            blob_filter = os.getenv("CLONE_FILTER") or None
+        if sparse_paths is None:
+            sparse_paths = [p.strip() for p in os.getenv("CLONE_SPARSE_PATHS", "").split(",") if p.strip()]
+        if update is None:
+            update = os.getenv("CLONE_UPDATE", "true").lower() == "true"
 
-    def clone_repo(self, remote_repo_url):
         if not os.path.exists(self.repo_path):
             try:
                 os.makedirs(self.repo_path)
@@ -42,17 +147,33 @@ class RepoLoader:
         self.local_repo_path = os.path.join(self.repo_path, repo_name)
 
         if os.path.exists(self.local_repo_path):
-            logging.info(
-                f"Local repo path '{self.local_repo_path}' already exists. Skipping cloning."
-            )
-            print("Local repo path already exists. Not cloning.")
+            if not update:
+                logging.info(
+                    f"Local repo path '{self.local_repo_path}' already exists. Skipping cloning."
+                )
+                print("Local repo path already exists. Not cloning.")
+                return self.local_repo_path
+            self._update_repo(self.local_repo_path, depth, sparse_paths)
             return self.local_repo_path
         else:
             logging.info(
                 f"Cloning repo '{remote_repo_url}' to '{self.local_repo_path}'..."
             )
+            clone_kwargs = {}
+            multi_options = []
+            if depth:
+                clone_kwargs["depth"] = depth
+            if blob_filter:
+                multi_options.append(f"--filter={blob_filter}")
+            if sparse_paths:
+                multi_options.append("--no-checkout")
+            if multi_options:
+                clone_kwargs["multi_options"] = multi_options
             try:
-                Repo.clone_from(remote_repo_url, to_path=self.local_repo_path)
+                repo = Repo.clone_from(remote_repo_url, to_path=self.local_repo_path, **clone_kwargs)
+                if sparse_paths:
+                    repo.git.sparse_checkout("set", *sparse_paths)
+                    repo.git.checkout()
                 return self.local_repo_path
             except GitCommandError as e:
                 error_message = f"Error cloning repository '{remote_repo_url}' to '{self.local_repo_path}': {e}"
@@ -60,6 +181,23 @@ class RepoLoader:
                 print(error_message)
                 return None
 
+    def _update_repo(self, local_path: str, depth: int, sparse_paths: List[str]) -> None:
+        """Fetches the tracked branch and hard-resets the checkout onto it"""
+        try:
+            repo = Repo(local_path)
+            branch = "HEAD" if repo.head.is_detached else repo.active_branch.name
+            fetch_kwargs = {"depth": depth} if depth else {}
+            logging.info(f"Updating existing checkout '{local_path}' from origin/{branch}...")
+            repo.git.fetch("origin", branch, **fetch_kwargs)
+            if sparse_paths:
+                repo.git.sparse_checkout("set", *sparse_paths)
+            repo.git.reset("--hard", "FETCH_HEAD")
+            print("Local repo path already exists. Updated to the latest remote commit.")
+        except (GitCommandError, InvalidGitRepositoryError, NoSuchPathError) as e:
+            warning_message = f"Could not update '{local_path}': {e}. Analyzing the existing checkout."
+            logging.warning(warning_message)
+            print(warning_message)
+
     def parse_java_file(self, file_path: str):
         try:
             with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
@@ -104,68 +242,159 @@ class RepoLoader:
             print(error_message)
             return None
 
-    def load_repo(self, local_path: str = None, parser_threshold: int = 50):
+    def _collect_parse_tasks(self, target_path: str, parser_threshold: int) -> List[Tuple[str, str, int]]:
+        """
+        Lists the files to parse, in a deterministic order. Loading is the first step
+        of a run, so the shared file index is rebuilt here and reused by chunking.
+        """
+        index = FileIndex.for_root(target_path, refresh=True)
+        tasks = [
+            (path, self._parser_for(path), parser_threshold)
+            for path in index.paths(LANGUAGE_PARSER_SUFFIXES)
+        ]
+        tasks.extend((path, "java", parser_threshold) for path in index.paths([".java"]))
+        return tasks
+
+    def _parser_for(self, path: str) -> str:
+        if self.ingestion_mode == "skeleton" and skeleton_language(path):
+            return SKELETON_PARSER
+        return "language_parser"
+
+    def _iter_parsed(self, tasks: List[Tuple[str, str, int]]) -> Iterator[Tuple[List[Dict[str, str]], Optional[str]]]:
+        """
+        Yields the parse result of each task in order, one window at a time,
+        so only a bounded number of parsed files is held in memory.
+        """
+        workers = min(self.max_workers, len(tasks))
+        executor = None
+        if workers > 1:
+            try:
+                executor = ProcessPoolExecutor(max_workers=workers)
+            except (OSError, NotImplementedError) as e:
+                warning_message = f"Parallel parsing unavailable ({e}). Falling back to a single process."
+                logging.warning(warning_message)
+                print(warning_message)
+
+        window = max(1, workers) * PARSE_WINDOW_PER_WORKER
+        try:
+            for start in range(0, len(tasks), window):
+                results, executor = self._parse_window(tasks[start:start + window], executor)
+                yield from results
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            if self.parse_cache is not None:
+                self.parse_cache.evict()
+                stats = self.parse_cache.stats()
+                print(
+                    f"Parse cache: {stats['hits']} hits, {stats['misses']} misses "
+                    f"({stats['hit_rate']:.0%} hit rate, {stats['entries']} entries)"
+                )
+
+    def _parse_window(self, tasks, executor):
+        """Parses a window of tasks, serving unchanged files from the parse cache when available"""
+        results: List[Optional[Tuple[List[Dict[str, str]], Optional[str]]]] = [None] * len(tasks)
+        pending = []
+        for index, (path, parser, parser_threshold) in enumerate(tasks):
+            cached = None
+            if self.parse_cache is not None:
+                cached = self.parse_cache.get(path, parser, parser_threshold)
+            if cached is not None:
+                results[index] = (cached, None)
+            else:
+                pending.append(index)
+
+        parsed, executor = self._parse_uncached([tasks[index] for index in pending], executor)
+        for index, (docs, error) in zip(pending, parsed):
+            results[index] = (docs, error)
+            if error is None and self.parse_cache is not None:
+                path, parser, parser_threshold = tasks[index]
+                self.parse_cache.put(path, parser, parser_threshold, docs)
+        return results, executor
+
+    def _parse_uncached(self, tasks, executor):
+        """Parses files on the process pool, keeping the results in task order"""
+        if executor is not None and len(tasks) > 1:
+            chunksize = max(1, len(tasks) // (self.max_workers * 4))
+            try:
+                return list(executor.map(_parse_source_file, tasks, chunksize=chunksize)), executor
+            except BrokenProcessPool as e:
+                warning_message = f"Parallel parsing unavailable ({e}). Falling back to a single process."
+                logging.warning(warning_message)
+                print(warning_message)
+                executor.shutdown()
+                executor = None
+        return [_parse_source_file(task) for task in tasks], executor
+
+    def iter_documents(self, local_path: str = None, parser_threshold: int = 50) -> Iterator[Dict[str, str]]:
+        """Yields the parsed documents of the repository one at a time"""
         target_path = local_path or self.local_repo_path
         if not target_path:
             raise ValueError("No local repository path specified or cloned.")
 
-        document_dicts = []
-
-        # Load all files except .java with LanguageParser
-        suffixes = [
-            ".py",
-            ".go",
-            ".c",
-            ".cpp",
-            ".h",
-            ".cs",
-            ".php",
-            ".js",
-            ".ts",
-            ".scala",
-            ".rs",
-            ".xml",
-            ".gradle",
-            ".properties",
-        ]
+        # Non-Java files go through LanguageParser, .java files through javalang
+        tasks = self._collect_parse_tasks(target_path, parser_threshold)
+        if self.symbol_index_path:
+            self.update_symbol_index(target_path, [path for path, _, _ in tasks])
+        logging.info(f"Parsing {len(tasks)} files with up to {self.max_workers} workers...")
+        return self._iter_task_documents(tasks)
+
+    def update_symbol_index(self, target_path: str, paths: List[str]) -> Dict[str, int]:
+        """Re-indexes the symbols of the files changed since the last load"""
+        index = SymbolIndex(target_path, db_path=self.symbol_index_path)
         try:
-            loader = GenericLoader.from_filesystem(
-                target_path,
-                glob="**/*",
-                suffixes=suffixes,
-                parser=LanguageParser(parser_threshold=parser_threshold),
-                show_progress=True,
-            )
-            for doc in loader.load():
-                document_dicts.append(
-                    {
-                        "source_filename": doc.metadata["source"],
-                        "programming_language": doc.metadata.get("language", "unknown"),
-                        "source_file_contents": doc.page_content,
-                    }
-                )
-        except Exception as e:
-            error_message = f"Error loading non-Java files: {e}"
-            logging.error(error_message)
-            print(error_message)
-            # Decide if you want to continue loading Java files even if this fails
-            # For now, let's continue.
-
-        # Manually parse Java files with javalang
-        for root, _, files in os.walk(target_path):
-            for file in files:
-                if file.endswith(".java"):
-                    path = os.path.join(root, file)
-                    parsed = self.parse_java_file(path)
-                    if parsed is not None:
-                        document_dicts.append(
-                            {
-                                "source_filename": path,
-                                "programming_language": "java",
-                                "source_file_contents": parsed,
-                            }
-                        )
+            result = index.update(paths, max_workers=self.max_workers)
+            stats = index.stats()
+        finally:
+            index.close()
+        print(
+            f"Symbol index: {result['updated']} files updated, {result['removed']} removed "
+            f"({stats['definitions']} definitions, {stats['edges']} dependencies)"
+        )
+        return result
+
+    def _iter_task_documents(self, tasks: List[Tuple[str, str, int]]) -> Iterator[Dict[str, str]]:
+        for docs, error in self._iter_parsed(tasks):
+            if error:
+                logging.error(error)
+                print(error)
+                continue
+            if self.compactor is None:
+                yield from docs
+            else:
+                yield from map(self.compactor.compact_document, docs)
+        if self.compactor is not None:
+            self.compactor.print_report()
+
+    def write_jsonl(self, output_path: str, local_path: str = None, parser_threshold: int = 50) -> int:
+        """Streams the parsed documents to a JSONL file and returns how many were written"""
+        output_dir = os.path.dirname(output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+        count = 0
+        total_size = 0
+        with open(output_path, "w", encoding="utf-8") as f:
+            for doc in self.iter_documents(local_path=local_path, parser_threshold=parser_threshold):
+                f.write(json.dumps(doc, ensure_ascii=False) + "\n")
+                count += 1
+                total_size += sum(len(str(v)) for v in doc.values())
+        print(f"Total size of all documents: {total_size}")
+        return count
+
+    def load_repo(self, local_path: str = None, parser_threshold: int = 50):
+        document_dicts = list(
+            self.iter_documents(local_path=local_path, parser_threshold=parser_threshold)
+        )
 
         total_size = sum(sum(len(str(v)) for v in d.values()) for d in document_dicts)
         print(f"Total size of all documents: {total_size}")
         return json.dumps(document_dicts, ensure_ascii=False)
+
+
+def iter_jsonl(path: str) -> Iterator[Dict[str, str]]:
+    """Reads back the documents written by RepoLoader.write_jsonl, one at a time."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
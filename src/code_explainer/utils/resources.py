@@ -0,0 +1,81 @@
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+from crewai import LLM
+from crewai.memory import EntityMemory, LongTermMemory, ShortTermMemory
+
+from .llm_cache import ResponseCache
+from .storage_config import get_entity_memory, get_long_term_memory, get_short_term_memory
+from .utils import ContextManager, LLM_Config, print_output
+
+T = TypeVar("T")
+
+# Resources of the crew built on first use, keyed by the settings they were built from,
+# so that every CodeExplainer of the process shares them across runs
+_resources: Dict[Tuple, Any] = {}
+_lock = threading.RLock()
+
+
+def shared(key: Tuple, factory: Callable[[], T]) -> T:
+    """Returns the resource built by factory for key, building it on first use only"""
+    with _lock:
+        if key not in _resources:
+            _resources[key] = factory()
+        return _resources[key]
+
+
+def clear_resources() -> None:
+    """Forgets the shared resources, the next use builds them again"""
+    with _lock:
+        _resources.clear()
+
+
+def _env_number(name: str, cast: Callable[[str], Any]) -> Optional[Any]:
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return None
+    try:
+        return cast(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number, got '{value}'")
+
+
+def llm_settings() -> Dict[str, Any]:
+    """LLM settings read from the environment, validated before anything is built"""
+    provider = os.getenv("PROVIDER")
+    model = os.getenv("MODEL")
+    if not provider or not model:
+        raise ValueError("Set PROVIDER and MODEL to choose the LLM")
+    return {
+        "provider": provider,
+        "model": model,
+        "base_url": os.getenv("BASE_URL"),
+        "temperature": _env_number("TEMPERATURE", float),
+        "max_tokens": _env_number("MAX_TOKENS", int),
+        "timeout": _env_number("TIMEOUT", float),
+    }
+
+
+def get_llm() -> LLM:
+    settings = llm_settings()
+    cached = os.getenv("ENABLE_LLM_CACHE", "true").lower() == "true"
+
+    def build() -> LLM:
+        cache = shared(("llm_cache",), ResponseCache) if cached else None
+        return LLM_Config(**settings, callbacks=[print_output], cache=cache)
+
+    return shared(("llm", tuple(sorted(settings.items())), cached), build)
+
+
+def get_memories() -> Tuple[LongTermMemory, ShortTermMemory, EntityMemory]:
+    """Long-term, short-term and entity memory shared by the crews"""
+    key = ("memories", *(os.getenv(name) for name in ("QDRANT_MODE", "QDRANT_HOST", "QDRANT_URL", "EMBEDDER")))
+    return shared(key, lambda: (get_long_term_memory(), get_short_term_memory(), get_entity_memory()))
+
+
+def get_context_manager() -> ContextManager:
+    """Token counting and chunking, with the same encoder main.run uses so token counts are shared"""
+    max_tokens = int(os.getenv("CONTEXT_CHUNK_SIZE", "6000"))
+    model = os.getenv("TIKTOKEN_MODEL", "gpt-4o-mini")
+    return shared(("context_manager", max_tokens, model), lambda: ContextManager(max_tokens=max_tokens, model=model))
@@ -0,0 +1,131 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .chunk_descriptor import ChunkDescriptor
+
+RUN_STATUSES = ("running", "incomplete", "failed", "completed")
+
+
+def plan_hash(chunks: Sequence[ChunkDescriptor]) -> str:
+    """Hash of a chunk plan: the files of each chunk, in order, and their token counts"""
+    digest = hashlib.sha1()
+    for chunk in chunks:
+        digest.update(("\n".join(chunk.names) + f"\n{chunk.total_tokens}\n\n").encode("utf-8"))
+    return digest.hexdigest()
+
+
+def run_id(repo_key: str, commit: Optional[str], plan: str) -> str:
+    """A run is identified by the repository, its commit and the chunk plan"""
+    return hashlib.sha1(f"{repo_key}\n{commit or ''}\n{plan}".encode("utf-8")).hexdigest()[:16]
+
+
+class RunJournal:
+    """
+    Journal of batch runs: the output of every completed unit of a run (chunk analyses,
+    aggregation, report tasks) is stored as soon as it is produced, so that a run
+    stopped halfway can be resumed from its first incomplete unit.
+    """
+
+    def __init__(self, db_path: str = "./memory/run_journal.db"):
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        # Report tasks may complete on crewai worker threads
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS runs "
+            "(run_id TEXT PRIMARY KEY, repo_key TEXT, commit_sha TEXT, plan_hash TEXT, "
+            "chunk_count INTEGER, status TEXT, started_at REAL, updated_at REAL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS units "
+            "(run_id TEXT, unit TEXT, output TEXT, completed_at REAL, PRIMARY KEY (run_id, unit))"
+        )
+        self.conn.commit()
+
+    def start(
+        self, repo_key: str, commit: Optional[str], plan: str, chunk_count: int, resume: bool = False
+    ) -> Tuple[str, Dict[str, str]]:
+        """
+        Opens the run of a repository commit and chunk plan, returning its run id and the
+        outputs of its completed units by unit name. Without resume, the units of a previous
+        attempt are discarded.
+        """
+        rid = run_id(repo_key, commit, plan)
+        now = time.time()
+        with self.lock:
+            exists = self.conn.execute("SELECT 1 FROM runs WHERE run_id = ?", (rid,)).fetchone() is not None
+            if exists and resume:
+                self.conn.execute(
+                    "UPDATE runs SET status = 'running', updated_at = ? WHERE run_id = ?", (now, rid)
+                )
+            else:
+                self.conn.execute("DELETE FROM units WHERE run_id = ?", (rid,))
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, 'running', ?, ?)",
+                    (rid, repo_key, commit, plan, chunk_count, now, now),
+                )
+            self.conn.commit()
+        return rid, self.completed_units(rid)
+
+    def completed_units(self, rid: str) -> Dict[str, str]:
+        with self.lock:
+            rows = self.conn.execute("SELECT unit, output FROM units WHERE run_id = ?", (rid,)).fetchall()
+        return dict(rows)
+
+    def record(self, rid: str, unit: str, output: str) -> None:
+        """Stores the output of a completed unit"""
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO units (run_id, unit, output, completed_at) VALUES (?, ?, ?, ?)",
+                (rid, unit, output, now),
+            )
+            self.conn.execute("UPDATE runs SET updated_at = ? WHERE run_id = ?", (now, rid))
+            self.conn.commit()
+
+    def finish(self, rid: str, status: str) -> None:
+        if status not in RUN_STATUSES:
+            raise ValueError(f"run status must be one of: {', '.join(RUN_STATUSES)}")
+        with self.lock:
+            self.conn.execute(
+                "UPDATE runs SET status = ?, updated_at = ? WHERE run_id = ?", (status, time.time(), rid)
+            )
+            self.conn.commit()
+
+    def list_runs(self) -> List[Dict[str, Any]]:
+        """Runs from the most recently updated, with the number of completed units"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT r.run_id, r.repo_key, r.commit_sha, r.chunk_count, r.status, r.started_at, "
+                "r.updated_at, COUNT(u.unit) FROM runs r LEFT JOIN units u ON u.run_id = r.run_id "
+                "GROUP BY r.run_id ORDER BY r.updated_at DESC"
+            ).fetchall()
+        keys = ("run_id", "repo_key", "commit", "chunk_count", "status", "started_at", "updated_at", "units")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def prune(self, max_age_days: float = 30.0, completed_only: bool = False, include_running: bool = False) -> int:
+        """
+        Deletes the runs not updated for max_age_days, returns how many were deleted.
+        Runs still running are kept unless include_running is set.
+        """
+        cutoff = time.time() - max_age_days * 86400
+        query = "SELECT run_id FROM runs WHERE updated_at <= ?"
+        if completed_only:
+            query += " AND status = 'completed'"
+        elif not include_running:
+            query += " AND status != 'running'"
+        with self.lock:
+            rids = [row[0] for row in self.conn.execute(query, (cutoff,)).fetchall()]
+            self.conn.executemany("DELETE FROM units WHERE run_id = ?", [(rid,) for rid in rids])
+            self.conn.executemany("DELETE FROM runs WHERE run_id = ?", [(rid,) for rid in rids])
+            self.conn.commit()
+        return len(rids)
+
+    def close(self) -> None:
+        self.conn.close()
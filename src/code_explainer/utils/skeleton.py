@@ -0,0 +1,289 @@
+import os
+import ctypes
+import logging
+import warnings
+import textwrap
+from typing import Dict, List, Optional
+
+import tree_sitter_languages
+from tree_sitter import Language, Parser
+
+# Bump when the skeleton format changes, it is part of the parse cache key
+SKELETON_VERSION = "1"
+SKELETON_PARSER = f"skeleton-{SKELETON_VERSION}"
+
+LANGUAGE_BY_SUFFIX = {
+    ".py": "python",
+    ".js": "javascript",
+    ".ts": "typescript",
+    ".go": "go",
+    ".c": "c",
+    ".h": "cpp",
+    ".cpp": "cpp",
+    ".cs": "c_sharp",
+    ".rs": "rust",
+    ".php": "php",
+    ".scala": "scala",
+}
+
+COMMENT_TYPES = {"comment", "line_comment", "block_comment"}
+
+# Per language node types:
+#   imports    - emitted verbatim
+#   containers - header emitted, body walked for nested declarations
+#   functions  - signature (text before the body) emitted, body skipped
+#   fields     - emitted verbatim when they fit on a few lines
+#   types      - emitted verbatim, truncated to MAX_TYPE_LINES
+LANGUAGE_NODES: Dict[str, Dict[str, set]] = {
+    "python": {
+        "imports": {"import_statement", "import_from_statement", "future_import_statement"},
+        "containers": {"class_definition"},
+        "functions": {"function_definition"},
+        "fields": {"expression_statement"},
+        "types": set(),
+    },
+    "javascript": {
+        "imports": {"import_statement"},
+        "containers": {"class_declaration", "class"},
+        "functions": {"function_declaration", "generator_function_declaration", "method_definition"},
+        "fields": {"field_definition", "lexical_declaration", "variable_declaration"},
+        "types": set(),
+    },
+    "typescript": {
+        "imports": {"import_statement"},
+        "containers": {"class_declaration", "abstract_class_declaration", "class", "internal_module", "module"},
+        "functions": {
+            "function_declaration",
+            "generator_function_declaration",
+            "method_definition",
+            "function_signature",
+            "method_signature",
+            "abstract_method_signature",
+        },
+        "fields": {"public_field_definition", "lexical_declaration", "variable_declaration"},
+        "types": {"interface_declaration", "type_alias_declaration", "enum_declaration"},
+    },
+    "go": {
+        "imports": {"package_clause", "import_declaration"},
+        "containers": set(),
+        "functions": {"function_declaration", "method_declaration"},
+        "fields": set(),
+        "types": {"type_declaration"},
+    },
+    "c": {
+        "imports": {"preproc_include"},
+        "containers": set(),
+        "functions": {"function_definition"},
+        "fields": {"declaration"},
+        "types": {"struct_specifier", "enum_specifier", "type_definition"},
+    },
+    "cpp": {
+        "imports": {"preproc_include", "using_declaration"},
+        "containers": {"namespace_definition", "class_specifier", "struct_specifier"},
+        "functions": {"function_definition"},
+        "fields": {"field_declaration", "declaration"},
+        "types": {"enum_specifier", "type_definition", "alias_declaration"},
+    },
+    "c_sharp": {
+        "imports": {"using_directive"},
+        "containers": {
+            "namespace_declaration",
+            "class_declaration",
+            "interface_declaration",
+            "struct_declaration",
+            "record_declaration",
+        },
+        "functions": {"method_declaration", "constructor_declaration", "local_function_statement"},
+        "fields": {"field_declaration", "property_declaration", "event_field_declaration"},
+        "types": {"enum_declaration", "delegate_declaration"},
+    },
+    "rust": {
+        "imports": {"use_declaration", "extern_crate_declaration"},
+        "containers": {"impl_item", "trait_item", "mod_item"},
+        "functions": {"function_item", "function_signature_item"},
+        "fields": {"const_item", "static_item"},
+        "types": {"struct_item", "enum_item", "type_item"},
+    },
+    "php": {
+        "imports": {"namespace_definition", "namespace_use_declaration"},
+        "containers": {"class_declaration", "interface_declaration", "trait_declaration"},
+        "functions": {"function_definition", "method_declaration"},
+        "fields": {"property_declaration", "const_declaration"},
+        "types": {"enum_declaration"},
+    },
+    "scala": {
+        "imports": {"package_clause", "import_declaration"},
+        "containers": {"class_definition", "object_definition", "trait_definition"},
+        "functions": {"function_definition", "function_declaration"},
+        "fields": {"val_definition", "var_definition", "val_declaration"},
+        "types": {"type_definition", "enum_definition"},
+    },
+}
+
+# JS/TS variable declarations whose value may be a function
+VARIABLE_TYPES = {"lexical_declaration", "variable_declaration"}
+FUNCTION_VALUE_TYPES = {"arrow_function", "function", "function_expression", "generator_function"}
+
+# Nodes never descended into when looking for declarations
+OPAQUE_TYPES = {"string", "template_string", "comment", "line_comment", "block_comment"}
+
+MAX_FIELD_LINES = 2
+MAX_TYPE_LINES = 30
+MAX_COMMENT_LINES = 5
+MAX_DOCSTRING_LINES = 5
+
+_parsers: Dict[str, Optional[Parser]] = {}
+
+
+def _load_parser(language: str) -> Optional[Parser]:
+    """
+    Returns a tree-sitter parser for a language. tree_sitter_languages 1.10 cannot build
+    parsers with tree-sitter >= 0.22, so the bundled grammars are loaded directly then.
+    """
+    if language in _parsers:
+        return _parsers[language]
+    parser = None
+    try:
+        parser = tree_sitter_languages.get_parser(language)
+    except TypeError:
+        try:
+            library = ctypes.cdll.LoadLibrary(
+                os.path.join(os.path.dirname(tree_sitter_languages.__file__), "languages.so")
+            )
+            language_fn = getattr(library, f"tree_sitter_{language}")
+            language_fn.restype = ctypes.c_void_p
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", DeprecationWarning)
+                parser = Parser(Language(language_fn()))
+        except Exception as e:
+            logging.warning(f"No tree-sitter grammar available for '{language}': {e}")
+    except Exception as e:
+        logging.warning(f"No tree-sitter grammar available for '{language}': {e}")
+    _parsers[language] = parser
+    return parser
+
+
+def skeleton_language(path: str) -> Optional[str]:
+    """Returns the skeleton language of a file, or None if skeletons are not supported for it."""
+    return LANGUAGE_BY_SUFFIX.get(os.path.splitext(path)[1])
+
+
+class _SkeletonBuilder:
+    def __init__(self, source: bytes, language: str):
+        self.source = source
+        self.language = language
+        self.nodes = LANGUAGE_NODES[language]
+        self.lines: List[str] = []
+
+    def text(self, start: int, end: int) -> str:
+        return self.source[start:end].decode("utf-8", errors="ignore")
+
+    def emit(self, text: str, depth: int, max_lines: Optional[int] = None) -> None:
+        first, _, rest = text.strip().partition("\n")
+        lines = [first] + textwrap.dedent(rest).splitlines() if rest else [first]
+        if max_lines is not None and len(lines) > max_lines:
+            lines = lines[:max_lines] + ["..."]
+        indent = "    " * depth
+        self.lines.extend((indent + line).rstrip() for line in lines)
+
+    def emit_leading_comments(self, node, depth: int) -> None:
+        comments = []
+        previous = node.prev_named_sibling
+        row = node.start_point[0]
+        while previous is not None and previous.type in COMMENT_TYPES and previous.end_point[0] >= row - 1:
+            comments.insert(0, previous)
+            row = previous.start_point[0]
+            previous = previous.prev_named_sibling
+        for comment in comments:
+            self.emit(self.text(comment.start_byte, comment.end_byte), depth, MAX_COMMENT_LINES)
+
+    def emit_docstring(self, body, depth: int) -> None:
+        if self.language != "python" or body is None or not body.named_children:
+            return
+        first = body.named_children[0]
+        if first.type == "expression_statement" and first.named_children and first.named_children[0].type == "string":
+            self.emit(self.text(first.start_byte, first.end_byte), depth, MAX_DOCSTRING_LINES)
+
+    def signature(self, node) -> str:
+        body = node.child_by_field_name("body")
+        end = body.start_byte if body is not None else node.end_byte
+        return self.text(node.start_byte, end).rstrip().rstrip("{").rstrip()
+
+    def is_field(self, node, depth: int) -> bool:
+        if node.type not in self.nodes["fields"]:
+            return False
+        if self.language == "python":
+            # Only assignments, not docstrings or other statements
+            return bool(node.named_children) and node.named_children[0].type == "assignment"
+        return True
+
+    def emit_variable_functions(self, node, depth: int) -> bool:
+        """Emits the signatures of `const f = (...) => {...}` style declarations"""
+        emitted = False
+        for declarator in node.named_children:
+            value = declarator.child_by_field_name("value")
+            if value is not None and value.type in FUNCTION_VALUE_TYPES:
+                body = value.child_by_field_name("body")
+                end = body.start_byte if body is not None else value.end_byte
+                self.emit_leading_comments(node, depth)
+                self.emit(self.text(node.start_byte, end).rstrip().rstrip("=>").rstrip(), depth)
+                emitted = True
+        return emitted
+
+    def walk(self, node, depth: int = 0) -> None:
+        for child in node.named_children:
+            self.visit(child, depth)
+
+    def visit(self, node, depth: int) -> None:
+        kind = node.type
+        if kind in self.nodes["imports"]:
+            self.emit(self.text(node.start_byte, node.end_byte), depth)
+        elif kind in self.nodes["containers"]:
+            self.emit_leading_comments(node, depth)
+            self.emit(self.signature(node), depth)
+            body = node.child_by_field_name("body")
+            self.emit_docstring(body, depth + 1)
+            if body is not None:
+                self.walk(body, depth + 1)
+        elif kind in self.nodes["functions"]:
+            self.emit_leading_comments(node, depth)
+            self.emit(self.signature(node), depth)
+            self.emit_docstring(node.child_by_field_name("body"), depth + 1)
+        elif kind in self.nodes["types"]:
+            self.emit_leading_comments(node, depth)
+            self.emit(self.text(node.start_byte, node.end_byte), depth, MAX_TYPE_LINES)
+        elif kind in VARIABLE_TYPES and self.emit_variable_functions(node, depth):
+            pass
+        elif self.is_field(node, depth):
+            if node.end_point[0] - node.start_point[0] < MAX_FIELD_LINES:
+                self.emit(self.text(node.start_byte, node.end_byte), depth)
+        elif kind == "decorated_definition":
+            self.emit_leading_comments(node, depth)
+            *decorators, definition = node.named_children
+            for decorator in decorators:
+                self.emit(self.text(decorator.start_byte, decorator.end_byte), depth)
+            self.visit(definition, depth)
+        elif kind not in OPAQUE_TYPES:
+            # Declarations can be wrapped (exports, templates, preprocessor blocks...)
+            self.walk(node, depth)
+
+
+def extract_skeleton(source: str, language: str) -> Optional[str]:
+    """
+    Reduces source code to its imports, declarations, signatures and docstrings.
+    Returns None when the language is unsupported or the source cannot be parsed.
+    """
+    if language not in LANGUAGE_NODES:
+        return None
+    parser = _load_parser(language)
+    if parser is None:
+        return None
+    try:
+        data = source.encode("utf-8")
+        tree = parser.parse(data)
+        builder = _SkeletonBuilder(data, language)
+        builder.walk(tree.root_node)
+    except Exception as e:
+        logging.warning(f"Failed to extract a {language} skeleton: {e}")
+        return None
+    return "\n".join(builder.lines) if builder.lines else None
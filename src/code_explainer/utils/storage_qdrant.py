@@ -2,7 +2,6 @@ from typing import Any, Dict, List, Optional
 import os
 
 from crewai.memory.storage.rag_storage import RAGStorage
-from qdrant_client import QdrantClient
 
 import warnings
 warnings.filterwarnings("ignore", category=DeprecationWarning, module="qdrant_client")
@@ -47,6 +46,9 @@ class QdrantStorage(RAGStorage):
         self.client.delete_collection(self.type)
 
     def _initialize_app(self):
+        # Imported when a storage connects, qdrant_client is slow to import
+        from qdrant_client import QdrantClient
+
         if os.getenv("QDRANT_MODE") == "memory":
             self.client = QdrantClient(":memory:")
         elif os.getenv("QDRANT_MODE") == "cloud":
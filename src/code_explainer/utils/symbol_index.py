@@ -0,0 +1,696 @@
+import os
+import re
+import time
+import sqlite3
+import logging
+import posixpath
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .parse_cache import git_blob_sha
+from .skeleton import LANGUAGE_BY_SUFFIX, _load_parser
+
+# Bump when the extracted symbols change shape, stored files are then re-indexed
+SYMBOL_INDEX_VERSION = "1"
+SYMBOL_INDEX_PATH = "./memory/symbol_index.db"
+
+SYMBOL_LANGUAGE_BY_SUFFIX = {**LANGUAGE_BY_SUFFIX, ".java": "java", ".rb": "ruby"}
+
+# Per language node type -> kind of the symbol it defines
+DEFINITION_KINDS: Dict[str, Dict[str, str]] = {
+    "python": {"class_definition": "class", "function_definition": "function"},
+    "javascript": {
+        "class_declaration": "class",
+        "function_declaration": "function",
+        "generator_function_declaration": "function",
+        "method_definition": "method",
+    },
+    "typescript": {
+        "class_declaration": "class",
+        "abstract_class_declaration": "class",
+        "interface_declaration": "interface",
+        "type_alias_declaration": "type",
+        "enum_declaration": "enum",
+        "function_declaration": "function",
+        "generator_function_declaration": "function",
+        "function_signature": "function",
+        "method_definition": "method",
+        "method_signature": "method",
+        "abstract_method_signature": "method",
+    },
+    "go": {"type_spec": "type", "function_declaration": "function", "method_declaration": "method"},
+    "c": {"function_definition": "function", "struct_specifier": "struct", "enum_specifier": "enum"},
+    "cpp": {
+        "namespace_definition": "namespace",
+        "class_specifier": "class",
+        "struct_specifier": "struct",
+        "enum_specifier": "enum",
+        "function_definition": "function",
+    },
+    "c_sharp": {
+        "namespace_declaration": "namespace",
+        "class_declaration": "class",
+        "interface_declaration": "interface",
+        "struct_declaration": "struct",
+        "record_declaration": "class",
+        "enum_declaration": "enum",
+        "method_declaration": "method",
+        "constructor_declaration": "method",
+    },
+    "rust": {
+        "struct_item": "struct",
+        "enum_item": "enum",
+        "trait_item": "trait",
+        "type_item": "type",
+        "mod_item": "module",
+        "function_item": "function",
+        "function_signature_item": "function",
+    },
+    "php": {
+        "class_declaration": "class",
+        "interface_declaration": "interface",
+        "trait_declaration": "trait",
+        "enum_declaration": "enum",
+        "function_definition": "function",
+        "method_declaration": "method",
+    },
+    "scala": {
+        "class_definition": "class",
+        "object_definition": "object",
+        "trait_definition": "trait",
+        "function_definition": "function",
+        "function_declaration": "function",
+    },
+    "java": {
+        "class_declaration": "class",
+        "interface_declaration": "interface",
+        "enum_declaration": "enum",
+        "record_declaration": "class",
+        "method_declaration": "method",
+        "constructor_declaration": "method",
+    },
+    "ruby": {"class": "class", "module": "module", "method": "method", "singleton_method": "method"},
+}
+
+# Kinds whose nested functions are methods
+CONTAINER_KINDS = {"class", "interface", "struct", "trait", "object", "enum", "impl", "module", "namespace"}
+
+# Identifier-like nodes recorded as references
+REFERENCE_TYPES = {
+    "identifier",
+    "type_identifier",
+    "field_identifier",
+    "property_identifier",
+    "constant",
+    "name",
+    "package_identifier",
+    "namespace_identifier",
+}
+
+# Separator of the segments of an imported module, per language
+MODULE_SEPARATORS = {
+    "python": ".",
+    "java": ".",
+    "scala": ".",
+    "c_sharp": ".",
+    "rust": "::",
+    "php": "\\",
+}
+
+# Files standing for their directory when imported (package/index/module files)
+PACKAGE_FILES = {"__init__", "index", "mod", "lib"}
+
+FUNCTION_VALUE_TYPES = {"arrow_function", "function", "function_expression", "generator_function"}
+MAX_SIGNATURE_CHARS = 200
+
+
+def symbol_language(path: str) -> Optional[str]:
+    """Returns the language symbols are extracted for, or None if the file is not indexed."""
+    return SYMBOL_LANGUAGE_BY_SUFFIX.get(os.path.splitext(path)[1])
+
+
+def _strip_quotes(text: str) -> str:
+    return text.strip().strip("\"'`<>")
+
+
+class _SymbolExtractor:
+    """Collects the definitions, imports and references of a parsed file"""
+
+    def __init__(self, source: bytes, language: str):
+        self.source = source
+        self.language = language
+        self.kinds = DEFINITION_KINDS[language]
+        self.definitions: List[Tuple[str, str, str, int, int, str]] = []
+        self.imports: List[Tuple[str, str, int]] = []
+        self.references: Set[str] = set()
+        # Name nodes of definitions, which are not references
+        self.defined_at: Set[Tuple[int, int]] = set()
+
+    def text(self, node) -> str:
+        return self.source[node.start_byte:node.end_byte].decode("utf-8", errors="ignore")
+
+    def definition_name(self, node) -> Optional[Any]:
+        name = node.child_by_field_name("name")
+        if name is not None:
+            return name
+        # C/C++ functions keep their name inside nested declarators
+        declarator = node.child_by_field_name("declarator")
+        while declarator is not None:
+            if declarator.type in ("identifier", "field_identifier", "qualified_identifier", "destructor_name"):
+                return declarator
+            declarator = declarator.child_by_field_name("declarator")
+        return None
+
+    def signature(self, node) -> str:
+        body = node.child_by_field_name("body")
+        end = body.start_byte if body is not None else node.end_byte
+        text = self.source[node.start_byte:end].decode("utf-8", errors="ignore")
+        text = " ".join(text.split()).rstrip("{:").rstrip()
+        return text[:MAX_SIGNATURE_CHARS]
+
+    def add_import(self, module: str, names: Iterable[str], node) -> None:
+        module = module.strip()
+        if module:
+            self.imports.append((module, ",".join(n for n in names if n), node.start_point[0] + 1))
+
+    def visit_import(self, node) -> bool:
+        """Records the modules imported by a node, returns True when the node was an import"""
+        kind = node.type
+        lang = self.language
+        if lang == "python" and kind == "import_statement":
+            for child in node.named_children:
+                target = child.child_by_field_name("name") if child.type == "aliased_import" else child
+                self.add_import(self.text(target), [], node)
+        elif lang == "python" and kind == "import_from_statement":
+            module = node.child_by_field_name("module_name")
+            names = []
+            for child in node.children_by_field_name("name"):
+                target = child.child_by_field_name("name") if child.type == "aliased_import" else child
+                names.append(self.text(target))
+            self.add_import(self.text(module), names, node)
+        elif lang in ("javascript", "typescript") and kind in ("import_statement", "export_statement"):
+            source = node.child_by_field_name("source")
+            if source is None:
+                return False
+            self.add_import(_strip_quotes(self.text(source)), [], node)
+        elif lang in ("javascript", "typescript", "ruby") and kind in ("call_expression", "call"):
+            function = node.child_by_field_name("function") or node.child_by_field_name("method")
+            arguments = node.child_by_field_name("arguments")
+            if function is None or arguments is None or not arguments.named_children:
+                return False
+            name = self.text(function)
+            if name not in ("require", "import", "require_relative"):
+                return False
+            module = _strip_quotes(self.text(arguments.named_children[0]))
+            if name == "require_relative" and not module.startswith("."):
+                module = "./" + module
+            self.add_import(module, [], node)
+        elif lang == "go" and kind == "import_spec":
+            self.add_import(_strip_quotes(self.text(node.child_by_field_name("path"))), [], node)
+        elif lang in ("c", "cpp") and kind == "preproc_include":
+            self.add_import(_strip_quotes(self.text(node.child_by_field_name("path"))), [], node)
+        elif lang == "c_sharp" and kind == "using_directive":
+            targets = [c for c in node.named_children if c.type != "name_equals"]
+            if targets:
+                self.add_import(self.text(targets[-1]), [], node)
+        elif lang == "rust" and kind == "use_declaration":
+            argument = self.text(node.child_by_field_name("argument"))
+            module, _, names = argument.partition("{")
+            names = [n.strip().split(" as ")[0] for n in names.rstrip("}").split(",")]
+            self.add_import(module.rstrip(":"), names, node)
+        elif lang == "rust" and kind == "mod_item" and node.child_by_field_name("body") is None:
+            self.add_import("self::" + self.text(node.child_by_field_name("name")), [], node)
+            return False
+        elif lang == "php" and kind == "namespace_use_clause":
+            targets = [c for c in node.named_children if c.type in ("qualified_name", "name")]
+            if targets:
+                self.add_import(self.text(targets[0]).lstrip("\\"), [], node)
+        elif lang in ("java", "scala") and kind == "import_declaration":
+            text = re.sub(r"^import\s+(static\s+)?", "", self.text(node)).rstrip(";").strip()
+            module, _, names = text.partition("{")
+            names = [n.strip().split("=>")[0].strip() for n in names.rstrip("}").split(",")]
+            self.add_import(module.rstrip("._*"), names, node)
+        else:
+            return False
+        return True
+
+    def walk(self, root) -> None:
+        # Iterative walk, deeply nested expressions would hit the recursion limit
+        stack = [(root, "", "")]
+        while stack:
+            node, parent, parent_kind = stack.pop()
+            if self.visit_import(node):
+                continue
+
+            kind = self.kinds.get(node.type)
+            if kind is None and node.type == "variable_declarator":
+                value = node.child_by_field_name("value")
+                if value is not None and value.type in FUNCTION_VALUE_TYPES:
+                    kind = "function"
+            if kind is None and node.type == "impl_item":
+                # Rust impl blocks are not definitions but own the methods they contain
+                target = node.child_by_field_name("type")
+                if target is not None:
+                    parent, parent_kind = self.text(target), "impl"
+
+            if kind is not None:
+                name_node = self.definition_name(node)
+                if name_node is not None:
+                    name = self.text(name_node)
+                    if kind == "function" and parent_kind in CONTAINER_KINDS:
+                        kind = "method"
+                    self.definitions.append(
+                        (name, kind, parent, node.start_point[0] + 1, node.end_point[0] + 1, self.signature(node))
+                    )
+                    self.defined_at.add((name_node.start_byte, name_node.end_byte))
+                    parent = f"{parent}.{name}" if parent else name
+                    parent_kind = kind
+            elif node.type in REFERENCE_TYPES and (node.start_byte, node.end_byte) not in self.defined_at:
+                self.references.add(self.text(node))
+
+            for child in reversed(node.named_children):
+                stack.append((child, parent, parent_kind))
+
+
+def extract_source_symbols(source: bytes, language: str) -> Optional[Dict[str, Any]]:
+    """Extracts the symbols of source code, or returns None when the language has no grammar"""
+    parser = _load_parser(language) if language in DEFINITION_KINDS else None
+    if parser is None:
+        return None
+    extractor = _SymbolExtractor(source, language)
+    extractor.walk(parser.parse(source).root_node)
+    return {
+        "language": language,
+        "definitions": extractor.definitions,
+        "imports": extractor.imports,
+        "references": sorted(extractor.references),
+    }
+
+
+def extract_symbols(path: str) -> Tuple[str, Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Extracts the symbols of a single file and returns (path, symbols, error).
+    Runs inside the worker processes, so a failing file never aborts the others.
+    """
+    language = symbol_language(path)
+    if language is None:
+        return path, None, None
+    try:
+        with open(path, "rb") as f:
+            return path, extract_source_symbols(f.read(), language), None
+    except Exception as e:
+        return path, None, f"Failed to extract symbols from '{path}': {e}"
+
+
+class ModuleResolver:
+    """Maps imported modules to the repository files defining them"""
+
+    def __init__(self, paths: Iterable[str]):
+        self.by_key: Dict[Tuple[str, ...], Set[str]] = {}
+        self.by_suffix: Dict[Tuple[str, ...], Set[str]] = {}
+        self.by_dir_suffix: Dict[Tuple[str, ...], Set[str]] = {}
+        for path in paths:
+            parts = tuple(path.split("/"))
+            stem = os.path.splitext(parts[-1])[0]
+            keys = {parts, parts[:-1] + (stem,)}
+            if stem in PACKAGE_FILES and len(parts) > 1:
+                keys.add(parts[:-1])
+            for key in keys:
+                self.by_key.setdefault(key, set()).add(path)
+                for i in range(len(key)):
+                    self.by_suffix.setdefault(key[i:], set()).add(path)
+            for i in range(len(parts) - 1):
+                self.by_dir_suffix.setdefault(parts[i:-1], set()).add(path)
+
+    @staticmethod
+    def _closest(importer: str, targets: Set[str]) -> Set[str]:
+        """Keeps the ambiguous targets sharing the longest directory prefix with the importer"""
+        importer_dir = importer.split("/")[:-1]
+
+        def shared(target: str) -> int:
+            count = 0
+            for a, b in zip(importer_dir, target.split("/")[:-1]):
+                if a != b:
+                    break
+                count += 1
+            return count
+
+        best = max(shared(t) for t in targets)
+        return {t for t in targets if shared(t) == best}
+
+    def _lookup_relative(self, base: List[str], segments: List[str]) -> Set[str]:
+        joined = posixpath.normpath("/".join(base + segments))
+        if joined.startswith(".."):
+            return set()
+        return set(self.by_key.get(tuple(p for p in joined.split("/") if p and p != "."), ()))
+
+    def _lookup_suffix(self, segments: List[str], index: Dict[Tuple[str, ...], Set[str]]) -> Set[str]:
+        # Leading segments may name the package or module root, not a directory of the repository
+        minimum = min(2, len(segments))
+        for i in range(len(segments) - minimum + 1):
+            found = index.get(tuple(segments[i:]))
+            if found:
+                return set(found)
+        return set()
+
+    def resolve(self, importer: str, language: str, module: str, names: List[str]) -> Set[str]:
+        importer_dir = importer.split("/")[:-1]
+        separator = MODULE_SEPARATORS.get(language, "/")
+        candidates: List[Tuple[Optional[List[str]], List[str]]] = []
+
+        if language == "python" and module.startswith("."):
+            level = len(module) - len(module.lstrip("."))
+            base = importer_dir[:len(importer_dir) - (level - 1)] if level > 1 else importer_dir
+            rest = [s for s in module[level:].split(".") if s]
+            candidates += [(base, rest + [name]) for name in names] + [(base, rest)]
+        elif language == "rust" and module.split("::")[0] in ("self", "super", "crate"):
+            segments = module.split("::")
+            head, rest = segments[0], [s for s in segments[1:] if s]
+            if head == "crate":
+                candidates += [(None, rest), (None, rest[:-1])]
+            else:
+                base = importer_dir if head == "self" else importer_dir[:-1]
+                candidates += [(base, rest), (base, rest[:-1])]
+        elif separator == "/" and module.startswith("."):
+            candidates.append((importer_dir, module.split("/")))
+        else:
+            segments = [s for s in module.split(separator) if s]
+            if language in ("c", "cpp"):
+                # Quoted includes are looked up next to the including file first
+                candidates.append((importer_dir, segments))
+            candidates += [(None, segments + [name]) for name in names]
+            candidates.append((None, segments))
+            if language in MODULE_SEPARATORS:
+                # The last segment may be a class or function imported from a module
+                candidates.append((None, segments[:-1]))
+
+        for base, segments in candidates:
+            if not segments:
+                continue
+            if base is not None:
+                found = self._lookup_relative(base, segments)
+            else:
+                found = self._lookup_suffix(segments, self.by_suffix)
+                if not found and language == "go":
+                    found = self._lookup_suffix(segments, self.by_dir_suffix)
+            found.discard(importer)
+            if found:
+                return self._closest(importer, found)
+        return set()
+
+
+class SymbolIndex:
+    """
+    Persisted symbol table of a repository: definitions, imports, references and the
+    file-level dependency graph resolved from the imports.
+
+    Files are re-extracted only when their content changed, so updating the index
+    of a mostly unchanged checkout costs a `stat` per file.
+    """
+
+    def __init__(self, root: str, db_path: str = SYMBOL_INDEX_PATH):
+        self.root = os.path.abspath(root)
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS roots (root TEXT PRIMARY KEY, updated_at REAL);
+            CREATE TABLE IF NOT EXISTS files (
+                root TEXT, path TEXT, size INTEGER, mtime_ns INTEGER, blob_sha TEXT,
+                language TEXT, version TEXT, PRIMARY KEY (root, path)
+            );
+            CREATE TABLE IF NOT EXISTS definitions (
+                root TEXT, path TEXT, name TEXT, kind TEXT, parent TEXT,
+                line INTEGER, end_line INTEGER, signature TEXT
+            );
+            CREATE TABLE IF NOT EXISTS imports (root TEXT, path TEXT, module TEXT, names TEXT, line INTEGER);
+            CREATE TABLE IF NOT EXISTS refs (root TEXT, path TEXT, name TEXT);
+            CREATE TABLE IF NOT EXISTS edges (root TEXT, source TEXT, target TEXT);
+            CREATE INDEX IF NOT EXISTS definitions_name ON definitions (root, name);
+            CREATE INDEX IF NOT EXISTS definitions_path ON definitions (root, path);
+            CREATE INDEX IF NOT EXISTS imports_path ON imports (root, path);
+            CREATE INDEX IF NOT EXISTS refs_name ON refs (root, name);
+            CREATE INDEX IF NOT EXISTS refs_path ON refs (root, path);
+            CREATE INDEX IF NOT EXISTS edges_source ON edges (root, source);
+            CREATE INDEX IF NOT EXISTS edges_target ON edges (root, target);
+            """
+        )
+        self.conn.commit()
+
+    @classmethod
+    def open_root(cls, root: str, db_path: str = SYMBOL_INDEX_PATH) -> Optional["SymbolIndex"]:
+        """Opens the index of the repository at root, if it was indexed"""
+        if not os.path.exists(db_path):
+            return None
+        conn = sqlite3.connect(db_path)
+        try:
+            row = conn.execute("SELECT root FROM roots WHERE root = ?", (os.path.abspath(root),)).fetchone()
+        except sqlite3.Error:
+            row = None
+        finally:
+            conn.close()
+        return cls(row[0], db_path=db_path) if row else None
+
+    @classmethod
+    def open_latest(cls, db_path: str = SYMBOL_INDEX_PATH) -> Optional["SymbolIndex"]:
+        """Opens the index of the most recently indexed repository, if any"""
+        if not os.path.exists(db_path):
+            return None
+        conn = sqlite3.connect(db_path)
+        try:
+            row = conn.execute("SELECT root FROM roots ORDER BY updated_at DESC LIMIT 1").fetchone()
+        except sqlite3.Error:
+            row = None
+        finally:
+            conn.close()
+        return cls(row[0], db_path=db_path) if row else None
+
+    def relative(self, path: str) -> str:
+        """Returns a path relative to the indexed root, with forward slashes"""
+        absolute = os.path.abspath(path)
+        if absolute.startswith(self.root + os.sep):
+            path = os.path.relpath(absolute, self.root)
+        return posixpath.normpath(path.replace(os.sep, "/"))
+
+    def _changed(self, paths: List[str]) -> Tuple[List[str], Dict[str, Tuple[int, int, str]]]:
+        """Returns the files whose content changed since they were indexed, with their new stats"""
+        stored = {
+            row[0]: row[1:]
+            for row in self.conn.execute(
+                "SELECT path, size, mtime_ns, blob_sha, version FROM files WHERE root = ?", (self.root,)
+            )
+        }
+        changed = []
+        stats: Dict[str, Tuple[int, int, str]] = {}
+        for path in paths:
+            rel = self.relative(path)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            previous = stored.get(rel)
+            if previous and previous[3] == SYMBOL_INDEX_VERSION and previous[:2] == (stat.st_size, stat.st_mtime_ns):
+                continue
+            with open(path, "rb") as f:
+                sha = git_blob_sha(f.read())
+            stats[path] = (stat.st_size, stat.st_mtime_ns, sha)
+            if previous and previous[3] == SYMBOL_INDEX_VERSION and previous[2] == sha:
+                # Touched but identical, only the stat is refreshed
+                self.conn.execute(
+                    "UPDATE files SET size = ?, mtime_ns = ? WHERE root = ? AND path = ?",
+                    (stat.st_size, stat.st_mtime_ns, self.root, rel),
+                )
+                continue
+            changed.append(path)
+        return changed, stats
+
+    def _extract(self, paths: List[str], max_workers: int):
+        workers = min(max_workers, len(paths))
+        if workers > 1:
+            try:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    chunksize = max(1, len(paths) // (workers * 4))
+                    return list(executor.map(extract_symbols, paths, chunksize=chunksize))
+            except Exception as e:
+                logging.warning(f"Parallel symbol extraction unavailable ({e}). Falling back to a single process.")
+        return [extract_symbols(path) for path in paths]
+
+    def _delete(self, rel_paths: Iterable[str]) -> None:
+        rows = [(self.root, rel) for rel in rel_paths]
+        for table in ("files", "definitions", "imports", "refs"):
+            self.conn.executemany(f"DELETE FROM {table} WHERE root = ? AND path = ?", rows)
+
+    def update(self, paths: Iterable[str], max_workers: int = 1) -> Dict[str, int]:
+        """
+        Brings the index in line with the given files: changed files are re-extracted,
+        files no longer present are dropped, and the dependency graph is rebuilt.
+        """
+        paths = list(paths)
+        current = {self.relative(path) for path in paths}
+        stored = {row[0] for row in self.conn.execute("SELECT path FROM files WHERE root = ?", (self.root,))}
+        removed = stored - current
+
+        changed, stats = self._changed(paths)
+        self._delete(removed | {self.relative(path) for path in changed})
+
+        errors = 0
+        for path, symbols, error in self._extract(changed, max_workers):
+            rel = self.relative(path)
+            if error:
+                logging.warning(error)
+                errors += 1
+            size, mtime_ns, sha = stats[path]
+            language = symbols["language"] if symbols else symbol_language(path)
+            self.conn.execute(
+                "INSERT INTO files (root, path, size, mtime_ns, blob_sha, language, version) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.root, rel, size, mtime_ns, sha, language, SYMBOL_INDEX_VERSION),
+            )
+            if not symbols:
+                continue
+            self.conn.executemany(
+                "INSERT INTO definitions (root, path, name, kind, parent, line, end_line, signature) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(self.root, rel, *definition) for definition in symbols["definitions"]],
+            )
+            self.conn.executemany(
+                "INSERT INTO imports (root, path, module, names, line) VALUES (?, ?, ?, ?, ?)",
+                [(self.root, rel, *entry) for entry in symbols["imports"]],
+            )
+            self.conn.executemany(
+                "INSERT INTO refs (root, path, name) VALUES (?, ?, ?)",
+                [(self.root, rel, name) for name in symbols["references"]],
+            )
+
+        if changed or removed:
+            self._rebuild_edges()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO roots (root, updated_at) VALUES (?, ?)", (self.root, time.time())
+        )
+        self.conn.commit()
+        return {"files": len(current), "updated": len(changed), "removed": len(removed), "errors": errors}
+
+    def _rebuild_edges(self) -> None:
+        """
+        Resolves every stored import against the current file set. Adding or removing
+        a file can change how unchanged files resolve, so the graph is rebuilt as a whole
+        from the stored imports, which needs no parsing.
+        """
+        files = {
+            row[0]: row[1]
+            for row in self.conn.execute("SELECT path, language FROM files WHERE root = ?", (self.root,))
+        }
+        resolver = ModuleResolver(files)
+        edges: Set[Tuple[str, str]] = set()
+        for path, module, names in self.conn.execute(
+            "SELECT path, module, names FROM imports WHERE root = ?", (self.root,)
+        ).fetchall():
+            language = files.get(path)
+            if not language:
+                continue
+            for target in resolver.resolve(path, language, module, [n for n in names.split(",") if n]):
+                edges.add((path, target))
+        self.conn.execute("DELETE FROM edges WHERE root = ?", (self.root,))
+        self.conn.executemany(
+            "INSERT INTO edges (root, source, target) VALUES (?, ?, ?)",
+            [(self.root, source, target) for source, target in sorted(edges)],
+        )
+
+    @staticmethod
+    def _definition(row) -> Dict[str, Any]:
+        path, name, kind, parent, line, end_line, signature = row
+        return {
+            "path": path,
+            "name": name,
+            "qualified_name": f"{parent}.{name}" if parent else name,
+            "kind": kind,
+            "line": line,
+            "end_line": end_line,
+            "signature": signature,
+        }
+
+    def find_definitions(self, name: str) -> List[Dict[str, Any]]:
+        """Returns where a symbol is defined; 'Class.method' restricts the match to a parent"""
+        parent, _, short = name.rpartition(".")
+        query = (
+            "SELECT path, name, kind, parent, line, end_line, signature FROM definitions "
+            "WHERE root = ? AND name = ?"
+        )
+        params: Tuple = (self.root, short)
+        if parent:
+            query += " AND (parent = ? OR parent LIKE ?)"
+            params += (parent, f"%.{parent}")
+        return [self._definition(row) for row in self.conn.execute(query + " ORDER BY path, line", params)]
+
+    def definitions_in(self, path: str) -> List[Dict[str, Any]]:
+        """Returns the symbols defined in a file, in source order"""
+        return [
+            self._definition(row)
+            for row in self.conn.execute(
+                "SELECT path, name, kind, parent, line, end_line, signature FROM definitions "
+                "WHERE root = ? AND path = ? ORDER BY line",
+                (self.root, self.relative(path)),
+            )
+        ]
+
+    def imports_of(self, path: str) -> List[str]:
+        return [
+            row[0]
+            for row in self.conn.execute(
+                "SELECT module FROM imports WHERE root = ? AND path = ? ORDER BY line",
+                (self.root, self.relative(path)),
+            )
+        ]
+
+    def dependencies(self, path: str) -> List[str]:
+        """Returns the repository files a file imports"""
+        return [
+            row[0]
+            for row in self.conn.execute(
+                "SELECT target FROM edges WHERE root = ? AND source = ? ORDER BY target",
+                (self.root, self.relative(path)),
+            )
+        ]
+
+    def dependents(self, path: str) -> List[str]:
+        """Returns the repository files importing a file"""
+        return [
+            row[0]
+            for row in self.conn.execute(
+                "SELECT source FROM edges WHERE root = ? AND target = ? ORDER BY source",
+                (self.root, self.relative(path)),
+            )
+        ]
+
+    def references_to(self, name: str) -> List[str]:
+        """Returns the files using a name, other than to define it"""
+        return [
+            row[0]
+            for row in self.conn.execute(
+                "SELECT path FROM refs WHERE root = ? AND name = ? ORDER BY path", (self.root, name)
+            )
+        ]
+
+    def dependency_graph(self) -> Dict[str, List[str]]:
+        """Returns the file-level dependency graph as an adjacency list"""
+        graph: Dict[str, List[str]] = {}
+        for source, target in self.conn.execute(
+            "SELECT source, target FROM edges WHERE root = ? ORDER BY source, target", (self.root,)
+        ):
+            graph.setdefault(source, []).append(target)
+        return graph
+
+    def stats(self) -> Dict[str, int]:
+        counts = {}
+        for table in ("files", "definitions", "imports", "refs", "edges"):
+            counts[table] = self.conn.execute(
+                f"SELECT COUNT(*) FROM {table} WHERE root = ?", (self.root,)
+            ).fetchone()[0]
+        return counts
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
@@ -0,0 +1,192 @@
+import os
+import time
+import logging
+import threading
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from crewai import Crew, Process
+from crewai.crews.crew_output import CrewOutput
+from crewai.types.usage_metrics import UsageMetrics
+from crewai.utilities.constants import NOT_SPECIFIED
+
+# "dag" runs the tasks of a crew as soon as the tasks they depend on are done,
+# "sequential" keeps crewai's one task after the other
+TASK_SCHEDULERS = ("dag", "sequential")
+
+
+def task_dependencies(tasks: Sequence[Any]) -> Dict[int, List[int]]:
+    """
+    Indices of the tasks each task depends on: its declared context, or every earlier
+    task when it declares none, as crewai's sequential process passes them all.
+    Context tasks outside the list are already done and are not dependencies.
+    """
+    index_of = {id(task): i for i, task in enumerate(tasks)}
+    dependencies: Dict[int, List[int]] = {}
+    for i, task in enumerate(tasks):
+        if task.context is NOT_SPECIFIED:
+            dependencies[i] = list(range(i))
+        else:
+            dependencies[i] = sorted(index_of[id(t)] for t in task.context or [] if id(t) in index_of)
+    return dependencies
+
+
+def topological_waves(dependencies: Mapping[Any, Sequence[Any]]) -> List[List[Any]]:
+    """Groups the nodes in waves, each node coming after all of its dependencies"""
+    remaining = {node: set(deps) for node, deps in dependencies.items()}
+    waves: List[List[Any]] = []
+    done = set()
+    while remaining:
+        wave = [node for node, deps in remaining.items() if deps <= done]
+        if not wave:
+            raise ValueError(f"Task dependencies have a cycle among: {', '.join(map(str, remaining))}")
+        waves.append(wave)
+        done.update(wave)
+        for node in wave:
+            del remaining[node]
+    return waves
+
+
+def critical_path(
+    dependencies: Mapping[Any, Sequence[Any]], durations: Mapping[Any, float]
+) -> Tuple[List[Any], float]:
+    """The chain of dependent nodes with the longest total duration, and that duration"""
+    finish: Dict[Any, float] = {}
+    previous: Dict[Any, Any] = {}
+    for wave in topological_waves(dependencies):
+        for node in wave:
+            before = max(dependencies[node], key=lambda dep: finish[dep], default=None)
+            previous[node] = before
+            finish[node] = (finish[before] if before is not None else 0.0) + durations.get(node, 0.0)
+    if not finish:
+        return [], 0.0
+    node = max(finish, key=finish.get)
+    total = finish[node]
+    path = []
+    while node is not None:
+        path.append(node)
+        node = previous[node]
+    return path[::-1], total
+
+
+def run_graph(
+    dependencies: Mapping[Any, Sequence[Any]], run: Callable[[Any], Any], max_workers: int = 4
+) -> Tuple[Dict[Any, Any], Dict[Any, float]]:
+    """
+    Runs every node once all of its dependencies succeeded, up to max_workers at a time.
+    Returns the results and durations of the nodes; the first failure is raised once
+    the nodes already running are done, nodes depending on it are never started.
+    """
+    topological_waves(dependencies)
+    results: Dict[Any, Any] = {}
+    durations: Dict[Any, float] = {}
+    waiting = {node: set(deps) for node, deps in dependencies.items()}
+    error: Optional[BaseException] = None
+
+    def timed(node):
+        start = time.perf_counter()
+        try:
+            return run(node)
+        finally:
+            durations[node] = time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        running = {}
+        while True:
+            if error is None:
+                for node in [node for node, deps in waiting.items() if not deps]:
+                    del waiting[node]
+                    # Each node runs in a copy of the caller's context, metrics labels included
+                    running[executor.submit(contextvars.copy_context().run, timed, node)] = node
+            if not running:
+                break
+            completed, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in completed:
+                node = running.pop(future)
+                try:
+                    results[node] = future.result()
+                except Exception as e:
+                    logging.error(f"Task {node} failed: {e}")
+                    error = error or e
+                    continue
+                for deps in waiting.values():
+                    deps.discard(node)
+    if error is not None:
+        raise error
+    return results, durations
+
+
+def _label(task: Any, index: int) -> str:
+    return task.name or f"task {index + 1}"
+
+
+def kickoff_graph(crew: Crew, inputs: Dict[str, Any], max_workers: Optional[int] = None) -> CrewOutput:
+    """
+    Kicks off a sequential crew as a dependency graph of its tasks: each task runs in
+    a crew of its own as soon as its context is available, so independent tasks run
+    concurrently. Tasks sharing an agent never run at the same time. The critical
+    path of the run is printed at the end.
+    """
+    max_workers = max_workers or int(os.getenv("TASK_WORKERS", "4"))
+    inputs = dict(inputs)
+    for before_callback in crew.before_kickoff_callbacks:
+        inputs = before_callback(inputs)
+
+    tasks = crew.tasks
+    dependencies = task_dependencies(tasks)
+    agent_locks: Dict[int, threading.Lock] = {id(task.agent): threading.Lock() for task in tasks}
+    waves = topological_waves(dependencies)
+    print(
+        "Task schedule: "
+        + " | ".join(", ".join(_label(tasks[i], i) for i in wave) for wave in waves)
+    )
+
+    def run(index: int):
+        task = tasks[index]
+        implicit = task.context is NOT_SPECIFIED
+        if implicit:
+            # The single-task crew would otherwise give it no context at all
+            task.context = [tasks[i] for i in dependencies[index]]
+        try:
+            with agent_locks[id(task.agent)]:
+                return Crew(
+                    agents=[task.agent],
+                    tasks=[task],
+                    process=Process.sequential,
+                    verbose=crew.verbose,
+                    memory=crew.memory,
+                    long_term_memory=crew.long_term_memory,
+                    short_term_memory=crew.short_term_memory,
+                    entity_memory=crew.entity_memory,
+                    task_callback=crew.task_callback,
+                ).kickoff(inputs=inputs)
+        finally:
+            if implicit:
+                task.context = NOT_SPECIFIED
+
+    start = time.perf_counter()
+    results, durations = run_graph(dependencies, run, max_workers)
+    elapsed = time.perf_counter() - start
+
+    path, path_seconds = critical_path(dependencies, durations)
+    print(
+        "Critical path: "
+        + " -> ".join(f"{_label(tasks[i], i)} ({durations[i]:.1f}s)" for i in path)
+        + f" = {path_seconds:.1f}s of {elapsed:.1f}s"
+    )
+
+    token_usage = UsageMetrics()
+    for i in range(len(tasks)):
+        token_usage.add_usage_metrics(results[i].token_usage)
+    tasks_output = [results[i].tasks_output[0] for i in range(len(tasks))]
+    output = CrewOutput(
+        raw=tasks_output[-1].raw,
+        pydantic=tasks_output[-1].pydantic,
+        json_dict=tasks_output[-1].json_dict,
+        tasks_output=tasks_output,
+        token_usage=token_usage,
+    )
+    for after_callback in crew.after_kickoff_callbacks:
+        output = after_callback(output)
+    return output
@@ -0,0 +1,144 @@
+import os
+import time
+import atexit
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Texts shorter than this are cheaper to encode than to hash and look up
+MIN_CACHED_CHARS = 256
+
+# Pending entries written to the database at once
+FLUSH_EVERY = 1000
+
+
+def content_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8", errors="surrogatepass"), digest_size=16).hexdigest()
+
+
+class TokenCountCache:
+    """
+    Bounded LRU of token counts keyed by (encoder, content hash), shared by every
+    token counting call site of the process. Once `open` is called it is also
+    backed by SQLite, so unchanged content is never re-encoded across runs.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries or int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "200000"))
+        self.entries: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+        self.pending: Dict[Tuple[str, str], int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.conn: Optional[sqlite3.Connection] = None
+        self.lock = threading.Lock()
+
+    def open(self, db_path: str = "./memory/token_cache.db") -> None:
+        """Backs the cache with a SQLite database, flushed every FLUSH_EVERY entries and at exit"""
+        with self.lock:
+            if self.conn is not None:
+                return
+            db_dir = os.path.dirname(db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            self.conn = sqlite3.connect(db_path, check_same_thread=False)
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS token_counts "
+                "(encoder TEXT, hash TEXT, tokens INTEGER, last_used REAL, PRIMARY KEY (encoder, hash))"
+            )
+            self.conn.commit()
+        atexit.register(self.close)
+
+    def get(self, encoder: str, text: str) -> Optional[int]:
+        if len(text) < MIN_CACHED_CHARS:
+            return None
+        key = (encoder, content_hash(text))
+        with self.lock:
+            count = self.entries.get(key)
+            if count is not None:
+                self.entries.move_to_end(key)
+            elif self.conn is not None:
+                row = self.conn.execute(
+                    "SELECT tokens FROM token_counts WHERE encoder = ? AND hash = ?", key
+                ).fetchone()
+                if row is not None:
+                    count = row[0]
+                    self._remember(key, count)
+                    # Refreshes last_used so entries still in use survive the size bound
+                    self.pending[key] = count
+            if count is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return count
+
+    def put(self, encoder: str, text: str, count: int) -> None:
+        if len(text) < MIN_CACHED_CHARS:
+            return
+        key = (encoder, content_hash(text))
+        with self.lock:
+            self._remember(key, count)
+            if self.conn is not None:
+                self.pending[key] = count
+                if len(self.pending) >= FLUSH_EVERY:
+                    self._flush()
+
+    def _remember(self, key: Tuple[str, str], count: int) -> None:
+        self.entries[key] = count
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _flush(self) -> None:
+        if self.conn is None:
+            return
+        now = time.time()
+        try:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO token_counts (encoder, hash, tokens, last_used) VALUES (?, ?, ?, ?)",
+                [(encoder, digest, count, now) for (encoder, digest), count in self.pending.items()],
+            )
+            # The database is bounded like the in-memory LRU
+            self.conn.execute(
+                "DELETE FROM token_counts WHERE rowid IN "
+                "(SELECT rowid FROM token_counts ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self.conn.commit()
+        except sqlite3.Error as e:
+            logging.warning(f"Could not persist token counts: {e}")
+        self.pending = {}
+
+    def flush(self) -> None:
+        with self.lock:
+            self._flush()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.entries),
+        }
+
+    def close(self) -> None:
+        with self.lock:
+            if self.conn is None:
+                return
+            self._flush()
+            self.conn.close()
+            self.conn = None
+
+
+_shared_cache: Optional[TokenCountCache] = None
+
+
+def get_token_cache() -> TokenCountCache:
+    """Returns the token count cache shared by the whole process"""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = TokenCountCache()
+    return _shared_cache
@@ -1,16 +1,39 @@
 import os
-from typing import Any, Dict, List, Optional, Union
+import re
+import json
+import bisect
+from itertools import accumulate
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple, Union
 import time
 
 import tiktoken
 
 from crewai import LLM
 from crewai.tasks.task_output import TaskOutput
-import panel as pn
+
+from .token_cache import TokenCountCache, get_token_cache
+from .chunk_planner import (
+    CHUNK_STRATEGIES,
+    count_cut_edges,
+    file_imports,
+    plan_chunks,
+    plan_stats,
+    resolve_import_edges,
+)
+from .chunk_descriptor import ChunkDescriptor, read_source
+from .incremental import PART_SUFFIX
+from .ast_split import SPLIT_MODES, FileSplitter, split_lines
+from .skeleton import skeleton_language
+from .llm_cache import CachedLLM, ResponseCache
+from .llm_metrics import meter_llm
+from .rate_limiter import get_rate_limiter, limit_llm
 
 
 def print_output(output: TaskOutput, chat_interface=None):
     if chat_interface is None:
+        # panel takes over a second to import, only the chat interface needs it
+        import panel as pn
+
         chat_interface = pn.chat.ChatInterface()
     message = output.raw
     chat_interface.send(message, user=output.agent, respond=False)
@@ -43,6 +66,18 @@ def manage_output_dir(output_dir: str):
         raise ValueError(f"Error creating output directory: {e}")
 
 
+# Fast token estimation: a byte count divided by ESTIMATE_BYTES_PER_TOKEN is trusted
+# when it lands outside [ESTIMATE_LOWER_RATIO, ESTIMATE_UPPER_RATIO] x max_tokens,
+# tokens are only counted exactly in between
+TOKEN_ESTIMATION_MODES = ("fast", "exact")
+ESTIMATE_BYTES_PER_TOKEN = 4
+ESTIMATE_LOWER_RATIO = 0.5
+ESTIMATE_UPPER_RATIO = 2.0
+
+# Texts handed to tiktoken's threaded encode_batch per call
+ENCODE_BATCH_SIZE = 256
+
+
 def _get_tokenizer(model: str) -> tiktoken.Encoding:
     try:
         return tiktoken.encoding_for_model(model)
@@ -50,13 +85,35 @@ def _get_tokenizer(model: str) -> tiktoken.Encoding:
         return tiktoken.get_encoding("cl100k_base")
 
 
+_token_byte_lengths: Dict[str, List[int]] = {}
+
+
+def _get_token_byte_lengths(encoder: tiktoken.Encoding) -> List[int]:
+    """Returns the byte length of every token id of an encoder, built once per encoder"""
+    if encoder.name not in _token_byte_lengths:
+        lengths = []
+        for token in range(encoder.n_vocab):
+            try:
+                lengths.append(len(encoder.decode_single_token_bytes(token)))
+            except KeyError:
+                lengths.append(0)
+        _token_byte_lengths[encoder.name] = lengths
+    return _token_byte_lengths[encoder.name]
+
+
 def LLM_Config(provider: str,
                model: str,
                temperature: Optional[float] = None,
                max_tokens: Optional[int] = None,
                timeout: Optional[Union[float, int]] = None,
                base_url: Optional[str] = None,
-               callbacks: Optional[List[Any]] = None):
+               callbacks: Optional[List[Any]] = None,
+               cache: Optional[ResponseCache] = None):
+    """
+    Builds the LLM of a provider, answering repeated requests from cache when one is given.
+    Requests reaching the provider go through the rate limiter of the provider model and
+    every call is recorded in the LLM metrics.
+    """
     callbacks = callbacks or []
     kwargs: Dict[str, Any] = dict(model=model, callbacks=callbacks)
 
@@ -73,83 +130,247 @@ def LLM_Config(provider: str,
     if provider == "ollama" and base_url is not None:
         kwargs["base_url"] = base_url
 
-    return LLM(**kwargs)
+    llm = CachedLLM(cache=cache, provider=provider, **kwargs) if cache is not None else LLM(**kwargs)
+    limit_llm(llm, get_rate_limiter(provider, model))
+    return meter_llm(llm, provider)
 
 
 class BatchProcessingManager:
     """Manages token counting, chunking, and batch processing decisions."""
 
-    def __init__(self, max_tokens: int = 6000, model: str = "gpt-4.1-mini"):
+    def __init__(
+        self,
+        max_tokens: int = 6000,
+        model: str = "gpt-4.1-mini",
+        estimation: Optional[str] = None,
+        token_cache: Optional[TokenCountCache] = None,
+        strategy: Optional[str] = None,
+    ):
         self.max_tokens = max_tokens
+        # How files are grouped into chunks, see chunk_planner.CHUNK_STRATEGIES
+        self.strategy = (strategy or os.getenv("CHUNK_STRATEGY", "packed")).lower()
+        if self.strategy not in CHUNK_STRATEGIES:
+            raise ValueError(f"chunk strategy must be one of: {', '.join(CHUNK_STRATEGIES)}")
+        self.last_plan_stats: Dict[str, Any] = {}
+        # How oversized files are split, see ast_split.SPLIT_MODES
+        self.split_mode = os.getenv("CHUNK_SPLIT", "ast").lower()
+        if self.split_mode not in SPLIT_MODES:
+            raise ValueError(f"chunk split mode must be one of: {', '.join(SPLIT_MODES)}")
+        self.header_lines = int(os.getenv("CHUNK_HEADER_LINES", "20"))
         self.encoder = _get_tokenizer(model)
+        # Token counts are shared by every manager of the process unless disabled
+        self.token_cache = token_cache
+        if token_cache is None and os.getenv("ENABLE_TOKEN_CACHE", "true").lower() == "true":
+            self.token_cache = get_token_cache()
+        # "fast" trusts a byte-based estimate far from max_tokens, "exact" always counts
+        self.estimation = (estimation or os.getenv("TOKEN_ESTIMATION", "fast")).lower()
+        if self.estimation not in TOKEN_ESTIMATION_MODES:
+            raise ValueError(f"token estimation must be one of: {', '.join(TOKEN_ESTIMATION_MODES)}")
+        self.encode_threads = int(os.getenv("TOKEN_COUNT_THREADS", os.cpu_count() or 1))
+
+    def _encode(self, text: str) -> List[int]:
+        # Source code may contain special token text such as <|endoftext|>, count it as plain text
+        return self.encoder.encode(text, disallowed_special=())
 
     def count_tokens(self, text: str) -> int:
-        return len(self.encoder.encode(str(text)))
-
-    def chunk_files_by_tokens(self, files_content: Dict[str, str]) -> List[Dict[str, Any]]:
-        """Divide i file in chunk basati sui token"""
-        chunks = []
-        current_chunk: Dict[str, Any] = {"files": {}, "total_tokens": 0, "file_count": 0}
-
-        for file_path, content in files_content.items():
-            file_tokens = self.count_tokens(content)
-
+        text = str(text)
+        if self.token_cache is None:
+            return len(self._encode(text))
+        count = self.token_cache.get(self.encoder.name, text)
+        if count is None:
+            count = len(self._encode(text))
+            self.token_cache.put(self.encoder.name, text, count)
+        return count
+
+    def count_texts_tokens(self, texts: Iterable[str]) -> int:
+        """Counts the tokens of many texts with tiktoken's threaded batch encoder"""
+        total = 0
+        batch: List[str] = []
+        for text in texts:
+            batch.append(text)
+            if len(batch) == ENCODE_BATCH_SIZE:
+                total += self._count_batch(batch)
+                batch = []
+        if batch:
+            total += self._count_batch(batch)
+        return total
+
+    def _count_batch(self, texts: List[str]) -> int:
+        total = 0
+        missing = texts
+        if self.token_cache is not None:
+            missing = []
+            for text in texts:
+                count = self.token_cache.get(self.encoder.name, text)
+                if count is None:
+                    missing.append(text)
+                else:
+                    total += count
+        if len(missing) == 1 or self.encode_threads <= 1:
+            counts = [len(self._encode(text)) for text in missing]
+        else:
+            encoded = self.encoder.encode_batch(missing, num_threads=self.encode_threads, disallowed_special=())
+            counts = [len(tokens) for tokens in encoded]
+        if self.token_cache is not None:
+            for text, count in zip(missing, counts):
+                self.token_cache.put(self.encoder.name, text, count)
+        return total + sum(counts)
+
+    def count_documents_tokens(self, documents: Iterable[Dict[str, Any]]) -> int:
+        """Counts the tokens of a stream of documents without materializing it"""
+        return self.count_texts_tokens(json.dumps(doc, ensure_ascii=False) for doc in documents)
+
+    def estimate_tokens(
+        self, repo_content: Union[str, Iterable[Dict[str, Any]]]
+    ) -> Tuple[int, bool]:
+        """
+        Returns (token count, exact). In fast mode the count is a byte-based estimate
+        unless it falls close to max_tokens, where tokens are counted exactly. A stream
+        is only read until the estimate is clearly above max_tokens.
+        """
+        if self.estimation == "exact":
+            if isinstance(repo_content, str):
+                return self.count_tokens(repo_content), True
+            return self.count_documents_tokens(repo_content), True
+
+        if isinstance(repo_content, str):
+            texts = [repo_content]
+            total_bytes = len(repo_content.encode("utf-8"))
+        else:
+            texts = []
+            upper_bytes = self.max_tokens * ESTIMATE_UPPER_RATIO * ESTIMATE_BYTES_PER_TOKEN
+            total_bytes = 0
+            for doc in repo_content:
+                text = json.dumps(doc, ensure_ascii=False)
+                total_bytes += len(text.encode("utf-8"))
+                if total_bytes > upper_bytes:
+                    # Already far above the limit, the rest of the stream is not needed
+                    return total_bytes // ESTIMATE_BYTES_PER_TOKEN, False
+                texts.append(text)
+
+        estimate = total_bytes // ESTIMATE_BYTES_PER_TOKEN
+        if estimate < self.max_tokens * ESTIMATE_LOWER_RATIO or estimate > self.max_tokens * ESTIMATE_UPPER_RATIO:
+            return estimate, False
+        return self.count_texts_tokens(texts), True
+
+    def _file_tokens(self, content: str) -> Tuple[int, Optional[List[int]]]:
+        """Returns the token count of a file, plus its tokens when they had to be encoded"""
+        count = self.token_cache.get(self.encoder.name, content) if self.token_cache else None
+        if count is not None:
+            return count, None
+        tokens = self._encode(content)
+        if self.token_cache is not None:
+            self.token_cache.put(self.encoder.name, content, len(tokens))
+        return len(tokens), tokens
+
+    def chunk_files_by_tokens(
+        self,
+        files_content: Union[Mapping[str, str], Iterable[Tuple[str, str]]],
+        reader: Optional[Callable[[str], str]] = None,
+    ) -> List[ChunkDescriptor]:
+        """
+        Divide i file in chunk basati sui token. Chunks only reference their files: the
+        content of a mapping is looked up in it, streamed files are read again with
+        reader (from disk by default), which must return the content that was streamed.
+        """
+        if isinstance(files_content, Mapping):
+            reader = reader or files_content.__getitem__
+            files_content = files_content.items()
+        reader = reader or read_source
+
+        # Only (path, tokens) is kept per file, plus its imports for the graph strategy
+        files: List[Tuple[str, int]] = []
+        imports: List[List[Tuple[str, str]]] = []
+        chunks: List[ChunkDescriptor] = []
+        for file_path, content in files_content:
+            content = str(content)
+            file_tokens, tokens = self._file_tokens(content)
             if file_tokens > self.max_tokens:
-                chunks.extend(self._chunk_single_file(file_path, content))
-                continue
-
-            if current_chunk["total_tokens"] + file_tokens > self.max_tokens:
-                if current_chunk["files"]:
-                    chunks.append(current_chunk)
-                current_chunk = {"files": {}, "total_tokens": 0, "file_count": 0}
-
-            current_chunk["files"][file_path] = content
-            current_chunk["total_tokens"] += file_tokens
-            current_chunk["file_count"] += 1
-
-        if current_chunk["files"]:
-            chunks.append(current_chunk)
-
-        return chunks
-
-    def _chunk_single_file(self, file_path: str, content: str) -> List[Dict[str, Any]]:
-        """Divide un singolo file troppo grande in chunk"""
-        lines = content.split('\n')
-        chunks = []
-        current_lines: List[str] = []
-        current_tokens = 0
-
-        for line in lines:
-            line_tokens = self.count_tokens(line)
-
-            if current_tokens + line_tokens > self.max_tokens:
-                if current_lines:
-                    chunks.append({
-                        "files": {f"{file_path}_part_{len(chunks) + 1}": '\n'.join(current_lines)},
-                        "total_tokens": current_tokens,
-                        "file_count": 1,
-                    })
-                current_lines = [line]
-                current_tokens = line_tokens
+                # Oversized files are split on their own, the others are planned together
+                chunks.extend(self._chunk_single_file(file_path, content, tokens, reader))
             else:
-                current_lines.append(line)
-                current_tokens += line_tokens
-
-        if current_lines:
-            chunks.append({
-                "files": {f"{file_path}_part_{len(chunks) + 1}": '\n'.join(current_lines)},
-                "total_tokens": current_tokens,
-                "file_count": 1,
-            })
-
+                files.append((file_path, file_tokens))
+                if self.strategy == "graph":
+                    # Extracting the imports costs a parse per file, only the graph strategy needs them
+                    imports.append(file_imports(file_path, content))
+
+        edges = resolve_import_edges([path for path, _ in files], imports) if self.strategy == "graph" else None
+        groups = plan_chunks(self.strategy, files, self.max_tokens, edges)
+        for group in groups:
+            chunks.append(ChunkDescriptor(
+                [(files[i][0], files[i][0], 0, None, "") for i in group],
+                sum(files[i][1] for i in group),
+                reader,
+            ))
+        # Chunks follow the file order; parts of a split file keep their order
+        chunks.sort(key=lambda chunk: PART_SUFFIX.sub("", chunk.entries[0][0]))
+
+        self.last_plan_stats = {
+            "strategy": self.strategy,
+            **plan_stats([chunk.total_tokens for chunk in chunks], self.max_tokens),
+        }
+        if edges is not None:
+            # Import relationships split across chunks, the fewer the better
+            self.last_plan_stats["edges"] = len(edges)
+            self.last_plan_stats["cut_edges"] = count_cut_edges(groups, edges)
         return chunks
 
-    def should_use_batch_processing(self, repo_content: str) -> bool:
+    def _line_token_counts(self, content: str, tokens: Optional[List[int]] = None) -> List[int]:
+        """
+        Returns how many tokens of the file start on each of its lines. The file is
+        encoded once and the token byte offsets are mapped back to line boundaries.
+        """
+        if tokens is None:
+            tokens = self._encode(str(content))
+        # Byte offset at which each token ends
+        token_ends = list(accumulate(map(_get_token_byte_lengths(self.encoder).__getitem__, tokens)))
+        # Number of tokens starting before each line, a token belongs to the line it starts on
+        boundaries = [0]
+        for match in re.finditer(b"\n", content.encode("utf-8")):
+            boundaries.append(bisect.bisect_left(token_ends, match.end(), lo=max(boundaries[-1] - 1, 0)) + 1)
+        boundaries.append(len(tokens))
+        return [end - start for start, end in zip(boundaries, boundaries[1:])]
+
+    def _chunk_single_file(
+        self,
+        file_path: str,
+        content: str,
+        tokens: Optional[List[int]] = None,
+        reader: Optional[Callable[[str], str]] = None,
+    ) -> List[ChunkDescriptor]:
+        """Divide un singolo file troppo grande in chunk"""
+        line_tokens = self._line_token_counts(content, tokens)
+        parts = None
+        language = skeleton_language(file_path) if self.split_mode == "ast" else None
+        if language is not None:
+            parts = FileSplitter(
+                content, language, line_tokens, self.max_tokens, self.count_tokens, self.header_lines
+            ).split()
+        if parts is None:
+            parts = [
+                ("", first, last, count)
+                for first, last, count in split_lines(line_tokens, 0, len(line_tokens), self.max_tokens)
+            ]
+
+        if reader is None:
+            reader = lambda _: content
+        # Character offset at which each line starts, parts are stored as ranges of the text
+        line_starts = [0, *accumulate(len(line) + 1 for line in content.split('\n'))]
+        return [
+            ChunkDescriptor(
+                [(f"{file_path}_part_{i + 1}", file_path, line_starts[first], line_starts[last] - 1, prefix)],
+                part_tokens,
+                reader,
+            )
+            for i, (prefix, first, last, part_tokens) in enumerate(parts)
+        ]
+
+    def should_use_batch_processing(self, repo_content: Union[str, Iterable[Dict[str, Any]]]) -> bool:
         """Determine if batch processing is needed based on content size"""
-        token_count = self.count_tokens(repo_content)
+        token_count, exact = self.estimate_tokens(repo_content)
         batch_enabled = os.getenv("ENABLE_BATCH_PROCESSING", "true").lower() == "true"
 
-        print(f"Repository token count: {token_count:,}")
+        print(f"Repository token count: {token_count:,}" + ("" if exact else " (estimated)"))
         print(f"Max tokens per request: {self.max_tokens:,}")
         print(f"Batch processing enabled: {batch_enabled}")
 
@@ -0,0 +1,39 @@
+import threading
+from code_explainer.utils.aggregation import reduction_groups, tree_reduce
+
+
+def test_reduction_groups_fit_the_budget():
+    assert reduction_groups([3, 3, 3, 3, 5], 6) == [[0, 1], [2, 3], [4]]
+    assert reduction_groups([2, 2], 10) == [[0, 1]]
+    assert reduction_groups([], 10) == []
+
+
+def test_reduction_groups_pair_oversized_items():
+    # No two items fit together, pairing them still shrinks the level
+    assert reduction_groups([8, 8, 8], 10) == [[0, 1], [2]]
+
+
+def test_tree_reduce_merges_level_by_level():
+    calls = []
+    lock = threading.Lock()
+
+    def reduce(parts, final):
+        with lock:
+            calls.append((len(parts), final))
+        return "+".join(parts) if final else f"({len(parts)})"
+
+    count_tokens = lambda text: 4 if text.startswith("s") else 1
+    result = tree_reduce([f"s{i}" for i in range(10)], reduce, count_tokens, max_tokens=12, max_workers=4)
+    # 10 summaries -> 4 groups of at most 3, the last one passed through -> one final group
+    assert result == "(3)+(3)+(3)+s9"
+    assert sorted(calls) == [(3, False), (3, False), (3, False), (4, True)]
+
+
+def test_tree_reduce_keeps_parts_of_failed_groups():
+    def reduce(parts, final):
+        if not final and "s0" in parts:
+            raise RuntimeError("rate limited")
+        return " | ".join(parts)
+
+    result = tree_reduce(["s0", "s1", "s2", "s3"], reduce, lambda text: 5, max_tokens=10)
+    assert result == "s0\n\ns1 | s2 | s3"
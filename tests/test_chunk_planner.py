@@ -0,0 +1,130 @@
+import os
+import pytest
+from code_explainer.utils.chunk_planner import (
+    count_cut_edges,
+    first_fit_decreasing,
+    import_edges,
+    plan_chunks,
+    plan_graph,
+    plan_greedy,
+    plan_packed,
+    plan_stats,
+)
+from code_explainer.utils.utils import BatchProcessingManager
+
+
+def _loads(files, groups):
+    return sorted(sum(files[i][1] for i in group) for group in groups)
+
+
+def test_greedy_keeps_order_and_leaves_gaps():
+    files = [("a.py", 6), ("b.py", 5), ("c.py", 4), ("d.py", 5)]
+    assert plan_greedy(files, 10) == [[0], [1, 2], [3]]
+
+
+def test_first_fit_decreasing():
+    assert sorted(map(sorted, first_fit_decreasing([6, 5, 4, 5], 10))) == [[0, 2], [1, 3]]
+
+
+def test_packed_uses_fewer_chunks_than_greedy():
+    files = [("a.py", 6), ("b.py", 5), ("c.py", 4), ("d.py", 5)]
+    packed = plan_packed(files, 10)
+    assert len(packed) == 2
+    assert _loads(files, packed) == [10, 10]
+    assert sorted(i for group in packed for i in group) == [0, 1, 2, 3]
+
+
+def test_packed_prefers_same_directory():
+    files = [
+        ("pkg/a/x.py", 4),
+        ("pkg/a/y.py", 3),
+        ("pkg/b/z.py", 4),
+        ("other/w.py", 3),
+    ]
+    groups = plan_packed(files, 7)
+    named = [sorted(files[i][0] for i in group) for group in groups]
+    assert ["pkg/a/x.py", "pkg/a/y.py"] in named
+    assert ["other/w.py", "pkg/b/z.py"] in named
+
+
+def test_plan_chunks_rejects_unknown_strategy():
+    with pytest.raises(ValueError, match="chunk strategy must be one of"):
+        plan_chunks("random", [], 10)
+
+
+def test_plan_stats():
+    assert plan_stats([10, 5], 10) == {"chunks": 2, "total_tokens": 15, "fill_ratio": 0.75}
+    assert plan_stats([], 10)["fill_ratio"] == 0.0
+
+
+def test_manager_reports_plan_stats():
+    files = {f"pkg/file_{i}.py": "value = compute(1)\n" * (i + 1) for i in range(12)}
+    greedy = BatchProcessingManager(max_tokens=60, strategy="greedy")
+    packed = BatchProcessingManager(max_tokens=60, strategy="packed")
+    greedy_chunks = greedy.chunk_files_by_tokens(files)
+    packed_chunks = packed.chunk_files_by_tokens(files)
+
+    assert packed.last_plan_stats["chunks"] == len(packed_chunks) <= len(greedy_chunks)
+    assert packed.last_plan_stats["fill_ratio"] >= greedy.last_plan_stats["fill_ratio"]
+    assert sorted(p for c in packed_chunks for p in c["files"]) == sorted(p for c in greedy_chunks for p in c["files"])
+    assert all(c["total_tokens"] <= 60 for c in packed_chunks if c["file_count"] > 1)
+
+
+def test_manager_rejects_unknown_strategy():
+    with pytest.raises(ValueError, match="chunk strategy must be one of"):
+        BatchProcessingManager(strategy="random")
+
+
+def test_special_token_text_is_counted_as_plain_text():
+    mgr = BatchProcessingManager(max_tokens=100)
+    assert mgr.count_tokens("print('<|endoftext|>')") > 1
+    assert mgr.count_texts_tokens(["<|endoftext|>", "x <|endoftext|>"]) > 2
+
+
+def test_import_edges_resolves_relative_and_absolute_imports(tmp_path):
+    files = [
+        (str(tmp_path / "pkg" / "models.py"), "class User:\n    pass\n"),
+        (str(tmp_path / "pkg" / "service.py"), "from .models import User\n"),
+        (str(tmp_path / "app.py"), "import pkg.service\nimport os\n"),
+        (str(tmp_path / "config.xml"), "<config/>"),
+    ]
+    assert import_edges(files) == [(0, 1), (1, 2)]
+
+
+def test_graph_keeps_connected_files_together():
+    # a <-> c and b <-> d are coupled but interleaved in path order
+    files = [("a.py", 5), ("b.py", 5), ("c.py", 5), ("d.py", 5)]
+    edges = [(0, 2), (1, 3)]
+    graph = plan_graph(files, 10, edges)
+    assert sorted(map(sorted, graph)) == [[0, 2], [1, 3]]
+    assert count_cut_edges(graph, edges) == 0
+    assert count_cut_edges(plan_greedy(files, 10), edges) == 2
+
+
+def test_graph_respects_budget():
+    files = [("a.py", 6), ("b.py", 6), ("c.py", 3)]
+    edges = [(0, 1), (1, 2)]
+    groups = plan_graph(files, 10, edges)
+    assert all(sum(files[i][1] for i in group) <= 10 for group in groups)
+    assert count_cut_edges(groups, edges) == 1
+
+
+def test_count_cut_edges_counts_unplanned_files_as_cut():
+    assert count_cut_edges([[0, 1]], [(0, 1), (1, 2)]) == 1
+
+
+def test_manager_reports_cut_edges(tmp_path):
+    files = {
+        str(tmp_path / "a.py"): "import c\n" + "x = 1\n" * 10,
+        str(tmp_path / "b.py"): "import d\n" + "y = 2\n" * 10,
+        str(tmp_path / "c.py"): "z = 3\n" * 10,
+        str(tmp_path / "d.py"): "w = 4\n" * 10,
+    }
+    mgr = BatchProcessingManager(max_tokens=120, strategy="graph")
+    chunks = mgr.chunk_files_by_tokens(files)
+    assert mgr.last_plan_stats["edges"] == 2
+    assert mgr.last_plan_stats["cut_edges"] == 0
+    assert {frozenset(os.path.basename(p) for p in c["files"]) for c in chunks} == {
+        frozenset({"a.py", "c.py"}),
+        frozenset({"b.py", "d.py"}),
+    }
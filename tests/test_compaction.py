@@ -0,0 +1,109 @@
+import pytest
+from code_explainer.utils.compaction import Compactor, minhash
+from code_explainer.utils.utils import BatchProcessingManager
+
+LICENSE = "# Copyright 2024 ACME Corp.\n# Licensed under the Apache License, Version 2.0\n\n"
+CODE = "import os\n\n\n\n# ==========\ndef run(path):\n    return os.path.basename(path)\n"
+
+
+@pytest.fixture
+def manager():
+    return BatchProcessingManager(max_tokens=1000)
+
+
+def _generated(seed):
+    rows = "\n".join(f"    ('field_{i}', 'TYPE_{i % 7}', {i * 3})," for i in range(80))
+    return f"# Generated by protoc at build {seed}\nFIELDS = [\n{rows}\n]\n"
+
+
+def test_rules_strip_headers_banners_blank_lines_and_strings(manager):
+    compactor = Compactor(manager.count_tokens, max_string_chars=20)
+    source = "#!/usr/bin/env python\n" + LICENSE + CODE + f'KEY = "{"x" * 50}"\n'
+    assert compactor.compact("app.py", source) == (
+        "#!/usr/bin/env python\nimport os\n\ndef run(path):\n    return os.path.basename(path)\n"
+        f'KEY = "{"x" * 20}..."\n'
+    )
+    report = compactor.report()
+    assert all(report[rule]["files"] == 1 and report[rule]["tokens"] > 0
+               for rule in ("license", "banners", "blank_lines", "long_strings"))
+
+
+def test_license_block_comment_and_plain_comments(manager):
+    compactor = Compactor(manager.count_tokens)
+    java = "/*\n * Licensed to the Apache Software Foundation.\n */\npackage app;\nclass A {}\n"
+    assert compactor.compact("A.java", java) == "package app;\nclass A {}\n"
+    # Leading comments that are not a license stay
+    assert compactor.compact("b.py", "# Helpers for paths\nx = 1\n") == "# Helpers for paths\nx = 1\n"
+
+
+def test_long_strings_only_truncates_literals(manager):
+    compactor = Compactor(manager.count_tokens, rules=["long_strings"], max_string_chars=20)
+    # Between the closing quote of one literal and the opening quote of the next is code
+    code = 'x = f("a") + compute_total(order, discount, shipping, taxes) + g("b")\n'
+    assert compactor.compact("app.py", code) == code
+    assert compactor.compact("app.js", code) == code
+    # Quotes in comments do not open a literal
+    commented = "total = compute(order)  # don't add taxes here, see the shipping module\nname = 'b'\n"
+    assert compactor.compact("app.py", commented) == commented
+    long_literal = f'x = f("a", "{"y" * 30}") + g(\'b\')\n'
+    assert compactor.compact("app.py", long_literal) == f'x = f("a", "{"y" * 20}...") + g(\'b\')\n'
+    assert compactor.report()["long_strings"]["files"] == 1
+
+
+def test_rules_can_be_disabled(manager, monkeypatch):
+    monkeypatch.setenv("COMPACTION_RULES", "blank_lines")
+    compactor = Compactor(manager.count_tokens)
+    assert compactor.compact("app.py", LICENSE + CODE).startswith(LICENSE)
+    assert set(compactor.report()) == {"blank_lines"}
+
+    with pytest.raises(ValueError):
+        Compactor(manager.count_tokens, rules=["comments"])
+
+
+def test_duplicates_and_near_duplicates_point_to_first_copy(manager):
+    compactor = Compactor(manager.count_tokens)
+    original = _generated(1)
+    assert compactor.compact("a/fields.py", original) == original
+    assert compactor.compact("vendor/fields.py", original) == "Identical to a/fields.py, see that file."
+    near = compactor.compact("b/fields.py", _generated(2))
+    assert near.startswith("Near-duplicate of a/fields.py (")
+    assert "fields.py" not in compactor.compact("c/other.py", CODE * 40)
+    report = compactor.report()
+    assert report["duplicates"]["files"] == 1
+    assert report["near_duplicates"]["files"] == 1
+    # Replaced files read back as their note
+    assert compactor.read("vendor/fields.py") == "Identical to a/fields.py, see that file."
+
+
+def test_parts_of_one_file_are_not_near_duplicates_of_each_other(manager):
+    compactor = Compactor(manager.count_tokens, rules=["near_duplicates"])
+    # LanguageParser splits a file in documents sharing its path
+    first, second = _generated(1), _generated(2)
+    assert compactor.compact_document({"source_filename": "a/fields.py", "source_file_contents": first}) == {
+        "source_filename": "a/fields.py", "source_file_contents": first
+    }
+    assert compactor.compact_document(
+        {"source_filename": "a/fields.py", "source_file_contents": second}
+    )["source_file_contents"] == second
+    # Another file still points to the first document
+    assert compactor.compact("b/fields.py", _generated(3)).startswith("Near-duplicate of a/fields.py (")
+    assert compactor.report()["near_duplicates"]["files"] == 1
+
+
+def test_minhash_similarity():
+    a, b, c = minhash(_generated(1)), minhash(_generated(2)), minhash(CODE * 40)
+    assert (a == b).mean() > 0.9
+    assert (a == c).mean() < 0.2
+    assert minhash("too short") is None
+
+
+def test_chunks_read_compacted_content(manager, tmp_path):
+    path = tmp_path / "big.py"
+    path.write_text(LICENSE + "\n".join(f"value_{i} = compute({i})\n\n\n" for i in range(200)), encoding="utf-8")
+    compactor = Compactor(manager.count_tokens)
+    manager.max_tokens = 200
+    files = compactor.iter_files([(str(path), path.read_text(encoding="utf-8"))])
+    chunks = manager.chunk_files_by_tokens(files, reader=compactor.read)
+    content = "\n".join(chunk["files"][f"{path}_part_{i + 1}"] for i, chunk in enumerate(chunks))
+    assert content == compactor.compact_text(str(path), path.read_text(encoding="utf-8"), record=False)
+    assert "Copyright" not in content
@@ -0,0 +1,289 @@
+import sqlite3
+import threading
+import time
+import pytest
+from types import SimpleNamespace
+from crewai import LLM, Crew, Process
+from crewai.memory import EntityMemory, LongTermMemory, ShortTermMemory
+from crewai.utilities.formatter import aggregate_raw_outputs_from_tasks
+from code_explainer.crew import CodeExplainer
+from code_explainer.utils.task_scheduler import kickoff_graph
+from code_explainer.utils.resources import clear_resources
+
+
+@pytest.fixture
+def code_explainer(monkeypatch, tmp_path):
+    monkeypatch.setenv("PROVIDER", "openai")
+    monkeypatch.setenv("MODEL", "gpt-4o-mini")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("ENABLE_LLM_CACHE", "false")
+    monkeypatch.setenv("OUTPUT_DIR", str(tmp_path / "output") + "/")
+    clear_resources()
+    yield CodeExplainer()
+    clear_resources()
+
+
+@pytest.fixture
+def kickoffs(monkeypatch):
+    """Replaces the LLM work of every crew: each kickoff is recorded and answered with a short merge"""
+    calls = []
+    lock = threading.Lock()
+
+    def kickoff(self, inputs=None):
+        with lock:
+            calls.append({"task": self.tasks[0].name, "description": self.tasks[0].description, **inputs})
+        return f"### merged {inputs['result_count']}"
+
+    monkeypatch.setattr(Crew, "kickoff", kickoff)
+    return calls
+
+
+def test_aggregation_levels_count_their_parts(code_explainer, kickoffs, monkeypatch):
+    monkeypatch.setenv("AGGREGATION_MAX_TOKENS", "120")
+    results = [
+        {"chunk_id": i + 1, "files": [f"f{i}.py"], "result": "finding " * 50, "error": None}
+        for i in range(5)
+    ]
+    assert code_explainer._aggregate_results(results, {}) == "### merged 3"
+
+    # Pairs of chunks are merged first, then the two merges and the last chunk make the report
+    merges = [call for call in kickoffs if call["task"] == "merge_task"]
+    final = [call for call in kickoffs if call["task"] == "aggregation_task"]
+    assert [call["result_count"] for call in merges] == [2, 2]
+    assert [call["result_count"] for call in final] == [3]
+    assert kickoffs[-1] is final[0]
+    for call in kickoffs:
+        assert call["results"].count("### ") == call["result_count"]
+        assert call["total_chunks"] == 5
+    assert all("do not write the final report" in call["description"] for call in merges)
+    assert "unified, comprehensive architectural assessment" in final[0]["description"]
+
+
+class StubChunkCrew:
+    """Chunk crew answering from the chunk number, later chunks finishing first"""
+
+    def __init__(self, failing=(), total=0):
+        self.failing = set(failing)
+        self.total = total
+        self.analyzed = []
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def copy(self):
+        return self
+
+    def kickoff(self, inputs):
+        number = inputs["chunk_number"]
+        with self.lock:
+            self.analyzed.append(number)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(0.01 * (self.total - number + 1))
+            if number in self.failing:
+                raise RuntimeError(f"chunk {number} timed out")
+            return f"analysis {number}"
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+@pytest.fixture
+def batch(code_explainer, monkeypatch, tmp_path):
+    """A repository of one-file chunks, with the report crews stubbed and the memory in tmp_path"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("CONTEXT_CHUNK_SIZE", "40")
+    monkeypatch.setenv("CHUNK_WORKERS", "3")
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    for i in range(6):
+        words = " ".join(f"word{j}" for j in range(12))
+        (repo / f"module_{i}.py").write_text(f"def f{i}():\n    return '{words}'\n", encoding="utf-8")
+    inputs = {"code_path": str(repo), "repository_url": None}
+    total = len(code_explainer._plan_chunks(str(repo)))
+
+    aggregated = []
+    monkeypatch.setattr(code_explainer, "_aggregate_results", lambda results, inputs: aggregated.append(results) or "analysis")
+    monkeypatch.setattr(code_explainer, "report_crew", lambda analysis, completed, callback: SimpleNamespace(tasks=[]))
+    monkeypatch.setattr(code_explainer, "kickoff_crew", lambda crew, inputs: "report")
+
+    def run(failing=(), resume=False):
+        chunk_crew = StubChunkCrew(failing, total)
+        monkeypatch.setattr(code_explainer, "chunk_crew", lambda: chunk_crew)
+        assert code_explainer.process_in_batches(dict(inputs), resume=resume) == "report"
+        return chunk_crew, aggregated[-1]
+
+    return SimpleNamespace(run=run, total=total)
+
+
+def test_chunks_are_analyzed_concurrently_in_chunk_order(batch):
+    assert batch.total >= 4
+    chunk_crew, results = batch.run(failing={2})
+
+    assert 1 < chunk_crew.peak <= 3
+    assert [result["chunk_id"] for result in results] == list(range(1, batch.total + 1))
+    assert results[1]["error"] == "chunk 2 timed out" and results[1]["result"] is None
+    for result in results[:1] + results[2:]:
+        assert result["error"] is None and result["result"] == f"analysis {result['chunk_id']}"
+
+
+def test_resume_analyzes_only_the_failed_chunks(batch, monkeypatch):
+    monkeypatch.setenv("ENABLE_INCREMENTAL_ANALYSIS", "false")
+    batch.run(failing={2, 4})
+
+    chunk_crew, results = batch.run(resume=True)
+    assert sorted(chunk_crew.analyzed) == [2, 4]
+    assert [result["result"] for result in results] == [f"analysis {i}" for i in range(1, batch.total + 1)]
+
+
+def test_batch_runs_close_their_journal_and_analysis_state(batch, code_explainer, monkeypatch):
+    journals, plans = [], []
+    open_run = code_explainer._open_run
+    incremental_plan = code_explainer._incremental_plan
+
+    def recording_open_run(*args):
+        journal, run_id, done = open_run(*args)
+        journals.append(journal)
+        return journal, run_id, done
+
+    def recording_incremental_plan(inputs):
+        plans.append(incremental_plan(inputs))
+        return plans[-1]
+
+    monkeypatch.setattr(code_explainer, "_open_run", recording_open_run)
+    monkeypatch.setattr(code_explainer, "_incremental_plan", recording_incremental_plan)
+    batch.run()
+
+    def failing_aggregation(results, inputs):
+        raise RuntimeError("aggregation failed")
+
+    monkeypatch.setattr(code_explainer, "_aggregate_results", failing_aggregation)
+    with pytest.raises(RuntimeError, match="aggregation failed"):
+        batch.run()
+
+    assert len(journals) == len(plans) == 2
+    for journal, plan in zip(journals, plans):
+        with pytest.raises(sqlite3.ProgrammingError):
+            journal.list_runs()
+        with pytest.raises(sqlite3.ProgrammingError):
+            plan.state.last_commit("repo")
+
+
+class StubStorage:
+    def __init__(self):
+        self.saved = []
+
+    def save(self, *args, **kwargs):
+        self.saved.append(args)
+
+    def search(self, *args, **kwargs):
+        return []
+
+    def reset(self):
+        self.saved = []
+
+
+@pytest.fixture
+def memories(code_explainer, monkeypatch):
+    """Memories on in-process storages, so the crews are built without Qdrant or an embedder"""
+    settings = {
+        "memory": True,
+        "long_term_memory": LongTermMemory(storage=StubStorage()),
+        "short_term_memory": ShortTermMemory(storage=StubStorage()),
+        "entity_memory": EntityMemory(storage=StubStorage()),
+    }
+    monkeypatch.setattr(code_explainer, "memory_settings", lambda: settings)
+    return settings
+
+
+def test_chunk_crew_runs_only_the_chunk_analysis(code_explainer, memories):
+    chunk_crew = code_explainer.chunk_crew()
+    assert [task.name for task in chunk_crew.tasks] == ["chunk_analysis_task"]
+    assert [agent.role for agent in chunk_crew.agents] == [code_explainer.software_analyst().role]
+
+    # Each chunk runs on a copy, with memories of its own
+    first, second = chunk_crew.copy(), chunk_crew.copy()
+    for name in ("short_term_memory", "long_term_memory", "entity_memory"):
+        assert getattr(first, name) is not getattr(second, name)
+        assert getattr(first, name).storage is not getattr(second, name).storage
+    first.short_term_memory.storage.save("chunk 1 finding")
+    assert second.short_term_memory.storage.saved == []
+    assert memories["short_term_memory"].storage.saved == []
+
+
+def test_report_crew_works_from_the_aggregated_analysis(code_explainer, memories, monkeypatch):
+    for name in ("SONARQUBE_URL", "SONARQUBE_PROJECT", "SONARQUBE_TOKEN"):
+        monkeypatch.delenv(name, raising=False)
+    report_crew = code_explainer.report_crew("aggregated analysis of every chunk")
+
+    assert [task.name for task in report_crew.tasks] == ["documentation_task", "diagram_task"]
+    documentation_task = report_crew.tasks[0]
+    assert [task.name for task in documentation_task.context] == ["analysis_task"]
+    assert aggregate_raw_outputs_from_tasks(documentation_task.context) == "aggregated analysis of every chunk"
+
+    assert code_explainer.report_crew("analysis", {"documentation_task": "docs", "diagram_task": "diagrams"}) is None
+
+
+def test_standard_inputs_carry_the_chunk_contents(code_explainer, tmp_path):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    (repo / "app.py").write_text("print('hello')\n", encoding="utf-8")
+
+    inputs = code_explainer.prepare_inputs({"code_path": str(repo)})
+    assert inputs["total_chunks"] == 1
+    [chunk] = inputs["code_chunks"]
+    assert list(chunk["files"].values()) == ["print('hello')\n"]
+    assert chunk["file_count"] == 1
+
+
+@pytest.fixture
+def answers(monkeypatch):
+    """
+    Answers every LLM call with the name of the task it is for, recording the prompts by task.
+    Requested before code_explainer, as the LLMs of its agents look up call when they are built.
+    """
+    prompts = {}
+    failing = set()
+    lock = threading.Lock()
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None, from_agent=None):
+        with lock:
+            prompts.setdefault(from_task.name, []).append(str(messages))
+        if from_task.name in failing:
+            raise RuntimeError(f"{from_task.name} failed")
+        return f"Thought: done\nFinal Answer: {from_task.name} output"
+
+    monkeypatch.setattr(LLM, "call", call)
+    return SimpleNamespace(prompts=prompts, failing=failing)
+
+
+def test_graph_kickoff_passes_the_analysis_to_the_report_tasks(answers, code_explainer, capsys):
+    def build():
+        tasks = [code_explainer.analysis_task(), code_explainer.documentation_task(), code_explainer.diagram_task()]
+        return Crew(agents=[task.agent for task in tasks], tasks=tasks, process=Process.sequential)
+
+    inputs = {
+        "code_path": "repo",
+        "repo": "repo",
+        "repository_url": None,
+        "sonarqube_json": "{}",
+        "output_format": "png",
+        "diagram_type": "class",
+    }
+    output = kickoff_graph(build(), inputs, max_workers=2)
+
+    assert "Task schedule: analysis_task | documentation_task, diagram_task" in capsys.readouterr().out
+    assert [task.raw for task in output.tasks_output] == [
+        "analysis_task output",
+        "documentation_task output",
+        "diagram_task output",
+    ]
+    assert output.raw == "diagram_task output"
+    assert all("analysis_task output" not in prompt for prompt in answers.prompts["analysis_task"])
+    for name in ("documentation_task", "diagram_task"):
+        assert any("analysis_task output" in prompt for prompt in answers.prompts[name])
+
+    answers.failing.add("diagram_task")
+    with pytest.raises(RuntimeError, match="diagram_task failed"):
+        kickoff_graph(build(), inputs, max_workers=2)
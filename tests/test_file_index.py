@@ -0,0 +1,81 @@
+import os
+from code_explainer.utils.file_index import FileIndex, GitignoreRules
+
+
+def _write(root, rel_path, content="x = 1\n", mode="w"):
+    path = root / rel_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if mode == "wb":
+        path.write_bytes(content)
+    else:
+        path.write_text(content, encoding="utf-8")
+    return str(path)
+
+
+def test_index_lists_source_files_sorted(tmp_path):
+    b = _write(tmp_path, "pkg/b.py")
+    a = _write(tmp_path, "a.py")
+    _write(tmp_path, "notes.txt")
+
+    assert FileIndex(str(tmp_path)).paths() == sorted([a, b])
+
+
+def test_index_skips_vendored_and_generated_dirs(tmp_path):
+    kept = _write(tmp_path, "src/app.js")
+    _write(tmp_path, "node_modules/lib/index.js")
+    _write(tmp_path, "build/out.py")
+    _write(tmp_path, "dist/bundle.py")
+
+    index = FileIndex(str(tmp_path))
+
+    assert index.paths() == [kept]
+    assert index.skipped["ignored_dir"] == 3
+
+
+def test_index_honors_gitignore(tmp_path):
+    _write(tmp_path, ".gitignore", "generated/\n*.gen.py\n!keep.gen.py\n")
+    _write(tmp_path, "pkg/.gitignore", "/local.py\n")
+    kept = [_write(tmp_path, "app.py"), _write(tmp_path, "keep.gen.py"), _write(tmp_path, "sub/pkg/local.py")]
+    _write(tmp_path, "generated/models.py")
+    _write(tmp_path, "schema.gen.py")
+    _write(tmp_path, "pkg/local.py")
+
+    assert FileIndex(str(tmp_path)).paths() == sorted(kept)
+
+
+def test_index_skips_binary_minified_and_large_files(tmp_path):
+    kept = _write(tmp_path, "app.js", "var a = 1;\n")
+    _write(tmp_path, "blob.py", b"\x00\x01\x02binary", mode="wb")
+    _write(tmp_path, "lib.min.js", "var a=1;")
+    _write(tmp_path, "packed.js", "var a=1;" * 2000)
+    _write(tmp_path, "huge.py", "x = 1\n" * 4000)
+
+    index = FileIndex(str(tmp_path), max_file_size=20000)
+
+    assert index.paths() == [kept]
+    assert index.skipped == {"binary": 1, "minified": 2, "too_large": 1}
+
+
+def test_paths_filters_by_suffix(tmp_path):
+    py = _write(tmp_path, "a.py")
+    _write(tmp_path, "B.java", "class B {}\n")
+
+    assert FileIndex(str(tmp_path)).paths([".py"]) == [py]
+
+
+def test_for_root_shares_index_until_refresh(tmp_path):
+    _write(tmp_path, "a.py")
+    first = FileIndex.for_root(str(tmp_path))
+    _write(tmp_path, "b.py")
+
+    assert FileIndex.for_root(str(tmp_path)) is first
+    assert len(FileIndex.for_root(str(tmp_path), refresh=True).paths()) == 2
+
+
+def test_gitignore_rules_anchoring():
+    rules = GitignoreRules().extend("", ["/top.py", "any.py", "docs/**/*.py"])
+
+    assert rules.ignored("top.py", is_dir=False)
+    assert not rules.ignored("sub/top.py", is_dir=False)
+    assert rules.ignored("sub/any.py", is_dir=False)
+    assert rules.ignored("docs/a/b/conf.py", is_dir=False)
@@ -0,0 +1,130 @@
+import os
+import pytest
+from git import Repo
+from code_explainer.utils.incremental import (
+    AnalysisState,
+    IncrementalPlan,
+    analysis_fingerprint,
+    changed_files,
+    head_commit,
+    source_path,
+)
+
+
+@pytest.fixture
+def git_repo(tmp_path):
+    repo_dir = tmp_path / "repo"
+    repo_dir.mkdir()
+    repo = Repo.init(repo_dir)
+    with repo.config_writer() as config:
+        config.set_value("user", "name", "Test")
+        config.set_value("user", "email", "test@example.com")
+    for name in ("a.py", "b.py"):
+        (repo_dir / name).write_text(f"# {name}\n", encoding="utf-8")
+    repo.index.add(["a.py", "b.py"])
+    repo.index.commit("initial")
+    return repo
+
+
+def _commit_change(repo, name, content):
+    path = os.path.join(repo.working_tree_dir, name)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    repo.index.add([name])
+    return repo.index.commit(f"update {name}").hexsha
+
+
+def test_source_path_strips_part_suffix(tmp_path):
+    assert source_path(str(tmp_path / "big.py_part_3")) == str(tmp_path / "big.py")
+
+
+def test_head_commit_outside_git_returns_none(tmp_path):
+    assert head_commit(str(tmp_path)) is None
+
+
+def test_changed_files_includes_commits_and_untracked(git_repo):
+    root = git_repo.working_tree_dir
+    first = git_repo.head.commit.hexsha
+    _commit_change(git_repo, "a.py", "changed\n")
+    with open(os.path.join(root, "new.py"), "w", encoding="utf-8") as f:
+        f.write("x = 1\n")
+
+    changed = changed_files(root, first)
+
+    assert os.path.join(root, "a.py") in changed
+    assert os.path.join(root, "new.py") in changed
+    assert os.path.join(root, "b.py") not in changed
+
+
+def test_changed_files_unknown_commit_returns_none(git_repo):
+    assert changed_files(git_repo.working_tree_dir, "0" * 40) is None
+
+
+def test_analysis_state_round_trip(tmp_path):
+    state = AnalysisState(db_path=str(tmp_path / "state.db"))
+    key = state.chunk_key(["b.py", "a.py"])
+
+    state.record_commit("repo", "abc")
+    state.put_chunk_result("repo", key, "abc", ["a.py", "b.py"], "result")
+
+    assert key == state.chunk_key(["a.py", "b.py"])
+    assert state.last_commit("repo") == "abc"
+    assert state.get_chunk_result("repo", key) == ("abc", "result")
+
+
+def test_plan_reuses_only_unchanged_chunks(git_repo, tmp_path):
+    root = git_repo.working_tree_dir
+    a, b = os.path.join(root, "a.py"), os.path.join(root, "b.py")
+    state = AnalysisState(db_path=str(tmp_path / "state.db"))
+
+    first_run = IncrementalPlan(state, repo_key="repo", repo_path=root)
+    assert first_run.reusable_result([a]) is None
+    first_run.record([a], "analysis of a")
+    first_run.record([b], "analysis of b")
+    first_run.finish()
+
+    _commit_change(git_repo, "a.py", "changed\n")
+    second_run = IncrementalPlan(state, repo_key="repo", repo_path=root)
+
+    assert second_run.reusable_result([a]) is None
+    assert second_run.reusable_result([b]) == "analysis of b"
+
+
+def test_plan_does_not_store_dirty_files(git_repo, tmp_path):
+    root = git_repo.working_tree_dir
+    a = os.path.join(root, "a.py")
+    with open(a, "w", encoding="utf-8") as f:
+        f.write("uncommitted\n")
+    state = AnalysisState(db_path=str(tmp_path / "state.db"))
+
+    plan = IncrementalPlan(state, repo_key="repo", repo_path=root)
+    plan.record([a], "analysis of dirty a")
+
+    assert state.get_chunk_result("repo", state.chunk_key([a])) is None
+
+
+def test_plan_reuses_only_results_of_the_same_fingerprint(git_repo, tmp_path, monkeypatch):
+    root = git_repo.working_tree_dir
+    a = os.path.join(root, "a.py")
+    config = tmp_path / "tasks.yaml"
+    config.write_text("analysis_task: explain\n", encoding="utf-8")
+    monkeypatch.setenv("MODEL", "gpt-4o-mini")
+    monkeypatch.setenv("INGESTION_MODE", "full")
+    state = AnalysisState(db_path=str(tmp_path / "state.db"))
+
+    def plan():
+        return IncrementalPlan(state, repo_key="repo", repo_path=root, fingerprint=analysis_fingerprint([str(config)]))
+
+    first_run = plan()
+    first_run.record([a], "analysis of a")
+    first_run.finish()
+    assert plan().reusable_result([a]) == "analysis of a"
+
+    monkeypatch.setenv("MODEL", "gpt-4o")
+    assert plan().reusable_result([a]) is None
+    monkeypatch.setenv("MODEL", "gpt-4o-mini")
+    config.write_text("analysis_task: explain briefly\n", encoding="utf-8")
+    assert plan().reusable_result([a]) is None
+    config.write_text("analysis_task: explain\n", encoding="utf-8")
+    monkeypatch.setenv("INGESTION_MODE", "skeleton")
+    assert plan().reusable_result([a]) is None
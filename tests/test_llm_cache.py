@@ -0,0 +1,73 @@
+import time
+import pytest
+from crewai import LLM
+from code_explainer.utils.llm_cache import CachedLLM, ResponseCache, request_key
+from code_explainer.utils.utils import LLM_Config
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(str(tmp_path / "llm.db"), ttl_days=1, max_mb=1, max_temperature=0)
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def completions(monkeypatch):
+    calls = []
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None, from_agent=None):
+        calls.append(messages)
+        return f"answer {len(calls)}"
+
+    monkeypatch.setattr(LLM, "call", call)
+    return calls
+
+
+def test_request_key_covers_model_temperature_and_messages():
+    messages = [{"role": "user", "content": "explain"}]
+    key = request_key("openai", "gpt-4o-mini", 0.0, 100, messages, None)
+    assert request_key("openai", "gpt-4o-mini", 0.0, 100, [dict(m) for m in messages], None) == key
+    assert request_key("openai", "gpt-4o", 0.0, 100, messages, None) != key
+    assert request_key("openai", "gpt-4o-mini", 0.5, 100, messages, None) != key
+    assert request_key("openai", "gpt-4o-mini", 0.0, 100, [{"role": "user", "content": "x"}], None) != key
+
+
+def test_cache_hits_and_expiry(cache):
+    assert cache.get("k") is None
+    cache.put("k", "v")
+    assert cache.get("k") == "v"
+    assert cache.stats()["hit_rate"] == 0.5
+
+    cache.conn.execute("UPDATE responses SET created_at = ?", (time.time() - 2 * 86400,))
+    assert cache.get("k") is None
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path / "llm.db"), max_mb=2500 / (1024 * 1024))
+    cache.put("a", "x" * 1000)
+    cache.put("b", "x" * 1000)
+    cache.get("a")
+    cache.put("c", "x" * 1000)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    cache.close()
+
+
+def test_llm_config_returns_cached_llm(cache, completions):
+    llm = LLM_Config(provider="openai", model="gpt-4o-mini", temperature=0, cache=cache)
+    assert isinstance(llm, CachedLLM)
+    messages = [{"role": "user", "content": "explain this chunk"}]
+    assert llm.call(messages) == "answer 1"
+    assert llm.call(messages) == "answer 1"
+    assert llm.call([{"role": "user", "content": "another chunk"}]) == "answer 2"
+    assert len(completions) == 2
+    assert cache.stats()["hits"] == 1
+
+
+def test_sampled_temperatures_are_not_cached(cache, completions):
+    llm = LLM_Config(provider="openai", model="gpt-4o-mini", temperature=0.7, cache=cache)
+    llm.call("explain")
+    llm.call("explain")
+    assert len(completions) == 2
+    assert cache.stats()["skipped"] == 2
@@ -0,0 +1,95 @@
+import csv
+import json
+import pytest
+from types import SimpleNamespace
+from crewai import LLM
+from code_explainer.utils.llm_cache import CachedLLM, ResponseCache
+from code_explainer.utils.llm_metrics import LLMMetrics, meter_llm, metrics_scope
+
+USAGE = {"prompt_tokens": 120, "completion_tokens": 30}
+
+
+@pytest.fixture
+def completions(monkeypatch):
+    calls = []
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None, from_agent=None):
+        calls.append(messages)
+        if messages == "fail":
+            raise RuntimeError("provider down")
+        # crewai reports the usage of each completion to the callbacks before returning
+        for callback in callbacks or []:
+            if hasattr(callback, "log_success_event"):
+                callback.log_success_event({}, {"usage": USAGE}, None, None)
+        return f"answer {len(calls)}"
+
+    monkeypatch.setattr(LLM, "call", call)
+    return calls
+
+
+def test_calls_are_labelled_with_task_agent_and_scope(completions):
+    metrics = LLMMetrics()
+    llm = meter_llm(LLM(model="gpt-4o-mini"), "openai", metrics)
+    task = SimpleNamespace(name="code_analysis_task", agent=SimpleNamespace(role="Code Analyst"))
+    with metrics_scope(chunk=2):
+        assert llm.call("explain", from_task=task) == "answer 1"
+    llm.call("explain")
+
+    first, second = metrics.calls
+    assert first["task"] == "code_analysis_task" and first["agent"] == "Code Analyst" and first["chunk"] == 2
+    assert first["prompt_tokens"] == 120 and first["completion_tokens"] == 30
+    assert first["provider"] == "openai" and first["model"] == "gpt-4o-mini"
+    assert second["chunk"] is None and second["task"] is None
+
+
+def test_nested_calls_count_as_retries(monkeypatch):
+    metrics = LLMMetrics()
+    llm = LLM(model="gpt-4o-mini")
+    attempts = []
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None, from_agent=None):
+        attempts.append(messages)
+        # crewai calls the LLM again, e.g. after trimming a context too long
+        return self.call("retry") if len(attempts) < 3 else "done"
+
+    monkeypatch.setattr(LLM, "call", call)
+    meter_llm(llm, "openai", metrics).call("explain")
+    assert len(metrics.calls) == 1
+    assert metrics.calls[0]["retries"] == 2
+
+
+def test_failures_and_cache_hits_are_recorded(completions, tmp_path):
+    metrics = LLMMetrics()
+    cache = ResponseCache(str(tmp_path / "llm.db"), max_temperature=0)
+    llm = meter_llm(CachedLLM(cache=cache, provider="openai", model="gpt-4o-mini", temperature=0), "openai", metrics)
+    with pytest.raises(RuntimeError):
+        llm.call("fail")
+    llm.call("explain")
+    llm.call("explain")
+    cache.close()
+
+    assert metrics.calls[0]["error"] == "provider down"
+    assert [call["cached"] for call in metrics.calls] == [False, False, True]
+    assert len(completions) == 2
+
+
+def test_summary_is_written_as_json_and_csv(completions, tmp_path):
+    metrics = LLMMetrics()
+    llm = meter_llm(LLM(model="gpt-4o-mini"), "openai", metrics)
+    for chunk in (1, 2, 2):
+        with metrics_scope(chunk=chunk):
+            llm.call("explain", from_task=SimpleNamespace(name="code_analysis_task", agent=None))
+
+    summary = metrics.summary()
+    assert summary["totals"]["calls"] == 3
+    assert summary["totals"]["prompt_tokens"] == 360
+    assert summary["by_chunk"]["2"]["calls"] == 2
+    assert summary["by_task"]["code_analysis_task"]["completion_tokens"] == 90
+    assert summary["by_agent"] == {}
+
+    json_path, csv_path = metrics.write(str(tmp_path / "output"))
+    with open(json_path, encoding="utf-8") as f:
+        written = json.load(f)
+    assert written["totals"] == summary["totals"] and len(written["calls"]) == 3
+    with open(csv_path, encoding="utf-8") as f:
+        assert [row["chunk"] for row in csv.DictReader(f)] == ["1", "2", "2"]
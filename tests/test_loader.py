@@ -3,7 +3,9 @@ import pytest
 import os
 import json
 from unittest.mock import patch, MagicMock, mock_open, call
-from code_explainer.utils.repo_loader import RepoLoader
+from git import Repo
+from langchain_community.document_loaders.parsers import LanguageParser
+from code_explainer.utils.repo_loader import RepoLoader, iter_jsonl
 
 
 # ---------------------------------------------------------------------------
@@ -14,17 +16,32 @@ from code_explainer.utils.repo_loader import RepoLoader
 @patch('code_explainer.utils.repo_loader.os.makedirs')
 @patch('code_explainer.utils.repo_loader.os.path.exists', return_value=False)
 def test_clone_repo_success(mock_exists, mock_makedirs, mock_repo_class):
-    """clone_repo clones and returns the local path when nothing exists yet."""
+    """clone_repo clones (shallow by default) and returns the local path when nothing exists yet."""
     utils = RepoLoader()
     remote_url = 'https://github.com/someuser/somerepo.git'
     expected_path = os.path.join('./repos/', 'somerepo')
 
     result = utils.clone_repo(remote_url)
 
-    mock_repo_class.clone_from.assert_called_once_with(remote_url, to_path=expected_path)
+    mock_repo_class.clone_from.assert_called_once_with(remote_url, to_path=expected_path, depth=1)
     assert result == expected_path
 
 
+@patch('code_explainer.utils.repo_loader.Repo')
+@patch('code_explainer.utils.repo_loader.os.makedirs')
+@patch('code_explainer.utils.repo_loader.os.path.exists', return_value=False)
+def test_clone_repo_full_history(mock_exists, mock_makedirs, mock_repo_class):
+    """clone_repo with depth=0 clones the complete history."""
+    utils = RepoLoader()
+    remote_url = 'https://github.com/someuser/somerepo.git'
+
+    utils.clone_repo(remote_url, depth=0)
+
+    mock_repo_class.clone_from.assert_called_once_with(
+        remote_url, to_path=os.path.join('./repos/', 'somerepo')
+    )
+
+
 @patch('code_explainer.utils.repo_loader.Repo')
 def test_clone_repo_existing_path_returns_path(mock_repo_class, tmp_path):
     """clone_repo returns the existing path and skips cloning."""
@@ -67,6 +84,80 @@ def test_clone_repo_git_error_returns_none(mock_exists, mock_makedirs, mock_repo
     assert result is None
 
 
+# ---------------------------------------------------------------------------
+# clone_repo against local bare remotes
+# ---------------------------------------------------------------------------
+
+def _commit_files(repo, files):
+    for name, content in files.items():
+        path = os.path.join(repo.working_tree_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+    repo.index.add(list(files))
+    repo.index.commit("update")
+    repo.remotes.origin.push()
+
+
+@pytest.fixture
+def bare_remote(tmp_path):
+    """A bare repository with two commits, plus a working clone used to push to it."""
+    remote_dir = tmp_path / "remote.git"
+    Repo.init(remote_dir, bare=True)
+    work = Repo.clone_from(f"file://{remote_dir}", tmp_path / "work")
+    with work.config_writer() as config:
+        config.set_value("user", "name", "Test")
+        config.set_value("user", "email", "test@example.com")
+    _commit_files(work, {"src/app.py": "v1\n", "docs/readme.md": "docs\n"})
+    _commit_files(work, {"src/app.py": "v2\n"})
+    return f"file://{remote_dir}", work
+
+
+def test_clone_repo_shallow_from_bare_remote(bare_remote, tmp_path):
+    url, _ = bare_remote
+    loader = RepoLoader(repo_path=str(tmp_path / "clones"))
+
+    path = loader.clone_repo(url, depth=1, update=False)
+
+    clone = Repo(path)
+    assert clone.git.rev_list("--count", "HEAD") == "1"
+    with open(os.path.join(path, "src", "app.py"), encoding="utf-8") as f:
+        assert f.read() == "v2\n"
+
+
+def test_clone_repo_sparse_checkout(bare_remote, tmp_path):
+    url, _ = bare_remote
+    loader = RepoLoader(repo_path=str(tmp_path / "clones"))
+
+    path = loader.clone_repo(url, sparse_paths=["src"], blob_filter="blob:none", update=False)
+
+    assert os.path.exists(os.path.join(path, "src", "app.py"))
+    assert not os.path.exists(os.path.join(path, "docs", "readme.md"))
+
+
+def test_clone_repo_updates_existing_checkout(bare_remote, tmp_path):
+    url, work = bare_remote
+    loader = RepoLoader(repo_path=str(tmp_path / "clones"))
+    path = loader.clone_repo(url)
+
+    _commit_files(work, {"src/app.py": "v3\n"})
+    assert loader.clone_repo(url) == path
+
+    with open(os.path.join(path, "src", "app.py"), encoding="utf-8") as f:
+        assert f.read() == "v3\n"
+
+
+def test_clone_repo_update_failure_keeps_checkout(tmp_path):
+    """An existing directory that is not a git checkout is analyzed as is."""
+    existing = tmp_path / "somerepo"
+    existing.mkdir()
+    loader = RepoLoader(repo_path=str(tmp_path))
+
+    result = loader.clone_repo('https://github.com/someuser/somerepo.git')
+
+    assert result == str(existing)
+
+
 # ---------------------------------------------------------------------------
 # parse_java_file
 # ---------------------------------------------------------------------------
@@ -146,3 +237,84 @@ def test_load_repo_java_files_included(tmp_path):
     java_docs = [d for d in docs if d["programming_language"] == "java"]
     assert len(java_docs) == 1
     assert "Foo" in java_docs[0]["source_file_contents"]
+
+
+PY_CODE = "def greet(name):\n    return f'hello {name}'\n"
+
+
+def test_load_repo_parallel_matches_serial(tmp_path):
+    """load_repo returns the same documents, in the same order, with one or many workers."""
+    for i in range(4):
+        (tmp_path / f"mod_{i}.py").write_text(PY_CODE, encoding="utf-8")
+    (tmp_path / "App.java").write_text(JAVA_CODE, encoding="utf-8")
+
+    serial = RepoLoader(max_workers=1).load_repo(local_path=str(tmp_path))
+    parallel = RepoLoader(max_workers=2).load_repo(local_path=str(tmp_path))
+
+    assert json.loads(parallel) == json.loads(serial)
+    sources = [d["source_filename"] for d in json.loads(serial)]
+    assert sources[-1].endswith("App.java")
+
+
+def test_load_repo_isolates_per_file_errors(tmp_path, capsys):
+    """A file that fails to parse is reported and skipped without dropping the others."""
+    (tmp_path / "good.py").write_text(PY_CODE, encoding="utf-8")
+    (tmp_path / "bad.py").write_text(PY_CODE, encoding="utf-8")
+
+    def fake_parser(parser_threshold):
+        parser = LanguageParser(parser_threshold=parser_threshold)
+        real_lazy_parse = parser.lazy_parse
+
+        def lazy_parse(blob):
+            if blob.source.endswith("bad.py"):
+                raise RuntimeError("boom")
+            return real_lazy_parse(blob)
+
+        parser.lazy_parse = lazy_parse
+        return parser
+
+    with patch('code_explainer.utils.repo_loader.LanguageParser', side_effect=fake_parser):
+        result = RepoLoader(max_workers=1).load_repo(local_path=str(tmp_path))
+
+    sources = [d["source_filename"] for d in json.loads(result)]
+    assert any(s.endswith("good.py") for s in sources)
+    assert not any(s.endswith("bad.py") for s in sources)
+    assert "boom" in capsys.readouterr().out
+
+
+# ---------------------------------------------------------------------------
+# streaming
+# ---------------------------------------------------------------------------
+
+def test_iter_documents_no_path_raises():
+    """iter_documents validates the path before the first document is requested."""
+    with pytest.raises(ValueError, match="No local repository path"):
+        RepoLoader().iter_documents()
+
+
+def test_iter_documents_is_lazy_and_matches_load_repo(tmp_path):
+    """iter_documents yields the same documents as load_repo, one at a time."""
+    (tmp_path / "hello.py").write_text("print('hello')", encoding="utf-8")
+    (tmp_path / "App.java").write_text(JAVA_CODE, encoding="utf-8")
+    loader = RepoLoader(max_workers=1)
+
+    stream = loader.iter_documents(local_path=str(tmp_path))
+
+    assert not isinstance(stream, list)
+    assert list(stream) == json.loads(loader.load_repo(local_path=str(tmp_path)))
+
+
+def test_write_jsonl_round_trip(tmp_path):
+    """write_jsonl writes one document per line and iter_jsonl reads them back."""
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    (repo / "hello.py").write_text("print('hello')", encoding="utf-8")
+    (repo / "App.java").write_text(JAVA_CODE, encoding="utf-8")
+    output = tmp_path / "out" / "docs.jsonl"
+    loader = RepoLoader(max_workers=1)
+
+    count = loader.write_jsonl(str(output), local_path=str(repo))
+
+    assert count == 2
+    assert len(output.read_text(encoding="utf-8").splitlines()) == 2
+    assert list(iter_jsonl(str(output))) == json.loads(loader.load_repo(local_path=str(repo)))
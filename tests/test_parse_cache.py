@@ -0,0 +1,115 @@
+import json
+import os
+from unittest.mock import patch
+from code_explainer.utils.parse_cache import ParseCache, git_blob_sha
+from code_explainer.utils.repo_loader import RepoLoader
+
+
+def test_git_blob_sha_matches_git():
+    # Same value as `echo hello | git hash-object --stdin`
+    assert git_blob_sha(b"hello\n") == "ce013625030ba8dba906f756967f9e9ca394464a"
+
+
+def test_get_miss_then_hit(tmp_path):
+    source = tmp_path / "a.py"
+    source.write_text("x = 1", encoding="utf-8")
+    cache = ParseCache(db_path=str(tmp_path / "cache.db"))
+
+    assert cache.get(str(source), "language_parser", 50) is None
+    cache.put(str(source), "language_parser", 50, [
+        {"source_filename": str(source), "programming_language": "python", "source_file_contents": "x = 1"}
+    ])
+    docs = cache.get(str(source), "language_parser", 50)
+
+    assert docs == [
+        {"source_filename": str(source), "programming_language": "python", "source_file_contents": "x = 1"}
+    ]
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_key_includes_parser_and_threshold(tmp_path):
+    source = tmp_path / "a.py"
+    source.write_text("x = 1", encoding="utf-8")
+    cache = ParseCache(db_path=str(tmp_path / "cache.db"))
+    cache.put(str(source), "language_parser", 50, [{"source_file_contents": "x = 1"}])
+
+    assert cache.get(str(source), "language_parser", 10) is None
+    assert cache.get(str(source), "java", 50) is None
+
+
+def test_changed_content_is_a_miss(tmp_path):
+    source = tmp_path / "a.py"
+    source.write_text("x = 1", encoding="utf-8")
+    cache = ParseCache(db_path=str(tmp_path / "cache.db"))
+    cache.put(str(source), "language_parser", 50, [{"source_file_contents": "x = 1"}])
+
+    source.write_text("x = 22", encoding="utf-8")
+    assert cache.get(str(source), "language_parser", 50) is None
+
+
+def test_unchanged_stat_skips_rehashing(tmp_path):
+    source = tmp_path / "a.py"
+    source.write_text("x = 1", encoding="utf-8")
+    cache = ParseCache(db_path=str(tmp_path / "cache.db"))
+    cache.blob_sha(str(source))
+
+    with patch("code_explainer.utils.parse_cache.git_blob_sha") as mock_sha:
+        cache.blob_sha(str(source))
+    mock_sha.assert_not_called()
+
+
+def test_evict_respects_size_bound(tmp_path):
+    cache = ParseCache(db_path=str(tmp_path / "cache.db"), max_size_bytes=200)
+    for i in range(5):
+        source = tmp_path / f"f{i}.py"
+        source.write_text(f"x = {i}", encoding="utf-8")
+        cache.put(str(source), "language_parser", 50, [{"source_file_contents": "y" * 80}])
+
+    evicted = cache.evict()
+
+    assert evicted > 0
+    assert cache.stats()["size_bytes"] <= 200
+
+
+def test_load_repo_warm_run_uses_cache(tmp_path):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    (repo / "hello.py").write_text("print('hello')", encoding="utf-8")
+    (repo / "App.java").write_text("public class App {}", encoding="utf-8")
+    db_path = str(tmp_path / "cache.db")
+
+    cold_cache = ParseCache(db_path=db_path)
+    cold = RepoLoader(max_workers=1, parse_cache=cold_cache).load_repo(local_path=str(repo))
+    cold_cache.close()
+
+    warm_cache = ParseCache(db_path=db_path)
+    with patch("code_explainer.utils.repo_loader._parse_source_file") as mock_parse:
+        warm = RepoLoader(max_workers=1, parse_cache=warm_cache).load_repo(local_path=str(repo))
+
+    mock_parse.assert_not_called()
+    assert json.loads(warm) == json.loads(cold)
+    assert warm_cache.stats()["hits"] == 2
+
+
+def test_same_content_with_different_suffixes_keeps_its_language(tmp_path):
+    repo = tmp_path / "repo"
+    (repo / "pkg").mkdir(parents=True)
+    (repo / "a.py").write_text("x = 1\n", encoding="utf-8")
+    (repo / "b.js").write_text("x = 1\n", encoding="utf-8")
+    (repo / "pkg" / "__init__.py").write_text("", encoding="utf-8")
+    (repo / "pkg" / "main.go").write_text("", encoding="utf-8")
+    db_path = str(tmp_path / "cache.db")
+
+    def languages(cache):
+        loaded = json.loads(RepoLoader(max_workers=1, parse_cache=cache).load_repo(local_path=str(repo)))
+        return {os.path.basename(doc["source_filename"]): doc["programming_language"] for doc in loaded}
+
+    cold_cache = ParseCache(db_path=db_path)
+    cold = languages(cold_cache)
+    cold_cache.close()
+
+    warm_cache = ParseCache(db_path=db_path)
+    assert languages(warm_cache) == cold
+    assert warm_cache.stats()["misses"] == 0
+    assert cold["a.py"] != cold["b.js"]
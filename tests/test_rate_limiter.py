@@ -0,0 +1,141 @@
+import threading
+import time
+import litellm
+import pytest
+from crewai import LLM
+from code_explainer.utils.llm_cache import CachedLLM, ResponseCache
+from code_explainer.utils.llm_metrics import LLMMetrics, meter_llm
+from code_explainer.utils.rate_limiter import AdaptiveConcurrency, RateLimiter, TokenBucket, limit_llm
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def rate_limited():
+    return litellm.RateLimitError("slow down", "openai", "gpt-4o-mini")
+
+
+def failing(error):
+    def complete():
+        raise error
+
+    return complete
+
+
+def test_token_bucket_waits_for_refill():
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock)
+    assert bucket.reserve(60) == 0
+    assert bucket.reserve(30) == pytest.approx(30)
+    clock.now += 30
+    bucket.adjust(-10)
+    assert bucket.reserve(10) == 0
+
+
+def test_requests_per_minute_are_throttled():
+    clock = FakeClock()
+    limiter = RateLimiter(rpm=2, clock=clock, sleep=clock.sleep)
+    for _ in range(3):
+        limiter.run(lambda: "ok")
+    assert clock.sleeps == [pytest.approx(30)]
+
+
+def test_retryable_errors_are_retried_with_backoff():
+    clock = FakeClock()
+    limiter = RateLimiter(max_retries=3, backoff_seconds=1, clock=clock, sleep=clock.sleep)
+    attempts = []
+
+    def complete():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise rate_limited()
+        return "ok"
+
+    assert limiter.run(complete) == "ok"
+    assert len(clock.sleeps) == 2
+    assert clock.sleeps[0] <= 1 and clock.sleeps[1] <= 2
+
+    with pytest.raises(litellm.RateLimitError):
+        limiter.run(failing(rate_limited()))
+    assert len(clock.sleeps) == 5
+
+    with pytest.raises(litellm.AuthenticationError):
+        limiter.run(failing(litellm.AuthenticationError("bad key", "openai", "gpt-4o-mini")))
+    assert len(clock.sleeps) == 5
+
+
+def test_concurrency_adapts_to_error_rate():
+    concurrency = AdaptiveConcurrency(8, error_rate=0.2, window=5)
+    concurrency.record(False)
+    assert concurrency.limit == 4
+    for _ in range(4):
+        concurrency.record(True)
+    concurrency.record(False)
+    assert concurrency.limit == 4
+    concurrency.record(False)
+    assert concurrency.limit == 2
+    for _ in range(5):
+        concurrency.record(True)
+    assert concurrency.limit == 3
+
+
+def test_slots_limit_calls_in_flight_and_nest():
+    concurrency = AdaptiveConcurrency(2)
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def work():
+        with concurrency.slot():
+            # A nested call of the same context does not wait for a second slot
+            with concurrency.slot():
+                with lock:
+                    active[0] += 1
+                    peak[0] = max(peak[0], active[0])
+                time.sleep(0.02)
+                with lock:
+                    active[0] -= 1
+
+    threads = [threading.Thread(target=work) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2
+
+
+def test_llm_retries_are_metered_and_cache_hits_not_limited(monkeypatch, tmp_path):
+    calls = []
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None, from_agent=None):
+        calls.append(messages)
+        if len(calls) == 1:
+            raise rate_limited()
+        return "answer"
+
+    monkeypatch.setattr(LLM, "call", call)
+    clock = FakeClock()
+    limiter = RateLimiter(rpm=1, clock=clock, sleep=clock.sleep)
+    metrics = LLMMetrics()
+    cache = ResponseCache(str(tmp_path / "llm.db"), max_temperature=0)
+    llm = CachedLLM(cache=cache, provider="openai", model="gpt-4o-mini", temperature=0)
+    meter_llm(limit_llm(llm, limiter), "openai", metrics)
+
+    assert llm.call("explain") == "answer"
+    assert llm.call("explain") == "answer"
+    cache.close()
+
+    assert len(calls) == 2
+    assert metrics.calls[0]["retries"] == 1 and metrics.calls[1]["cached"]
+    # A backoff, then the wait for the second request of the minute, the cache hit none
+    assert len(clock.sleeps) == 2
+    assert sum(clock.sleeps) == pytest.approx(60)
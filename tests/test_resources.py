@@ -0,0 +1,37 @@
+import pytest
+from code_explainer.utils.resources import clear_resources, get_context_manager, get_llm, llm_settings
+
+
+@pytest.fixture
+def llm_env(monkeypatch):
+    monkeypatch.setenv("PROVIDER", "openai")
+    monkeypatch.setenv("MODEL", "gpt-4o-mini")
+    monkeypatch.setenv("ENABLE_LLM_CACHE", "false")
+    monkeypatch.delenv("TEMPERATURE", raising=False)
+    clear_resources()
+    yield monkeypatch
+    clear_resources()
+
+
+def test_llm_settings_are_validated(llm_env):
+    assert llm_settings()["temperature"] is None
+    llm_env.setenv("TEMPERATURE", "warm")
+    with pytest.raises(ValueError):
+        llm_settings()
+    llm_env.delenv("MODEL")
+    with pytest.raises(ValueError):
+        llm_settings()
+
+
+def test_llm_is_built_once_per_settings(llm_env):
+    llm = get_llm()
+    assert get_llm() is llm
+    llm_env.setenv("TEMPERATURE", "0.2")
+    assert get_llm() is not llm
+    assert get_llm().temperature == 0.2
+
+
+def test_context_manager_is_shared(llm_env):
+    assert get_context_manager() is get_context_manager()
+    llm_env.setenv("CONTEXT_CHUNK_SIZE", "1000")
+    assert get_context_manager().max_tokens == 1000
@@ -0,0 +1,89 @@
+import time
+import pytest
+from code_explainer import main
+from code_explainer.utils.chunk_descriptor import ChunkDescriptor
+from code_explainer.utils.run_journal import RunJournal, plan_hash
+
+
+def _chunks(*groups):
+    return [ChunkDescriptor([(name, name, 0, None, "") for name in names], tokens) for names, tokens in groups]
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = RunJournal(str(tmp_path / "runs.db"))
+    yield journal
+    journal.close()
+
+
+def test_plan_hash_changes_with_the_plan():
+    base = plan_hash(_chunks((["a.py", "b.py"], 10), (["c.py"], 5)))
+    assert plan_hash(_chunks((["a.py", "b.py"], 10), (["c.py"], 5))) == base
+    assert plan_hash(_chunks((["a.py"], 10), (["b.py", "c.py"], 5))) != base
+    assert plan_hash(_chunks((["a.py", "b.py"], 11), (["c.py"], 5))) != base
+
+
+def test_resume_returns_completed_units(journal):
+    run_id, done = journal.start("repo", "abc", "plan", 3)
+    assert done == {}
+    journal.record(run_id, "chunk:1", "first")
+    journal.record(run_id, "chunk:2", "second")
+    journal.finish(run_id, "failed")
+
+    resumed_id, done = journal.start("repo", "abc", "plan", 3, resume=True)
+    assert resumed_id == run_id
+    assert done == {"chunk:1": "first", "chunk:2": "second"}
+
+
+def test_runs_are_keyed_by_commit_and_plan(journal):
+    run_id, _ = journal.start("repo", "abc", "plan", 1)
+    journal.record(run_id, "chunk:1", "first")
+    assert journal.start("repo", "def", "plan", 1, resume=True)[1] == {}
+    assert journal.start("repo", "abc", "other", 1, resume=True)[1] == {}
+
+
+def test_start_without_resume_discards_previous_units(journal):
+    run_id, _ = journal.start("repo", "abc", "plan", 1)
+    journal.record(run_id, "chunk:1", "first")
+    assert journal.start("repo", "abc", "plan", 1)[1] == {}
+
+
+def test_list_and_prune_runs(journal):
+    old_id, _ = journal.start("repo", "abc", "plan", 2)
+    journal.record(old_id, "chunk:1", "first")
+    journal.finish(old_id, "completed")
+    journal.conn.execute("UPDATE runs SET updated_at = ? WHERE run_id = ?", (time.time() - 10 * 86400, old_id))
+    new_id, _ = journal.start("repo", "def", "plan", 2)
+
+    runs = journal.list_runs()
+    assert [entry["run_id"] for entry in runs] == [new_id, old_id]
+    assert runs[1]["units"] == 1 and runs[1]["status"] == "completed"
+
+    assert journal.prune(max_age_days=7) == 1
+    assert [entry["run_id"] for entry in journal.list_runs()] == [new_id]
+    assert journal.completed_units(old_id) == {}
+
+
+def test_bare_prune_keeps_recent_and_running_runs(journal, monkeypatch, tmp_path):
+    ids = {}
+    for commit, status, age_days in (("a", "completed", 40), ("b", "failed", 5), ("c", "running", 40), ("d", "running", 0)):
+        ids[commit], _ = journal.start("repo", commit, "plan", 1)
+        journal.finish(ids[commit], status)
+        journal.conn.execute("UPDATE runs SET updated_at = ? WHERE run_id = ?", (time.time() - age_days * 86400, ids[commit]))
+    journal.conn.commit()
+
+    assert journal.prune() == 1
+    assert {entry["run_id"] for entry in journal.list_runs()} == {ids["b"], ids["c"], ids["d"]}
+    assert journal.prune(include_running=True) == 1
+    assert {entry["run_id"] for entry in journal.list_runs()} == {ids["b"], ids["d"]}
+
+    # The command line prunes the journal of the working directory the same way
+    monkeypatch.chdir(tmp_path)
+    cli_journal = RunJournal()
+    stale_id, _ = cli_journal.start("repo", "e", "plan", 1)
+    cli_journal.conn.execute("UPDATE runs SET updated_at = ? WHERE run_id = ?", (time.time() - 40 * 86400, stale_id))
+    cli_journal.conn.commit()
+    monkeypatch.setattr(main.sys, "argv", ["runs", "prune"])
+    main.runs()
+    assert [entry["run_id"] for entry in cli_journal.list_runs()] == [stale_id]
+    cli_journal.close()
@@ -0,0 +1,108 @@
+import json
+import pytest
+from code_explainer.utils.repo_loader import RepoLoader
+from code_explainer.utils.skeleton import extract_skeleton, skeleton_language
+
+
+PYTHON_CODE = '''import os
+
+# Adds numbers
+def add(a: int, b: int) -> int:
+    """Returns the sum."""
+    total = a + b
+    return total
+
+class Greeter(Base):
+    """Greets people."""
+    greeting = "hi"
+
+    def greet(self, name):
+        message = f"{self.greeting} {name}"
+        return message
+'''
+
+SAMPLES = {
+    "typescript": (
+        'import { x } from "y";\n'
+        "export class Service implements Api { run(input: string): number { const hidden = 1; return hidden; } }\n"
+        "interface Api { run(input: string): number; }\n",
+        ["import { x } from \"y\";", "class Service implements Api", "run(input: string): number", "interface Api"],
+    ),
+    "go": (
+        'package main\nimport "fmt"\nfunc (s *Server) Start(port int) error { hidden := 1; fmt.Println(hidden); return nil }\n',
+        ["package main", "import \"fmt\"", "func (s *Server) Start(port int) error"],
+    ),
+    "cpp": (
+        "#include <vector>\nnamespace app { class Engine { public: void start(int speed) { int hidden = speed; } }; }\n",
+        ["#include <vector>", "namespace app", "class Engine", "void start(int speed)"],
+    ),
+    "c_sharp": (
+        "using System;\nnamespace App { public class Engine { public void Start(int speed) { var hidden = speed; } } }\n",
+        ["using System;", "namespace App", "public class Engine", "public void Start(int speed)"],
+    ),
+    "rust": (
+        "use std::io;\nimpl Engine { pub fn start(&self, speed: u32) -> bool { let hidden = speed; true } }\n",
+        ["use std::io;", "impl Engine", "pub fn start(&self, speed: u32) -> bool"],
+    ),
+    "php": (
+        "<?php\nuse App\\Base;\nclass Engine extends Base { public function start($speed) { $hidden = $speed; } }\n",
+        ["use App\\Base;", "class Engine extends Base", "public function start($speed)"],
+    ),
+    "scala": (
+        "import app.Base\nclass Engine extends Base { def start(speed: Int): Boolean = { val hidden = speed; true } }\n",
+        ["import app.Base", "class Engine extends Base", "def start(speed: Int): Boolean ="],
+    ),
+}
+
+
+def test_python_skeleton_keeps_declarations_and_docstrings():
+    skeleton = extract_skeleton(PYTHON_CODE, "python")
+
+    assert skeleton.splitlines() == [
+        "import os",
+        "# Adds numbers",
+        "def add(a: int, b: int) -> int:",
+        '    """Returns the sum."""',
+        "class Greeter(Base):",
+        '    """Greets people."""',
+        '    greeting = "hi"',
+        "    def greet(self, name):",
+    ]
+
+
+@pytest.mark.parametrize("language", sorted(SAMPLES))
+def test_skeleton_per_language(language):
+    source, expected = SAMPLES[language]
+
+    skeleton = extract_skeleton(source, language)
+
+    for line in expected:
+        assert line in skeleton
+    assert "hidden" not in skeleton
+
+
+def test_unsupported_language_returns_none():
+    assert extract_skeleton("whatever", "cobol") is None
+
+
+def test_skeleton_language_by_suffix():
+    assert skeleton_language("src/app.ts") == "typescript"
+    assert skeleton_language("src/App.java") is None
+
+
+def test_load_repo_skeleton_mode(tmp_path):
+    (tmp_path / "app.py").write_text(PYTHON_CODE, encoding="utf-8")
+    (tmp_path / "empty.py").write_text("print('no declarations')\n", encoding="utf-8")
+
+    docs = json.loads(RepoLoader(max_workers=1, ingestion_mode="skeleton").load_repo(local_path=str(tmp_path)))
+    by_name = {d["source_filename"].rsplit("/", 1)[-1]: d for d in docs}
+
+    assert "total = a + b" not in by_name["app.py"]["source_file_contents"]
+    assert "def add(a: int, b: int) -> int:" in by_name["app.py"]["source_file_contents"]
+    # Files without declarations fall back to their source text
+    assert by_name["empty.py"]["source_file_contents"] == "print('no declarations')\n"
+
+
+def test_invalid_ingestion_mode_raises():
+    with pytest.raises(ValueError, match="ingestion mode"):
+        RepoLoader(ingestion_mode="tiny")
@@ -0,0 +1,158 @@
+import os
+import pytest
+from code_explainer.utils.symbol_index import SymbolIndex, extract_symbols, ModuleResolver
+from code_explainer.utils.repo_loader import RepoLoader
+from code_explainer.tools.symbol_index_tool import SymbolIndexLookupTool
+
+
+def _write(root, rel_path, content):
+    path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return path
+
+
+@pytest.fixture
+def python_repo(tmp_path):
+    root = tmp_path / "repo"
+    _write(root, "pkg/__init__.py", "")
+    _write(
+        root,
+        "pkg/models.py",
+        "class User:\n    def name(self):\n        return 'x'\n\n\ndef make_user():\n    return User()\n",
+    )
+    _write(root, "pkg/service.py", "from .models import User, make_user\n\n\ndef run():\n    return make_user().name()\n")
+    _write(root, "app.py", "import pkg.service\n\npkg.service.run()\n")
+    return str(root)
+
+
+def _paths(root):
+    return sorted(
+        os.path.join(directory, name) for directory, _, names in os.walk(root) for name in names
+    )
+
+
+def test_extract_symbols_python(python_repo):
+    path, symbols, error = extract_symbols(os.path.join(python_repo, "pkg", "models.py"))
+    assert error is None
+    definitions = {(name, kind, parent) for name, kind, parent, *_ in symbols["definitions"]}
+    assert definitions == {("User", "class", ""), ("name", "method", "User"), ("make_user", "function", "")}
+    # Defining a name is not a reference to it, using it is
+    assert "User" in symbols["references"]
+    assert "make_user" not in symbols["references"]
+
+
+def test_extract_symbols_unsupported_file(tmp_path):
+    path = _write(tmp_path, "build.gradle", "apply plugin: 'java'\n")
+    assert extract_symbols(path) == (path, None, None)
+
+
+def test_index_lookups(python_repo, tmp_path):
+    index = SymbolIndex(python_repo, db_path=str(tmp_path / "symbols.db"))
+    result = index.update(_paths(python_repo))
+    assert result == {"files": 4, "updated": 4, "removed": 0, "errors": 0}
+
+    [definition] = index.find_definitions("User.name")
+    assert definition["path"] == "pkg/models.py"
+    assert definition["line"] == 2
+    assert definition["signature"] == "def name(self)"
+    assert [d["qualified_name"] for d in index.definitions_in("pkg/models.py")] == ["User", "User.name", "make_user"]
+    assert index.dependencies("pkg/service.py") == ["pkg/models.py"]
+    assert index.dependencies(os.path.join(python_repo, "app.py")) == ["pkg/service.py"]
+    assert index.dependents("pkg/models.py") == ["pkg/service.py"]
+    assert index.references_to("make_user") == ["pkg/service.py"]
+    assert index.dependency_graph() == {"app.py": ["pkg/service.py"], "pkg/service.py": ["pkg/models.py"]}
+    index.close()
+
+
+def test_update_is_incremental(python_repo, tmp_path):
+    db_path = str(tmp_path / "symbols.db")
+    index = SymbolIndex(python_repo, db_path=db_path)
+    index.update(_paths(python_repo))
+    assert index.update(_paths(python_repo))["updated"] == 0
+
+    _write(python_repo, "pkg/service.py", "def run():\n    return 1\n")
+    os.remove(os.path.join(python_repo, "app.py"))
+    result = index.update(_paths(python_repo))
+    assert result["updated"] == 1
+    assert result["removed"] == 1
+    assert index.dependency_graph() == {}
+    assert index.references_to("make_user") == []
+    index.close()
+
+    # The index persists across instances
+    reopened = SymbolIndex(python_repo, db_path=db_path)
+    assert reopened.find_definitions("run")[0]["path"] == "pkg/service.py"
+    reopened.close()
+
+
+def test_resolver_languages():
+    resolver = ModuleResolver(
+        ["src/util.js", "src/lib/index.js", "inc/a.h", "src/main.c", "com/acme/Repo.java", "cmd/x/main.go"]
+    )
+    assert resolver.resolve("src/app.js", "javascript", "./util", []) == {"src/util.js"}
+    assert resolver.resolve("src/app.js", "javascript", "./lib", []) == {"src/lib/index.js"}
+    assert resolver.resolve("src/main.c", "c", "inc/a.h", []) == {"inc/a.h"}
+    assert resolver.resolve("App.java", "java", "com.acme.Repo", []) == {"com/acme/Repo.java"}
+    assert resolver.resolve("main.go", "go", "github.com/acme/tool/cmd/x", []) == {"cmd/x/main.go"}
+    assert resolver.resolve("src/app.js", "javascript", "react", []) == set()
+
+
+def test_loader_updates_symbol_index(python_repo, tmp_path):
+    db_path = str(tmp_path / "symbols.db")
+    loader = RepoLoader(max_workers=1, symbol_index_path=db_path)
+    list(loader.iter_documents(local_path=python_repo))
+
+    index = SymbolIndex.open_latest(db_path)
+    assert index.root == os.path.abspath(python_repo)
+    assert index.dependents("pkg/service.py") == ["app.py"]
+    index.close()
+
+
+def test_lookup_tool(python_repo, tmp_path):
+    db_path = str(tmp_path / "symbols.db")
+    tool = SymbolIndexLookupTool(root=python_repo, db_path=db_path)
+    assert "not available" in tool._run(query="definition", name="User")
+
+    index = SymbolIndex(python_repo, db_path=db_path)
+    index.update(_paths(python_repo))
+    index.close()
+    assert tool._run(query="definition", name="User") == "pkg/models.py:1 class User: class User"
+    assert tool._run(query="dependents", name="pkg/models.py") == "pkg/service.py"
+    assert tool._run(query="references", name="Missing") == "No references found for 'Missing'."
+
+
+def test_lookup_tool_reads_the_index_of_its_repository(python_repo, tmp_path):
+    db_path = str(tmp_path / "symbols.db")
+    index = SymbolIndex(python_repo, db_path=db_path)
+    index.update(_paths(python_repo))
+    index.close()
+    # Another repository indexed afterwards is the latest one, not the analyzed one
+    other = str(tmp_path / "other")
+    _write(other, "lib.py", "class Other:\n    pass\n")
+    index = SymbolIndex(other, db_path=db_path)
+    index.update(_paths(other))
+    index.close()
+
+    tool = SymbolIndexLookupTool(root=python_repo, db_path=db_path)
+    assert tool._run(query="definition", name="User") == "pkg/models.py:1 class User: class User"
+    assert tool._run(query="definition", name="Other") == "No definition found for 'Other'."
+    assert "not available" in SymbolIndexLookupTool(db_path=db_path)._run(query="definition", name="User")
+    unindexed = SymbolIndexLookupTool(root=str(tmp_path / "unindexed"), db_path=db_path)
+    assert "not available" in unindexed._run(query="definition", name="User")
+
+
+def test_crew_attaches_lookup_tool_only_with_a_repository(python_repo, monkeypatch):
+    monkeypatch.setenv("PROVIDER", "openai")
+    monkeypatch.setenv("MODEL", "gpt-4o-mini")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("ENABLE_LLM_CACHE", "false")
+    from code_explainer.crew import CodeExplainer
+
+    def lookup_tools(crew):
+        return [tool for tool in crew.software_analyst().tools if isinstance(tool, SymbolIndexLookupTool)]
+
+    assert lookup_tools(CodeExplainer()) == []
+    tools = lookup_tools(CodeExplainer(symbol_index_root=python_repo))
+    assert [tool.root for tool in tools] == [os.path.abspath(python_repo)]
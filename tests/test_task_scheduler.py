@@ -0,0 +1,66 @@
+import time
+import threading
+from types import SimpleNamespace
+
+import pytest
+from crewai.utilities.constants import NOT_SPECIFIED
+from code_explainer.utils.task_scheduler import critical_path, run_graph, task_dependencies, topological_waves
+
+
+def test_task_dependencies_follow_declared_context():
+    analysis = SimpleNamespace(context=NOT_SPECIFIED)
+    quality = SimpleNamespace(context=[])
+    documentation = SimpleNamespace(context=[analysis, quality])
+    diagram = SimpleNamespace(context=[analysis])
+    done_elsewhere = SimpleNamespace(context=NOT_SPECIFIED)
+    summary = SimpleNamespace(context=[done_elsewhere, diagram])
+    tasks = [analysis, quality, documentation, diagram, summary]
+    assert task_dependencies(tasks) == {0: [], 1: [], 2: [0, 1], 3: [0], 4: [3]}
+    # Without declared context a task gets every earlier output, as in a sequential crew
+    assert task_dependencies([quality, analysis])[1] == [0]
+
+
+def test_topological_waves_and_cycles():
+    assert topological_waves({"a": [], "b": [], "c": ["a"], "d": ["a", "c"]}) == [["a", "b"], ["c"], ["d"]]
+    with pytest.raises(ValueError):
+        topological_waves({"a": ["b"], "b": ["a"]})
+
+
+def test_critical_path_is_the_longest_chain():
+    dependencies = {"analysis": [], "quality": [], "docs": ["analysis", "quality"], "diagram": ["analysis"]}
+    durations = {"analysis": 5.0, "quality": 7.0, "docs": 3.0, "diagram": 4.0}
+    assert critical_path(dependencies, durations) == (["quality", "docs"], 10.0)
+
+
+def test_run_graph_runs_independent_nodes_concurrently():
+    running = set()
+    overlaps = []
+    lock = threading.Lock()
+
+    def run(node):
+        with lock:
+            overlaps.append(set(running))
+            running.add(node)
+        time.sleep(0.05)
+        with lock:
+            running.discard(node)
+        return node.upper()
+
+    results, durations = run_graph({"a": [], "b": ["a"], "c": ["a"], "d": ["b", "c"]}, run, max_workers=4)
+    assert results == {"a": "A", "b": "B", "c": "C", "d": "D"}
+    assert set(durations) == {"a", "b", "c", "d"}
+    assert any(seen & {"b", "c"} for seen in overlaps)
+
+
+def test_run_graph_stops_dependents_of_a_failure():
+    started = []
+
+    def run(node):
+        started.append(node)
+        if node == "a":
+            raise RuntimeError("boom")
+        return node
+
+    with pytest.raises(RuntimeError):
+        run_graph({"a": [], "b": ["a"], "c": []}, run, max_workers=1)
+    assert "b" not in started
@@ -0,0 +1,61 @@
+from unittest.mock import patch
+from code_explainer.utils.token_cache import TokenCountCache, MIN_CACHED_CHARS
+from code_explainer.utils.utils import BatchProcessingManager
+
+TEXT = "def compute(x):\n    return x * 2\n" * 20
+
+
+def test_get_put_and_stats():
+    cache = TokenCountCache(max_entries=10)
+    assert cache.get("enc", TEXT) is None
+    cache.put("enc", TEXT, 42)
+    assert cache.get("enc", TEXT) == 42
+    # The encoder is part of the key
+    assert cache.get("other", TEXT) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_short_texts_are_not_cached():
+    cache = TokenCountCache()
+    short = "x" * (MIN_CACHED_CHARS - 1)
+    cache.put("enc", short, 3)
+    assert cache.get("enc", short) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_lru_is_bounded():
+    cache = TokenCountCache(max_entries=2)
+    texts = [TEXT + str(i) for i in range(3)]
+    for i, text in enumerate(texts):
+        cache.put("enc", text, i)
+    assert cache.get("enc", texts[0]) is None
+    assert cache.get("enc", texts[2]) == 2
+
+
+def test_persists_across_instances(tmp_path):
+    db_path = str(tmp_path / "tokens.db")
+    cache = TokenCountCache()
+    cache.open(db_path)
+    cache.put("enc", TEXT, 42)
+    cache.close()
+
+    reopened = TokenCountCache()
+    reopened.open(db_path)
+    assert reopened.get("enc", TEXT) == 42
+    reopened.close()
+
+
+def test_managers_share_counts():
+    cache = TokenCountCache()
+    first = BatchProcessingManager(max_tokens=10000, model="gpt-4o-mini", token_cache=cache)
+    second = BatchProcessingManager(max_tokens=10, model="gpt-4o-mini", token_cache=cache)
+    count = first.count_tokens(TEXT)
+
+    with patch.object(second.encoder, "encode", wraps=second.encoder.encode) as encode:
+        assert second.count_tokens(TEXT) == count
+        chunks = second.chunk_files_by_tokens({"a.py": TEXT, "b.py": TEXT})
+        assert second.count_texts_tokens([TEXT] * 3) == 3 * count
+    # Only the oversized file split needs the tokens themselves
+    assert encode.call_count == 2
+    assert len(chunks) > 2
@@ -87,6 +87,66 @@ def test_chunk_files_by_tokens_splits_large_file():
     assert len(chunks) > 1
 
 
+def test_chunk_single_file_encodes_once_and_keeps_lines():
+    mgr = BatchProcessingManager(max_tokens=40)
+    content = "\n".join(f"value_{i} = compute({i}, 'ünïcode')" for i in range(200))
+    with patch.object(mgr.encoder, "encode", wraps=mgr.encoder.encode) as encode:
+        chunks = mgr.chunk_files_by_tokens({"big.py": content})
+    assert encode.call_count == 1
+
+    names = [name for chunk in chunks for name in chunk["files"]]
+    assert names == [f"big.py_part_{i + 1}" for i in range(len(chunks))]
+    assert "\n".join(chunk["files"][name] for chunk, name in zip(chunks, names)) == content
+    assert all(chunk["total_tokens"] <= 40 for chunk in chunks)
+    assert sum(chunk["total_tokens"] for chunk in chunks) == mgr.count_tokens(content)
+
+
+def _method(name, statements):
+    body = "\n".join(f"        total += compute_{name}_{i}(value, {i})" for i in range(statements))
+    return f"    def {name}(self, value):\n        total = 0\n{body}\n        return total\n"
+
+
+AST_SOURCE = (
+    "import os\nfrom typing import List\n\n\n"
+    "def helper(path):\n    return os.path.basename(path)\n\n\n"
+    "class Service(Base):\n"
+    + "\n".join(_method(name, 12) for name in ("load", "save", "delete"))
+    + "\n\ndef main():\n    return Service().load(1)\n"
+)
+
+
+def test_chunk_single_file_splits_at_declarations():
+    mgr = BatchProcessingManager(max_tokens=300)
+    chunks = mgr._chunk_single_file("service.py", AST_SOURCE)
+    parts = [chunk["files"][f"service.py_part_{i + 1}"] for i, chunk in enumerate(chunks)]
+    assert len(parts) > 1
+    # No method is cut, and each part of the class carries the imports and its signature
+    for name in ("load", "save", "delete"):
+        [part] = [p for p in parts if f"def {name}(" in p]
+        assert part.startswith("import os\nfrom typing import List\nclass Service(Base):\n")
+        assert f"compute_{name}_11(" in part
+    assert all(chunk["total_tokens"] <= 300 for chunk in chunks)
+
+
+def test_chunk_single_file_line_fallback_for_large_units(monkeypatch):
+    mgr = BatchProcessingManager(max_tokens=60)
+    chunks = mgr._chunk_single_file("service.py", AST_SOURCE)
+    assert all(chunk["total_tokens"] <= 60 for chunk in chunks)
+
+    monkeypatch.setenv("CHUNK_SPLIT", "lines")
+    mgr = BatchProcessingManager(max_tokens=60)
+    chunks = mgr._chunk_single_file("service.py", AST_SOURCE)
+    assert "\n".join(chunk["files"][f"service.py_part_{i + 1}"] for i, chunk in enumerate(chunks)) == AST_SOURCE
+
+
+def test_line_token_counts_cover_every_line():
+    mgr = BatchProcessingManager(max_tokens=40)
+    content = "a = 1\n\nb = [\n    2,\n]\n"
+    counts = mgr._line_token_counts(content)
+    assert len(counts) == len(content.split("\n"))
+    assert sum(counts) == mgr.count_tokens(content)
+
+
 def test_chunk_files_by_tokens_multiple_files_grouped():
     mgr = BatchProcessingManager(max_tokens=100)
     files = {f"file_{i}.py": f"x_{i} = {i}" for i in range(5)}
@@ -95,6 +155,46 @@ def test_chunk_files_by_tokens_multiple_files_grouped():
     assert total_files == 5
 
 
+def test_chunk_files_by_tokens_accepts_stream():
+    mgr = BatchProcessingManager(max_tokens=100)
+    files = {f"file_{i}.py": f"x_{i} = {i}" for i in range(5)}
+    streamed = mgr.chunk_files_by_tokens((path, content) for path, content in files.items())
+    assert [c.describe() for c in streamed] == [c.describe() for c in mgr.chunk_files_by_tokens(files)]
+
+
+def test_streamed_chunks_read_content_when_dispatched(tmp_path):
+    mgr = BatchProcessingManager(max_tokens=40)
+    small = tmp_path / "small.py"
+    small.write_text("x = 1\n", encoding="utf-8")
+    big = tmp_path / "big.py"
+    big.write_text("\n".join(f"value_{i} = compute({i})" for i in range(60)), encoding="utf-8")
+
+    chunks = mgr.chunk_files_by_tokens(
+        (str(path), path.read_text(encoding="utf-8")) for path in (big, small)
+    )
+    # Descriptors hold references, not content
+    assert not hasattr(chunks[0], "__dict__")
+    parts = "\n".join(chunk["files"][f"{big}_part_{i + 1}"] for i, chunk in enumerate(chunks[:-1]))
+    assert parts == big.read_text(encoding="utf-8")
+
+    small.write_text("x = 2\n", encoding="utf-8")
+    assert chunks[-1].materialize() == {"files": {str(small): "x = 2\n"}, "total_tokens": 5, "file_count": 1}
+    assert chunks[-1].describe()["files"] == [str(small)]
+
+
+def test_count_documents_tokens_consumes_stream():
+    mgr = BatchProcessingManager(max_tokens=100)
+    docs = [{"source_filename": "a.py", "source_file_contents": "x = 1"}] * 3
+    assert mgr.count_documents_tokens(iter(docs)) == 3 * mgr.count_documents_tokens(docs[:1])
+
+
+@patch.dict(os.environ, {"ENABLE_BATCH_PROCESSING": "true"})
+def test_should_use_batch_processing_accepts_document_stream():
+    mgr = BatchProcessingManager(max_tokens=5)
+    docs = ({"source_file_contents": "a very long text that exceeds five tokens"} for _ in range(2))
+    assert mgr.should_use_batch_processing(docs) is True
+
+
 @patch.dict(os.environ, {"ENABLE_BATCH_PROCESSING": "true"})
 def test_should_use_batch_processing_true_when_large():
     mgr = BatchProcessingManager(max_tokens=1)
@@ -113,6 +213,50 @@ def test_should_use_batch_processing_disabled():
     assert mgr.should_use_batch_processing("any text") is False
 
 
+def test_count_texts_tokens_matches_single_counts():
+    mgr = BatchProcessingManager(max_tokens=100)
+    texts = [f"def f_{i}(x):\n    return x * {i}\n" for i in range(600)]
+    assert mgr.count_texts_tokens(texts) == sum(mgr.count_tokens(t) for t in texts)
+
+
+def test_estimation_mode_validated():
+    with pytest.raises(ValueError, match="token estimation must be one of"):
+        BatchProcessingManager(estimation="guess")
+
+
+def test_fast_estimate_far_from_limit_skips_encoder():
+    mgr = BatchProcessingManager(max_tokens=100, estimation="fast")
+    with patch.object(mgr, "count_texts_tokens") as exact:
+        assert mgr.estimate_tokens("x" * 10) == (2, False)
+        assert mgr.estimate_tokens("x" * 4000) == (1000, False)
+        exact.assert_not_called()
+
+
+def test_fast_estimate_near_limit_counts_exactly():
+    mgr = BatchProcessingManager(max_tokens=100, estimation="fast")
+    docs = [{"source_file_contents": "value = compute(1, 2)\n" * 4}] * 3
+    assert mgr.estimate_tokens(iter(docs)) == (mgr.count_documents_tokens(docs), True)
+
+
+def test_fast_estimate_stops_reading_stream_above_limit():
+    mgr = BatchProcessingManager(max_tokens=10, estimation="fast")
+    consumed = []
+
+    def docs():
+        for i in range(1000):
+            consumed.append(i)
+            yield {"source_file_contents": "x" * 50}
+
+    count, exact = mgr.estimate_tokens(docs())
+    assert not exact and count > 20
+    assert len(consumed) < 5
+
+
+def test_exact_mode_always_counts():
+    mgr = BatchProcessingManager(max_tokens=100000, estimation="exact")
+    assert mgr.estimate_tokens("hello world") == (mgr.count_tokens("hello world"), True)
+
+
 # ---------------------------------------------------------------------------
 # LLM_Config
 # ---------------------------------------------------------------------------